@@ -0,0 +1,219 @@
+# Static analyses over the ast of a brewin program, used by the compiler.
+
+
+# yields (node, in_block) for every statement and expression node of a function body,
+# where in_block tells if the node is inside an if/while block of the function.
+# it doesn't go into the bodies of lambdas defined in the function (they run in their own frame)
+def walk_body(statements, in_block=False):
+    for statement in statements or []:
+        yield from walk_node(statement, in_block)
+
+
+def walk_node(node, in_block):
+    yield node, in_block
+    elem_type = node.elem_type
+    if elem_type == 'lambda':
+        return
+    if elem_type == 'if' or elem_type == 'while':
+        yield from walk_node(node.dict['condition'], in_block)
+        yield from walk_body(node.dict['statements'], True)
+        yield from walk_body(node.dict.get('else_statements'), True)
+        return
+    for key in ('expression', 'op1', 'op2'):
+        child = node.dict.get(key)
+        if child is not None:
+            yield from walk_node(child, in_block)
+    if elem_type == 'fcall' or elem_type == 'mcall':
+        for arg in node.dict['args']:
+            yield from walk_node(arg, in_block)
+
+
+# the variable name a node reads or writes, with the field part of "obj.field" dropped
+def base_name(name):
+    return name.split('.')[0]
+
+
+# Works out which variables of a function can be given a fixed slot in its frame.
+#
+# Brewin is dynamically scoped, so in general a name can only be found by searching the
+# scope list at runtime. A few names are known to live in the function's own frame:
+#   - its params (and "this" for methods), which are put there when it is called
+#   - names assigned by its top-level statements, once that assignment created them there
+# A block can't shadow one of these once it exists in the frame by assigning it, because
+# an assignment in the block finds the frame's variable first. (A call in the block can,
+# by passing it by reference: see reference_names.)
+#
+# Returns symbol -> slot index, with the params taking the first slots.
+def frame_slot_names(func_node):
+    slot_names = {}
+    for arg in func_node.dict['args']:
+        slot_names.setdefault(arg.get('name'), len(slot_names))
+
+    for node, in_block in walk_body(func_node.dict['statements']):
+        elem_type = node.elem_type
+        if elem_type == 'var' and base_name(node.dict['name']) == 'this':
+            slot_names.setdefault('this', len(slot_names))
+        elif elem_type == '=':
+            name = node.dict['name']
+            if base_name(name) == 'this':
+                slot_names.setdefault('this', len(slot_names))
+            elif not in_block and '.' not in name:
+                slot_names.setdefault(name, len(slot_names))
+        elif elem_type == 'mcall' and node.dict['objref'] == 'this':
+            slot_names.setdefault('this', len(slot_names))
+    return slot_names
+
+
+# Works out the names that calls in these statements (and the blocks inside them) can
+# pass by reference: the plain variables given as args, other than to a param that isn't a
+# refarg of a function found by name, and the objects methods are called on ("this").
+# Passed by reference from a block it doesn't live in, a variable becomes a variable of
+# that block once the callee sets it (see compiler.compile_reference), so in that block it
+# can't be read through its frame slot, and the block needs its own scope.
+#
+# Without a function_table every plain variable arg counts.
+def reference_names(statements, function_table=None):
+    names = set()
+    for node, _ in walk_body(statements):
+        elem_type = node.elem_type
+        if elem_type == 'mcall':
+            names.add(node.dict['objref'])
+        elif elem_type != 'fcall' or node.dict['name'] in ('print', 'inputi', 'inputs'):
+            continue
+        callee = None
+        if elem_type == 'fcall' and function_table is not None:
+            callee = function_table.lookup(node.dict['name'], len(node.dict['args']))
+        for i, arg in enumerate(node.dict['args']):
+            if arg.elem_type != 'var' or '.' in arg.dict['name']:
+                continue
+            if callee is not None and callee.dict['args'][i].elem_type != 'refarg':
+                continue
+            if function_table is not None and function_table.overloads(arg.dict['name']):
+                # a function name is passed as a function value
+                continue
+            names.add(arg.dict['name'])
+    return names
+
+
+# Works out the names a lambda's body can look up in its captured variables: the plain
+# variables it reads or assigns and the names it calls, in the order they first appear
+# (its params are never captured).
+def lambda_free_names(lambda_node):
+    param_names = {arg.get('name') for arg in lambda_node.dict['args']}
+    free_names = {}
+    for node, _ in walk_body(lambda_node.dict['statements']):
+        elem_type = node.elem_type
+        if elem_type == 'var' or elem_type == '=' or elem_type == 'fcall':
+            name = node.dict['name']
+            if '.' not in name and name not in param_names:
+                free_names.setdefault(name, None)
+    return list(free_names)
+
+
+# Works out the names a function's frame (and the blocks inside it) can hold: its params,
+# "this", and every plain variable it assigns.
+def frame_names(func_node):
+    names = {arg.get('name') for arg in func_node.dict['args']}
+    names.add('this')
+    for node, _ in walk_body(func_node.dict['statements']):
+        if node.elem_type == '=' and '.' not in node.dict['name']:
+            names.add(node.dict['name'])
+    return names
+
+
+# Works out every name that running a function can look up in (or assign to) the scopes
+# below its own frame: the variables, called names and object names used by it and by
+# every function it calls, other than their own params. Making a lambda reads the names
+# it captures from the scopes too.
+#
+# Gets None when that can't be known ahead of time, because the function (or one it
+# calls) calls a function value, a lambda or a method.
+def scope_lookup_names(func_node, function_table):
+    names = set()
+    visited = set()
+    to_visit = [func_node]
+    while to_visit:
+        node = to_visit.pop()
+        if id(node) in visited:
+            continue
+        visited.add(id(node))
+        param_names = {arg.get('name') for arg in node.dict['args']}
+        used = set()
+        for child, _ in walk_body(node.dict['statements']):
+            elem_type = child.elem_type
+            if elem_type == 'var' or elem_type == '=':
+                used.add(base_name(child.dict['name']))
+            elif elem_type == 'lambda':
+                used.update(lambda_free_names(child))
+            elif elem_type == 'mcall':
+                return None
+            elif elem_type == 'fcall':
+                name = child.dict['name']
+                if name == 'print':
+                    continue
+                if name == 'inputi' or name == 'inputs':
+                    # a call statement looks these up as variables
+                    used.add(name)
+                    continue
+                callee = function_table.lookup(name, len(child.dict['args']))
+                if callee is None:
+                    return None
+                to_visit.append(callee)
+        names.update(used - param_names)
+    return names
+
+
+# Works out which functions are pure: a call to one always gets the same result for the
+# same args, and changes nothing the caller can see, so its result can be remembered (see
+# memo). A function is pure when
+#   - it has no refargs, and doesn't print or read input
+#   - every variable it reads or assigns is one of its params (brewin is dynamically
+#     scoped, so any other name could be found in, or assigned to, a caller's scope)
+#   - it doesn't use objects (fields, methods or @) or make lambdas
+#   - every function it calls is found by name and arity, and is pure too
+#
+# Gets the set of ids of the pure func nodes.
+def pure_functions(functions, function_table):
+    callees = {}  # id(func node) -> the func nodes it calls, for the ones that may be pure
+    for func_node in functions:
+        called = pure_callees(func_node, function_table)
+        if called is not None:
+            callees[id(func_node)] = called
+
+    # a function that calls one that isn't pure isn't pure either
+    changed = True
+    while changed:
+        changed = False
+        for func_id, called in list(callees.items()):
+            if any(id(callee) not in callees for callee in called):
+                del callees[func_id]
+                changed = True
+    return set(callees)
+
+
+# gets the func nodes a function calls, or None if the function itself can't be pure
+def pure_callees(func_node, function_table):
+    param_names = set()
+    for arg in func_node.dict['args']:
+        if arg.elem_type == 'refarg':
+            return None
+        param_names.add(arg.get('name'))
+
+    called = []
+    for node, _ in walk_body(func_node.dict['statements']):
+        elem_type = node.elem_type
+        if elem_type == 'var' or elem_type == '=':
+            if node.dict['name'] not in param_names:
+                return None
+        elif elem_type == 'fcall':
+            name = node.dict['name']
+            if name == 'print' or name == 'inputi' or name == 'inputs':
+                return None
+            callee = function_table.lookup(name, len(node.dict['args']))
+            if callee is None:
+                # a call through a variable
+                return None
+            called.append(callee)
+        elif elem_type == 'mcall' or elem_type == '@' or elem_type == 'lambda':
+            return None
+    return called
@@ -0,0 +1,214 @@
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from interpreterv4 import Interpreter
+from input_provider import FileInput
+from optimizer import Optimizer
+from program import ExecutionTimeout, Program
+
+# Runs a manifest of test cases across a pool of worker processes, writing one JSON line
+# per case as each one finishes.
+#
+# A manifest is a JSON lines file, one case per line:
+#   {"id": "sum-1", "program": "progs/sum.br", "inputs": "progs/sum-1.in", "expected": "progs/sum-1.out"}
+# "inputs" and "expected" are either a file of lines or a list of lines, and both can be
+# left out. Paths are relative to the manifest's directory. "id" defaults to the line number.
+#
+# Every program named by the manifest is compiled once, in this process, before the pool
+# starts. With the fork start method the workers inherit those Programs (their pages are
+# only copied if a worker writes to them); with another start method each worker compiles
+# them again when it starts.
+#
+# A case can be limited to a wall-clock time (SIGALRM in the worker) and to a number of
+# steps (Program.run's max_steps, vm engine only); one that goes over either gets the
+# status "timeout".
+#
+# usage: python batch.py manifest.jsonl [--workers N] [--timeout SECONDS] [--max-steps N]
+#                        [--engine vm] [-O LEVEL] [--output results.jsonl]
+
+# what a case can end as
+PASS = "pass"  # ran to the end and printed what was expected
+FAIL = "fail"  # ran to the end but printed something else
+OK = "ok"  # ran to the end, with nothing expected to compare against
+ERROR = "error"  # raised a Brewin error (or its program didn't compile)
+CRASH = "crash"  # raised some other exception
+TIMEOUT = "timeout"  # went over its wall-clock time or step budget
+
+STATUSES = {
+    Program.ERROR: ERROR,
+    Program.CRASH: CRASH,
+    Program.TIMEOUT: TIMEOUT,
+}
+
+# the compiled programs, by path: (Program, None) or (None, compile error message)
+# (set before the pool starts, so forked workers inherit it)
+compiled_programs = {}
+
+
+# one line of a manifest, with its paths resolved
+class Case:
+    def __init__(self, case_id, program, inputs, expected):
+        self.id = case_id
+        self.program = program  # path of the program
+        self.inputs = inputs  # list of lines, or path of a file of lines
+        self.expected = expected  # list of lines, path of a file of lines, or None
+
+
+def read_manifest(path):
+    base = os.path.dirname(os.path.abspath(path))
+    cases = []
+    with open(path) as manifest:
+        for line_num, line in enumerate(manifest, 1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            cases.append(Case(
+                entry.get('id', line_num),
+                os.path.join(base, entry['program']),
+                resolve(base, entry.get('inputs', [])),
+                resolve(base, entry.get('expected')),
+            ))
+    return cases
+
+
+def resolve(base, lines_or_path):
+    if isinstance(lines_or_path, str):
+        return os.path.join(base, lines_or_path)
+    return lines_or_path
+
+
+def read_lines(lines_or_path):
+    if isinstance(lines_or_path, str):
+        with open(lines_or_path) as lines_file:
+            return lines_file.read().splitlines()
+    return [str(line) for line in lines_or_path]
+
+
+def compile_programs(paths, engine, opt_level):
+    interpreter = Interpreter(console_output=False, engine=engine, opt_level=opt_level)
+    for path in paths:
+        if path in compiled_programs:
+            continue
+        try:
+            with open(path) as program_file:
+                compiled_programs[path] = (interpreter.compile(program_file.read()), None)
+        except Exception as e:
+            compiled_programs[path] = (None, str(e))
+
+
+# runs in each worker as it starts: a forked worker already has the programs
+def init_worker(paths, engine, opt_level):
+    compile_programs(paths, engine, opt_level)
+
+
+def raise_timeout(signum, frame):
+    raise ExecutionTimeout("Wall-clock time limit exceeded")
+
+
+# runs one case in a worker and gets its result line
+def run_case(case, timeout, max_steps):
+    result = {'id': case.id, 'program': case.program}
+    start = time.perf_counter()
+    program, compile_error = compiled_programs[case.program]
+    if program is None:
+        result.update(status=ERROR, output=[], error=compile_error, elapsed=0.0)
+        return result
+
+    try:
+        # an inputs file is read as the program asks for it
+        inputs = FileInput(case.inputs) if isinstance(case.inputs, str) else read_lines(case.inputs)
+        expected = None if case.expected is None else read_lines(case.expected)
+    except OSError as e:
+        result.update(status=CRASH, output=[], error=str(e), elapsed=0.0)
+        return result
+
+    if timeout:
+        signal.signal(signal.SIGALRM, raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        run = program.run(inputs, max_steps=max_steps)
+    finally:
+        if timeout:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+    output = [str(line) for line in run.output]
+    if run.status != Program.OK:
+        status = STATUSES[run.status]
+    elif expected is None:
+        status = OK
+    else:
+        status = PASS if output == expected else FAIL
+    result.update(status=status, output=output, elapsed=round(time.perf_counter() - start, 6))
+    if run.error is not None:
+        result['error'] = run.error
+    if status == FAIL:
+        result['expected'] = expected
+    return result
+
+
+# runs every case and yields the result lines as the cases finish
+def run_batch(cases, workers=None, timeout=None, max_steps=None, engine=Interpreter.VM_ENGINE, opt_level=Optimizer.O1):
+    if timeout and not hasattr(signal, 'setitimer'):
+        raise ValueError("wall-clock timeouts need signal.setitimer, which this platform doesn't have")
+    if max_steps is not None and engine != Interpreter.VM_ENGINE:
+        raise ValueError(f"max_steps needs the {Interpreter.VM_ENGINE} engine")
+    paths = sorted({case.program for case in cases})
+    compile_programs(paths, engine, opt_level)
+    workers = workers or os.cpu_count() or 1
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+    else:
+        context = multiprocessing.get_context()
+
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=init_worker, initargs=(paths, engine, opt_level)) as pool:
+        # a few cases per worker are queued at a time, so results stream out as they finish
+        pending = set()
+        for case in cases:
+            pending.add(pool.submit(run_case, case, timeout, max_steps))
+            if len(pending) >= workers * 4:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a manifest of Brewin test cases in parallel.")
+    parser.add_argument('manifest')
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument('--timeout', type=float, default=None, help="wall-clock seconds per case")
+    parser.add_argument('--max-steps', type=int, default=None, help="loop iterations plus calls per case (vm engine)")
+    parser.add_argument('--engine', choices=Interpreter.ENGINES, default=Interpreter.VM_ENGINE)
+    parser.add_argument('-O', dest='opt_level', type=int, choices=Optimizer.LEVELS, default=Optimizer.O1)
+    parser.add_argument('--output', default=None, help="write the result lines here instead of stdout")
+    args = parser.parse_args()
+
+    cases = read_manifest(args.manifest)
+    out = open(args.output, 'w') if args.output else sys.stdout
+    counts = {}
+    start = time.perf_counter()
+    try:
+        for result in run_batch(cases, args.workers, args.timeout, args.max_steps, args.engine, args.opt_level):
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    summary = ", ".join(f"{count} {status}" for status, count in sorted(counts.items()))
+    print(f"{len(cases)} cases in {time.perf_counter() - start:.2f}s: {summary}", file=sys.stderr)
+    failed = sum(counts.get(status, 0) for status in (FAIL, ERROR, CRASH, TIMEOUT))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
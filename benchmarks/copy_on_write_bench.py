@@ -0,0 +1,129 @@
+# Compares copy_on_write.copy_value with the copy.deepcopy that the tree engine does for
+# pass-by-value and return: time and peak memory per copy of an object graph, then a whole
+# program that passes a large object to a function that only reads it.
+#
+# usage: python benchmarks/copy_on_write_bench.py [objects] [copies]
+import copy
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from copy_on_write import Heap, copy_value, get_field  # noqa: E402
+from type_valuev1 import Type, Value  # noqa: E402
+
+
+# a chain of objects linked by proto, each with a few int fields and a field that
+# points back to the root
+def build_graph(heap, size):
+    root = Value(Type.OBJ, heap.new_fields())
+    obj = root
+    for i in range(size):
+        fields = obj.v
+        heap.set_field(fields, 'a', Value(Type.INT, i))
+        heap.set_field(fields, 'b', Value(Type.STRING, str(i)))
+        heap.set_field(fields, 'root', root)
+        proto = Value(Type.OBJ, heap.new_fields())
+        heap.set_field(fields, 'proto', proto)
+        obj = proto
+    return root
+
+
+# times the copies, then makes them again under tracemalloc (which slows them down)
+def measure(name, copies, make_copy):
+    gc.collect()
+    start = time.perf_counter()
+    kept = [make_copy() for _ in range(copies)]
+    elapsed = time.perf_counter() - start
+    del kept
+    gc.collect()
+    tracemalloc.start()
+    kept = [make_copy() for _ in range(copies)]
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:28s} {elapsed * 1000 / copies:10.3f} ms/copy {peak / 1024 / copies:10.1f} KiB/copy")
+
+
+def bench_copies(size, copies):
+    heap = Heap()
+    root = build_graph(heap, size)
+    print(f"copying an object graph of {size} objects, {copies} copies kept alive")
+    measure("copy.deepcopy", copies, lambda: copy.deepcopy(root))
+    measure("copy_value", copies, lambda: copy_value(heap, root))
+
+    # a copy that is read (through the proto chain) but never changed
+    def copy_and_read():
+        val = copy_value(heap, root)
+        get_field(val, 'missing')
+        return val
+
+    measure("copy_value + read all", copies, copy_and_read)
+
+    # a copy whose root object is changed: only the root gets its own fields
+    def copy_and_write():
+        val = copy_value(heap, root)
+        heap.set_field(val.v, 'a', Value(Type.INT, -1))
+        return val
+
+    measure("copy_value + write root", copies, copy_and_write)
+
+
+PROGRAM = """
+func total(o) {
+  return o.a + o.b;
+}
+func main() {
+  o = @;
+  o.a = 1;
+  o.b = 2;
+  i = 0;
+  while (i < SIZE) {
+    p = @;
+    p.proto = o;
+    p.n = i;
+    o = p;
+    i = i + 1;
+  }
+  s = 0;
+  i = 0;
+  while (i < CALLS) {
+    s = s + total(o);
+    i = i + 1;
+  }
+  print(s);
+}
+"""
+
+
+def bench_program(size, calls):
+    from interpreterv4 import Interpreter
+
+    source = PROGRAM.replace("SIZE", str(size)).replace("CALLS", str(calls))
+    print(f"passing a {size} object proto chain by value {calls} times")
+    for engine in Interpreter.ENGINES:
+        gc.collect()
+        start = time.perf_counter()
+        Interpreter(console_output=False, engine=engine).run(source)
+        elapsed = time.perf_counter() - start
+        gc.collect()
+        tracemalloc.start()
+        Interpreter(console_output=False, engine=engine).run(source)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{engine + ' engine':28s} {elapsed:10.3f} s {peak / 1024:17.1f} KiB peak")
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    copies = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10 * size))
+    bench_copies(size, copies)
+    print()
+    bench_program(size, copies)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# Runs a program that does a lot of setup (it builds a long linked list of objects and sums
+# it) before its first inputi, once for each of many input streams: each stream on a
+# run of its own, and all of them fanned out from one run forked at its first input
+# (fanout.FanOut), and prints both times and checks that they printed the same.
+#
+# The tree engine copies the whole list when it passes it to a function, which recurses
+# once per node, so give it a --setup under 200.
+#
+# usage: python benchmarks/fanout_bench.py [--streams N] [--setup N] [--workers N]
+#                                          [--engine ENGINE]
+import argparse
+import gc
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fanout import FanOut  # noqa: E402
+from interpreterv4 import Interpreter  # noqa: E402
+from program import Program  # noqa: E402
+
+SETUP_SOURCE = """
+func build(n) {
+  head = nil;
+  k = 0;
+  while (k < n) {
+    node = @;
+    node.value = k * k;
+    node.next = head;
+    head = node;
+    k = k + 1;
+  }
+  return head;
+}
+
+func total(list) {
+  sum = 0;
+  while (list != nil) {
+    sum = sum + list.value;
+    list = list.next;
+  }
+  return sum;
+}
+
+func main() {
+  n = SETUP;
+  list = build(n);
+  sum = total(list);
+  print("set up ", n);
+  x = inputi();
+  while (x != 0) {
+    print(x, " ", sum + x);
+    x = inputi();
+  }
+}
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time fanning a program out over many input streams.")
+    parser.add_argument('--streams', type=int, default=50, help="input streams to run")
+    parser.add_argument('--setup', type=int, default=50000, help="objects the setup builds")
+    parser.add_argument('--workers', type=int, default=None, help="children to run at once (default: one per cpu)")
+    parser.add_argument('--engine', choices=Interpreter.ENGINES, default=Interpreter.CLOSURE_ENGINE)
+    args = parser.parse_args()
+
+    source = SETUP_SOURCE.replace("SETUP", str(args.setup))
+    program = Interpreter(console_output=False, engine=args.engine).compile(source)
+    streams = [[str(i + 1), str(i + 2), "0"] for i in range(args.streams)]
+
+    gc.collect()
+    start = time.perf_counter()
+    separate = [program.run(stream) for stream in streams]
+    separate_time = time.perf_counter() - start
+    if separate[0].status != Program.OK:
+        raise RuntimeError(f"the program didn't run to the end: {separate[0].error}")
+
+    fan_out = FanOut(args.workers)
+    gc.collect()
+    start = time.perf_counter()
+    fanned = fan_out.run(program, streams)
+    fanned_time = time.perf_counter() - start
+
+    for stream, one, other in zip(streams, separate, fanned):
+        if one.output != other.output or one.status != other.status:
+            raise RuntimeError(f"{stream} printed {one.output} on its own, {other.output} fanned out")
+    print(f"{args.streams} streams, setup of {args.setup} objects, {args.engine} engine")
+    print(f"separate runs {separate_time:8.3f}s")
+    print(f"fanned out    {fanned_time:8.3f}s   (setup {fan_out.setup_time:.3f}s, {fan_out.forks} forks)")
+
+
+if __name__ == "__main__":
+    main()
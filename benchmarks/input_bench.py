@@ -0,0 +1,86 @@
+# Runs a program that sums integers read with inputi, reading them from a list of lines
+# (what Program.run used to be given), from a file through FileInput (mapped into memory
+# once it's big enough) and from a file as whitespace separated tokens; then times the
+# reading alone, through the interpreter's inputi path.
+#
+# usage: python benchmarks/input_bench.py [integers]
+import gc
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from input_provider import FileInput, LineInput  # noqa: E402
+from interpreterv4 import Interpreter  # noqa: E402
+
+PROGRAM = """
+func main() {
+  n = inputi();
+  i = 0;
+  s = 0;
+  while (i < n) {
+    s = s + inputi();
+    i = i + 1;
+  }
+  print(s);
+}
+"""
+
+
+def measure(name, program, make_inputs):
+    gc.collect()
+    start = time.perf_counter()
+    inputs = make_inputs()
+    result = program.run(inputs)
+    elapsed = time.perf_counter() - start
+    print(f"{name:28s} {elapsed:8.3f} s   result {result.output}")
+
+
+def measure_reads(name, n, make_provider):
+    best = None
+    for _ in range(5):
+        gc.collect()
+        start = time.perf_counter()
+        rt = Interpreter(console_output=False, input_provider=make_provider())
+        total = 0
+        for _ in range(n):
+            total += rt.get_int_input()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name:28s} {best:8.3f} s   sum {total}")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 300000
+    numbers = [str(i * 7 % 1000) for i in range(n)]
+    program = Interpreter(console_output=False, engine=Interpreter.VM_ENGINE).compile(PROGRAM)
+    with tempfile.TemporaryDirectory() as directory:
+        lines_path = os.path.join(directory, "lines.in")
+        with open(lines_path, 'w') as lines_file:
+            lines_file.write("\n".join([str(n)] + numbers) + "\n")
+        tokens_path = os.path.join(directory, "tokens.in")
+        with open(tokens_path, 'w') as tokens_file:
+            tokens_file.write(f"{n}\n")
+            for start in range(0, n, 20):
+                tokens_file.write(" ".join(numbers[start:start + 20]) + "\n")
+
+        print(f"{n} integers read with inputi ({os.path.getsize(lines_path) // 1024} KiB)")
+
+        def read_list():
+            with open(lines_path) as lines_file:
+                return lines_file.read().splitlines()
+
+        measure("list of lines", program, read_list)
+        measure("FileInput, lines", program, lambda: FileInput(lines_path))
+        measure("FileInput, tokens", program, lambda: FileInput(tokens_path, tokens=True))
+
+        print("reading alone, best of 5")
+        measure_reads("list of lines", n + 1, lambda: LineInput(read_list()))
+        measure_reads("FileInput, lines", n + 1, lambda: FileInput(lines_path))
+        measure_reads("FileInput, tokens", n + 1, lambda: FileInput(tokens_path, tokens=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# Runs recursive numeric workloads (fib, binomial coefficients, a DP-style path count) on
+# each engine without and with a memo for pure functions, and prints the run times and the
+# memo's hits and misses.
+#
+# usage: python benchmarks/memo_bench.py [memo_size]
+import gc
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from interpreterv4 import Interpreter  # noqa: E402
+
+WORKLOADS = {
+    "fib(24)": """
+func fib(n) {
+  if (n < 2) { return n; }
+  return fib(n - 1) + fib(n - 2);
+}
+func main() { print(fib(24)); }
+""",
+    "choose(20, 10)": """
+func choose(n, k) {
+  if (k == 0 || k == n) { return 1; }
+  return choose(n - 1, k - 1) + choose(n - 1, k);
+}
+func main() { print(choose(20, 10)); }
+""",
+    "paths(10, 10)": """
+func paths(x, y) {
+  if (x == 0 || y == 0) { return 1; }
+  return paths(x - 1, y) + paths(x, y - 1);
+}
+func main() { print(paths(10, 10)); }
+""",
+}
+
+
+def measure(source, engine, memo_size):
+    program = Interpreter(console_output=False, engine=engine, memo_size=memo_size).compile(source)
+    gc.collect()
+    start = time.perf_counter()
+    result = program.run()
+    return time.perf_counter() - start, result, program.memo
+
+
+def main():
+    memo_size = int(sys.argv[1]) if len(sys.argv) > 1 else 4096
+    print(f"{'workload':16s} {'engine':8s} {'plain':>9s} {'memo':>9s} {'hits':>8s} {'misses':>8s}   output")
+    for name, source in WORKLOADS.items():
+        for engine in Interpreter.ENGINES:
+            plain_time, plain_result, _ = measure(source, engine, None)
+            memo_time, memo_result, memo = measure(source, engine, memo_size)
+            if memo_result.output != plain_result.output:
+                raise RuntimeError(f"{name} printed {memo_result.output} with a memo, {plain_result.output} without")
+            print(
+                f"{name:16s} {engine:8s} {plain_time:8.3f}s {memo_time:8.3f}s"
+                f" {memo.hits:8d} {memo.misses:8d}   {list(memo_result.output)}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# Checks that a long-running loop runs in flat memory: a program that loops through blocks,
+# calls and early returns from inside a while is run for an increasing number of
+# iterations (millions by default), and the peak memory of the process after each run has
+# to stay within --max-growth bytes of its peak after the shortest one. Scopes that are
+# pushed and not popped (or frames that are never freed) make the peak grow with the
+# iterations, and fail it.
+#
+# The peak is the process's resident set size, from getrusage, because tracemalloc slows a
+# run down too much to run it for millions of iterations. So it only catches growth of
+# more than a few hundred KiB, which a leak of one dict per iteration is well past.
+#
+# The tree engine runs about 3 times slower than the others, so give it fewer iterations.
+#
+# usage: python benchmarks/memory_check.py [--engine ENGINE] [--iterations N [N ...]]
+#                                          [--max-growth BYTES]
+import argparse
+import gc
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from interpreterv4 import Interpreter  # noqa: E402
+from program import Program  # noqa: E402
+
+LOOP_SOURCE = """
+func bump(count) {
+  return count + 1;
+}
+
+func find(limit) {
+  k = 0;
+  while (true) {
+    k = k + 1;
+    if (k == limit) {
+      return k;
+    }
+  }
+}
+
+func main() {
+  n = inputi();
+  i = 0;
+  total = 0;
+  while (i < n) {
+    total = bump(total);
+    if (i - i / 2 * 2 == 0) {
+      last = find(2);
+    } else {
+      last = find(3);
+    }
+    i = i + 1;
+  }
+  print(total);
+}
+"""
+
+DEFAULT_ITERATIONS = (10000, 100000, 1000000, 2000000)
+DEFAULT_MAX_GROWTH = 2 * 1024 * 1024
+
+
+# gets the peak resident set size of the process so far, in bytes
+def peak_rss():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux gives it in KiB, macOS in bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+# runs the loop for iterations and gets the process's peak memory after it
+def peak_memory(program, iterations):
+    gc.collect()
+    result = program.run([str(iterations)])
+    if result.status != Program.OK:
+        raise RuntimeError(f"the loop didn't run to the end: {result.error}")
+    expected = str(iterations)
+    if list(result.output) != [expected]:
+        raise RuntimeError(f"the loop printed {list(result.output)}, expected {[expected]}")
+    return peak_rss()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that a long Brewin loop runs in flat memory.")
+    parser.add_argument('--engine', choices=Interpreter.ENGINES, default=Interpreter.CLOSURE_ENGINE)
+    parser.add_argument('--iterations', type=int, nargs='+', default=DEFAULT_ITERATIONS)
+    parser.add_argument('--max-growth', type=int, default=DEFAULT_MAX_GROWTH, help="allowed growth of the peak, in bytes")
+    args = parser.parse_args()
+
+    program = Interpreter(console_output=False, engine=args.engine).compile(LOOP_SOURCE)
+    print(f"engine {args.engine}")
+    print(f"{'iterations':>12s} {'time':>9s} {'peak KiB':>10s} {'growth':>10s}")
+    first_peak = None
+    failed = []
+    for iterations in sorted(args.iterations):
+        start = time.perf_counter()
+        peak = peak_memory(program, iterations)
+        elapsed = time.perf_counter() - start
+        if first_peak is None:
+            first_peak = peak
+        growth = peak - first_peak
+        print(f"{iterations:12d} {elapsed:8.2f}s {peak / 1024:10.1f} {growth / 1024:+10.1f}")
+        if growth > args.max_growth:
+            failed.append(iterations)
+
+    if failed:
+        print(f"memory grew by more than {args.max_growth} bytes at {', '.join(map(str, failed))} iterations")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# Runs a program that prints a line of several parts on every iteration of a loop with
+# each output sink (the console ones write to /dev/null): time, and the memory held by
+# the lines a sink keeps.
+#
+# usage: python benchmarks/output_bench.py [lines]
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from interpreterv4 import Interpreter  # noqa: E402
+from output_sink import BufferedSink, ConsoleSink, CountSink, ListSink, RingSink  # noqa: E402
+
+PROGRAM = """
+func main() {
+  i = 0;
+  while (i < %d) {
+    print("line ", i, ": ", i * 3, " ", i > 5);
+    i = i + 1;
+  }
+}
+"""
+
+
+def measure(name, program, make_sink):
+    gc.collect()
+    sink = make_sink()
+    start = time.perf_counter()
+    program.run(output_sink=sink)
+    elapsed = time.perf_counter() - start
+    del sink
+    gc.collect()
+    tracemalloc.start()
+    sink = make_sink()
+    program.run(output_sink=sink)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:24s} {elapsed:8.3f} s {current / 1024:12.1f} KiB kept")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    program = Interpreter(console_output=False).compile(PROGRAM % n)
+    print(f"{n} printed lines")
+    with open(os.devnull, 'w') as devnull:
+        measure("list (default)", program, ListSink)
+        measure("console, per line", program, lambda: ConsoleSink(devnull))
+        measure("buffered, 64 KiB", program, lambda: BufferedSink(devnull))
+        measure("ring, last 100", program, lambda: RingSink(100))
+        measure("count only", program, CountSink)
+
+
+if __name__ == "__main__":
+    main()
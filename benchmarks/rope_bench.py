@@ -0,0 +1,98 @@
+# Builds strings of a million characters and more with string concats in while loops
+# (appending chunks, appending one character at a time, and doubling), then prints and
+# compares them, on each engine. With --flat, every concat copies its strings the way it
+# used to (no rope.Rope), which takes quadratic time: give it a smaller --length.
+#
+# usage: python benchmarks/rope_bench.py [--length N] [--flat] [--engine ENGINE]
+import argparse
+import gc
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import rope  # noqa: E402
+from interpreterv4 import Interpreter  # noqa: E402
+from output_sink import CountSink  # noqa: E402
+from program import Program  # noqa: E402
+
+WORKLOADS = {
+    # the string grows by 10 characters an iteration
+    "chunks": """
+func main() {
+  n = inputi() / 10;
+  s = "";
+  i = 0;
+  while (i < n) {
+    s = s + "abcdefghij";
+    i = i + 1;
+  }
+  print(s);
+}
+""",
+    # one character an iteration
+    "chars": """
+func main() {
+  n = inputi();
+  s = "";
+  i = 0;
+  while (i < n) {
+    s = s + "x";
+    i = i + 1;
+  }
+  print(s);
+}
+""",
+    # doubles the string until it's long enough, then compares two copies made the same
+    # way and one a character longer (told apart by its length alone)
+    "doubling": """
+func double(n) {
+  s = "abcdefghij";
+  while (n > 10) {
+    s = s + s;
+    n = n / 2;
+  }
+  return s;
+}
+func main() {
+  n = inputi();
+  a = double(n);
+  b = double(n);
+  print(a == b, " ", a == b + "!");
+  print(a);
+}
+""",
+}
+
+
+def measure(name, source, engine, length):
+    program = Interpreter(console_output=False, engine=engine).compile(source)
+    sink = CountSink()
+    gc.collect()
+    start = time.perf_counter()
+    result = program.run([str(length)], output_sink=sink)
+    elapsed = time.perf_counter() - start
+    if result.status != Program.OK:
+        raise RuntimeError(f"{name} didn't run to the end: {result.error}")
+    print(f"{name:10s} {engine:8s} {elapsed:8.3f}s   printed {sink.chars} characters")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time building long strings with concats.")
+    parser.add_argument('--length', type=int, default=1000000, help="characters to build")
+    parser.add_argument('--flat', action='store_true', help="copy on every concat, without ropes")
+    parser.add_argument('--engine', choices=Interpreter.ENGINES, default=None, help="(default: every engine)")
+    args = parser.parse_args()
+
+    if args.flat:
+        rope.ROPE_MIN_LENGTH = sys.maxsize
+    engines = [args.engine] if args.engine else Interpreter.ENGINES
+    print(f"strings of {args.length} characters, {'flat' if args.flat else 'ropes'}")
+    for name, source in WORKLOADS.items():
+        for engine in engines:
+            measure(name, source, engine, args.length)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+# Runs the Brewin workloads in benchmarks/programs and reports, for each one, its run time,
+# the peak memory of a run and its allocations, then compares them against a saved
+# baseline and fails when a workload got slower (or bigger) than the baseline by more
+# than a threshold.
+#
+# Every workload is a program.br with the output it has to print in program.out (a run
+# that prints anything else fails the suite, so a fast but wrong engine can't pass). Each
+# is compiled once, run once to warm up, then timed over --repeat runs; the best run is
+# what gets compared. Peak memory comes from one more run under tracemalloc (which slows
+# a run down too much to time it). Allocations are the objects the gc tracked during a
+# timed run, counted from its generation 0 collections, so short-lived objects that are
+# freed before a collection aren't counted.
+#
+# The baseline is a JSON file of results by engine and optimization level. It depends on
+# the machine, so it isn't checked in: save one with --save before changing the
+# interpreter, then run the suite again to compare.
+#
+# usage: python benchmarks/suite.py [workload ...] [--engine ENGINE] [-O LEVEL]
+#                                   [--repeat N] [--baseline FILE] [--save]
+#                                   [--threshold FRACTION] [--memory-threshold FRACTION]
+import argparse
+import gc
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, ".."))
+
+from interpreterv4 import Interpreter  # noqa: E402
+from optimizer import Optimizer  # noqa: E402
+from program import Program  # noqa: E402
+
+PROGRAMS_DIR = os.path.join(BENCHMARKS_DIR, "programs")
+DEFAULT_BASELINE = os.path.join(BENCHMARKS_DIR, "baseline.json")
+# a peak that grew by less than this isn't a regression, however small the baseline was
+MIN_PEAK_GROWTH = 16 * 1024
+
+
+def workload_names():
+    return sorted(name[:-3] for name in os.listdir(PROGRAMS_DIR) if name.endswith(".br"))
+
+
+# counts the gc's generation 0 collections while it's active
+class CollectionCounter:
+    def __init__(self):
+        self.collections = 0
+
+    def __call__(self, phase, info):
+        if phase == "start" and info["generation"] == 0:
+            self.collections += 1
+
+    def __enter__(self):
+        gc.callbacks.append(self)
+        self.start_count = gc.get_count()[0]
+        return self
+
+    def __exit__(self, *exc_info):
+        gc.callbacks.remove(self)
+        self.end_count = gc.get_count()[0]
+
+    # each collection starts once the count of tracked objects reaches the threshold
+    def allocations(self):
+        return max(self.collections * gc.get_threshold()[0] + self.end_count - self.start_count, 0)
+
+
+def run_checked(name, program, expected):
+    result = program.run()
+    if result.status != Program.OK:
+        raise RuntimeError(f"{name} didn't run to the end: {result.error}")
+    if list(result.output) != expected:
+        raise RuntimeError(f"{name} printed {list(result.output)}, expected {expected}")
+
+
+def measure(name, engine, opt_level, repeat):
+    with open(os.path.join(PROGRAMS_DIR, name + ".br")) as program_file:
+        source = program_file.read()
+    with open(os.path.join(PROGRAMS_DIR, name + ".out")) as expected_file:
+        expected = expected_file.read().splitlines()
+    program = Interpreter(console_output=False, engine=engine, opt_level=opt_level).compile(source)
+    run_checked(name, program, expected)
+
+    times = []
+    allocations = []
+    for _ in range(repeat):
+        gc.collect()
+        with CollectionCounter() as counter:
+            start = time.perf_counter()
+            run_checked(name, program, expected)
+            times.append(time.perf_counter() - start)
+        allocations.append(counter.allocations())
+
+    gc.collect()
+    tracemalloc.start()
+    run_checked(name, program, expected)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "time": min(times),
+        "median": statistics.median(times),
+        "peak": peak,
+        "allocations": min(allocations),
+    }
+
+
+# gets the metrics of a result that went over their threshold, as "metric +N%" strings
+def regressions(result, base, threshold, memory_threshold):
+    over = []
+    for metric, limit in (("time", threshold), ("peak", memory_threshold), ("allocations", memory_threshold)):
+        if not base.get(metric) or result[metric] <= base[metric] * (1 + limit):
+            continue
+        if metric == "peak" and result[metric] - base[metric] < MIN_PEAK_GROWTH:
+            continue
+        over.append(f"{metric} +{(result[metric] / base[metric] - 1) * 100:.0f}%")
+    return over
+
+
+def format_change(value, base_value):
+    if not base_value:
+        return ""
+    return f"{(value / base_value - 1) * 100:+6.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Brewin benchmark workloads.")
+    parser.add_argument('workloads', nargs='*', help="workloads to run (default: all)")
+    parser.add_argument('--engine', choices=Interpreter.ENGINES, default=Interpreter.CLOSURE_ENGINE)
+    parser.add_argument('-O', dest='opt_level', type=int, choices=Optimizer.LEVELS, default=Optimizer.O1)
+    parser.add_argument('--repeat', type=int, default=5, help="timed runs per workload")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save', action='store_true', help="save the results as the baseline")
+    parser.add_argument('--threshold', type=float, default=0.15, help="allowed slowdown (0.15 is 15%%)")
+    parser.add_argument('--memory-threshold', type=float, default=0.10, help="allowed growth of peak memory and allocations")
+    args = parser.parse_args()
+
+    names = args.workloads or workload_names()
+    unknown = set(names) - set(workload_names())
+    if unknown:
+        parser.error(f"unknown workloads: {', '.join(sorted(unknown))}")
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+    config = f"{args.engine} -O{args.opt_level}"
+    base_results = baseline.get(config, {})
+
+    print(f"engine {args.engine}, -O{args.opt_level}, best of {args.repeat}")
+    print(f"{'workload':16s} {'time':>9s} {'median':>9s} {'peak KiB':>10s} {'allocs':>9s}   vs baseline")
+    results = {}
+    failed = []
+    for name in names:
+        result = results[name] = measure(name, args.engine, args.opt_level, args.repeat)
+        base = base_results.get(name, {})
+        changes = "  ".join(
+            f"{metric} {format_change(result[metric], base.get(metric))}"
+            for metric in ("time", "peak", "allocations") if base.get(metric)
+        )
+        print(
+            f"{name:16s} {result['time']:8.3f}s {result['median']:8.3f}s"
+            f" {result['peak'] / 1024:10.1f} {result['allocations']:9d}   {changes or '(no baseline)'}"
+        )
+        over = regressions(result, base, args.threshold, args.memory_threshold)
+        if over:
+            failed.append(f"{name}: {', '.join(over)}")
+
+    if args.save:
+        baseline[config] = {**base_results, **results}
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+        print(f"saved the baseline for {config} to {args.baseline}")
+        return
+    if failed:
+        print("regressions:\n  " + "\n  ".join(failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# Compares the slotted Value with shared TRUE/FALSE/NIL and small ints against the old
+# representation (a Value with a __dict__, made through create_value's string checks) on
+# an arithmetic-heavy loop: time, and the memory held by the values it makes.
+#
+# usage: python benchmarks/value_bench.py [iterations]
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from intbase import InterpreterBase  # noqa: E402
+from type_valuev1 import Type, bool_value, int_value  # noqa: E402
+
+
+# the Value and create_value this replaces
+class DictValue:
+    def __init__(self, type, value=None):
+        self.t = type
+        self.v = value
+
+
+def dict_create_value(val):
+    if val == InterpreterBase.TRUE_DEF:
+        return DictValue(Type.BOOL, True)
+    elif val == InterpreterBase.FALSE_DEF:
+        return DictValue(Type.BOOL, False)
+    elif val == InterpreterBase.NIL_DEF:
+        return DictValue(Type.NIL, None)
+    elif isinstance(val, str):
+        return DictValue(Type.STRING, val)
+    elif isinstance(val, int):
+        return DictValue(Type.INT, val)
+
+
+def dict_bool_value(b):
+    if b:
+        return dict_create_value("true")
+    return dict_create_value("false")
+
+
+# i = 0; s = 0; while (i < n) { s = s + i % 7 * 2 - 1; i = i + 1; }
+# keeping every value made, like a program that stores them would
+def old_loop(n):
+    kept = []
+    i = dict_create_value(0)
+    s = dict_create_value(0)
+    limit = dict_create_value(n)
+    while dict_bool_value(i.v < limit.v).v:
+        t = dict_create_value(i.v % 7)
+        t = dict_create_value(t.v * 2)
+        t = dict_create_value(s.v + t.v)
+        s = dict_create_value(t.v - 1)
+        i = dict_create_value(i.v + 1)
+        kept.append(t)
+    return s.v, kept
+
+
+def new_loop(n):
+    kept = []
+    i = int_value(0)
+    s = int_value(0)
+    limit = int_value(n)
+    while bool_value(i.v < limit.v).v:
+        t = int_value(i.v % 7)
+        t = int_value(t.v * 2)
+        t = int_value(s.v + t.v)
+        s = int_value(t.v - 1)
+        i = int_value(i.v + 1)
+        kept.append(t)
+    return s.v, kept
+
+
+def measure(name, loop, n):
+    gc.collect()
+    start = time.perf_counter()
+    result, kept = loop(n)
+    elapsed = time.perf_counter() - start
+    del kept
+    gc.collect()
+    tracemalloc.start()
+    _, kept = loop(n)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:24s} {elapsed:8.3f} s {peak / 1024:12.1f} KiB peak   result {result}")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    print(f"arithmetic loop, {n} iterations")
+    measure("dict Value", old_loop, n)
+    measure("slotted, shared Values", new_loop, n)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,641 @@
+import sys
+
+from analysis import frame_names, lambda_free_names, reference_names, scope_lookup_names
+from compiler import Context, FunctionCode, compile_arg_reference, compile_lookup, compile_reference, find_func_value
+from inline_cache import InlineCache
+from optimizer import Optimizer, format_value
+from type_valuev1 import NIL, Type, Value, bool_value, create_value
+
+# The BytecodeCompiler turns every func (and lambda) node of a parsed program into a flat
+# list of instructions for vm.VM, which runs them in one dispatch loop with an operand
+# stack and its own stack of call frames (so a deep Brewin recursion doesn't recurse in
+# python).
+#
+# The body of a FunctionCode is [opcode, operand, opcode, operand, ...], so an instruction
+# sits at an even pc and a jump operand is the pc it jumps to. Expressions push their
+# Value; statements leave the stack as they found it.
+#
+# Anything that needs more than the opcode (a variable name, its frame slot, whether the
+# running lambda node is passed down to it, an inline cache) is kept in a site object as
+# the operand. The sites are made from the same compiler.Context as the closure engine's,
+# so both engines read the same variables through the same slots, drop the lambda node in
+# the same places and report the same errors.
+#
+# A call is compiled as
+#   CALL_FUNCTION / CALL_VARIABLE / CALL_METHOD   find the callee, push its frame scope and
+#                                                  a pending call on the operand stack
+#   <arg 0> BIND_ARG 0 ... <arg n-1> BIND_ARG n-1  args are evaluated after the callee's
+#                                                  frame is pushed, like in the other engines
+#   ENTER                                          run the callee; RETURN pushes its value
+#
+# "return f(...)" ends with TAIL_ENTER instead when f can be shown (by
+# analysis.scope_lookup_names) never to look up a name the caller's frame can hold: then
+# the caller's frame can be dropped before f runs without changing what any lookup finds,
+# so a chain of such calls runs in constant space.
+#
+# With a memo, any other call by name to a pure function ends with ENTER_MEMO instead of
+# ENTER, which skips running the callee when the memo has its result for the bound args.
+#
+# The arithmetic, comparison and equality instructions are quickened by the VM as a
+# program runs: each one's Operator counts the operand types it sees, and once it has seen
+# the same ones QUICKEN_WARMUP times in a row (ints, say, for the < of a loop condition)
+# the instruction is rewritten in place to one specialized for them (COMPARE_INT). A
+# specialized instruction only checks its guard (that the operands are still those types)
+# and does the operation without the generic checks and conversions. When the guard
+# fails, the instruction is rewritten back (deoptimized) and run as the generic one; it
+# waits twice as long before the next quickening, and after MAX_DEOPTS deopts it stays
+# generic. specialization_stats gets what every one of them has done.
+
+LOAD_SLOT = 0
+LOAD_NAME = 1
+CONST = 2
+STORE_SLOT = 3
+STORE_NAME = 4
+BINARY_ADD = 5
+BINARY_OP = 6
+COMPARE = 7
+JUMP_IF_FALSE = 8
+JUMP_IF_TRUE = 9
+JUMP = 10
+PUSH_SCOPE = 11
+POP_SCOPE = 12
+BINARY_ADD_INT = 13
+BINARY_ADD_STRING = 14
+BINARY_OP_INT = 15
+COMPARE_INT = 16
+EQUAL_INT = 17
+NOT_EQUAL_INT = 18
+LOAD_FIELD = 19
+STORE_FIELD = 20
+CALL_FUNCTION = 21
+CALL_VARIABLE = 22
+CALL_METHOD = 23
+BIND_ARG = 24
+ENTER = 25
+RETURN = 26
+RETURN_NIL = 27
+POP = 28
+PRINT = 29
+EQUAL = 30
+NOT_EQUAL = 31
+BOOL_AND = 32
+BOOL_OR = 33
+NOT = 34
+NEG = 35
+LOAD_FUNC = 36
+NEW_OBJECT = 37
+MAKE_LAMBDA = 38
+PROMPT = 39
+INPUTI = 40
+INPUTS = 41
+INPUT_ARGS_ERROR = 42
+INVALID = 43
+TAIL_ENTER = 44
+ENTER_MEMO = 45
+
+OPCODE_NAMES = (
+    'LOAD_SLOT', 'LOAD_NAME', 'CONST', 'STORE_SLOT', 'STORE_NAME', 'BINARY_ADD', 'BINARY_OP',
+    'COMPARE', 'JUMP_IF_FALSE', 'JUMP_IF_TRUE', 'JUMP', 'PUSH_SCOPE', 'POP_SCOPE', 'BINARY_ADD_INT',
+    'BINARY_ADD_STRING', 'BINARY_OP_INT', 'COMPARE_INT', 'EQUAL_INT', 'NOT_EQUAL_INT', 'LOAD_FIELD',
+    'STORE_FIELD', 'CALL_FUNCTION', 'CALL_VARIABLE', 'CALL_METHOD', 'BIND_ARG', 'ENTER', 'RETURN',
+    'RETURN_NIL', 'POP', 'PRINT', 'EQUAL', 'NOT_EQUAL', 'BOOL_AND', 'BOOL_OR', 'NOT', 'NEG',
+    'LOAD_FUNC', 'NEW_OBJECT', 'MAKE_LAMBDA', 'PROMPT', 'INPUTI', 'INPUTS', 'INPUT_ARGS_ERROR',
+    'INVALID', 'TAIL_ENTER', 'ENTER_MEMO',
+)
+
+ARITHMETIC_OPS = {
+    '-': lambda a, b: a - b,
+    '*': lambda a, b: a * b,
+    '/': lambda a, b: a // b,
+}
+COMPARISON_OPS = {
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+}
+
+
+QUICKEN_WARMUP = 16
+MAX_DEOPTS = 4
+
+# (generic opcode, operand types) -> the opcode specialized for those types
+SPECIALIZED = {
+    (BINARY_ADD, Type.INT, Type.INT): BINARY_ADD_INT,
+    (BINARY_ADD, Type.STRING, Type.STRING): BINARY_ADD_STRING,
+    (BINARY_OP, Type.INT, Type.INT): BINARY_OP_INT,
+    (COMPARE, Type.INT, Type.INT): COMPARE_INT,
+    (EQUAL, Type.INT, Type.INT): EQUAL_INT,
+    (NOT_EQUAL, Type.INT, Type.INT): NOT_EQUAL_INT,
+}
+# specialized opcode -> the generic opcode it deoptimizes to
+GENERIC = {specialized: key[0] for key, specialized in SPECIALIZED.items()}
+
+
+# operand of BINARY_ADD, BINARY_OP, COMPARE, EQUAL and NOT_EQUAL (and of what they're
+# quickened to), with the type feedback of its instruction
+class Operator:
+    __slots__ = ("name", "fn", "types", "seen", "warmup", "quickenings", "deopts")
+
+    def __init__(self, name, fn=None):
+        self.name = name
+        self.fn = fn
+        self.types = None  # the operand types seen last
+        self.seen = 0  # how many times in a row they were seen
+        self.warmup = QUICKEN_WARMUP  # the times in a row that quicken it (0: never again)
+        self.quickenings = 0
+        self.deopts = 0
+
+
+# operand of LOAD_SLOT, LOAD_NAME, STORE_SLOT and STORE_NAME (slot is None for the last two)
+class VarSite:
+    __slots__ = ("name", "in_lambda", "slot")
+
+    def __init__(self, name, in_lambda, slot=None):
+        self.name = name
+        self.in_lambda = in_lambda
+        self.slot = slot
+
+
+# operand of LOAD_FIELD and STORE_FIELD
+class FieldSite:
+    __slots__ = ("name", "field_name", "in_lambda", "lookup", "cache")
+
+    def __init__(self, name, field_name, in_lambda, lookup):
+        self.name = name  # "obj.field"
+        self.field_name = field_name
+        self.in_lambda = in_lambda
+        self.lookup = lookup  # gets the object variable (see compiler.compile_lookup)
+        self.cache = InlineCache(field_name)
+
+
+# operand of LOAD_FUNC
+class FuncSite:
+    __slots__ = ("name", "in_lambda", "func_node", "overloaded")
+
+    def __init__(self, name, in_lambda, func_node, overloaded):
+        self.name = name
+        self.in_lambda = in_lambda
+        self.func_node = func_node
+        self.overloaded = overloaded
+
+
+# operand of CALL_FUNCTION (code is the callee) and CALL_VARIABLE (lookup gets the variable)
+class CallSite:
+    __slots__ = ("name", "arity", "in_lambda", "code", "lookup")
+
+    def __init__(self, name, arity, in_lambda, code=None, lookup=None):
+        self.name = name
+        self.arity = arity
+        self.in_lambda = in_lambda
+        self.code = code
+        self.lookup = lookup
+
+
+# operand of CALL_METHOD
+class MethodSite:
+    __slots__ = ("name", "obj_name", "method_name", "arity", "lookup", "reference", "cache")
+
+    def __init__(self, obj_name, method_name, arity, lookup, reference):
+        self.name = f"{obj_name}.{method_name}"
+        self.obj_name = obj_name
+        self.method_name = method_name
+        self.arity = arity
+        self.lookup = lookup
+        self.reference = reference  # gets the Cell of the object variable, which becomes "this"
+        self.cache = InlineCache(method_name)
+
+
+# operand of BIND_ARG. reference gets the Cell of the variable passed, if it can be passed
+# by reference
+class ArgSite:
+    __slots__ = ("name", "index", "reference")
+
+    def __init__(self, index, reference):
+        self.name = f"{index}" if reference is None else f"{index} (ref {reference.var_name})"
+        self.index = index
+        self.reference = reference  # the compiler.ArgReference of the arg, or None
+
+
+# operand of MAKE_LAMBDA
+class LambdaSite:
+    __slots__ = ("name", "node", "capture_names")
+
+    def __init__(self, name, node, capture_names):
+        self.name = name
+        self.node = node
+        self.capture_names = capture_names
+
+
+# operand of JUMP_IF_FALSE and JUMP_IF_TRUE, with the error for a condition that isn't a bool
+class Jump:
+    __slots__ = ("target", "message")
+
+    def __init__(self, message):
+        self.target = None
+        self.message = message
+
+
+class BytecodeCompiler:
+    def __init__(self, ast, function_table, memo=None):
+        self.ast = ast
+        self.functions_list = ast.dict['functions'] or []
+        self.function_table = function_table
+        self.memo = memo  # the memo.Memo that calls to pure functions go through, or None
+        self.codes = {}  # id(func or lambda node) -> FunctionCode
+        self.func_value_codes = {}  # (function name, number of args) -> FunctionCode
+        self.scope_lookups = {}  # id(func node) -> analysis.scope_lookup_names of it
+
+        # create all the codes first so calls can be bound before their callee is compiled
+        for func_node in self.functions_list:
+            self.codes[id(func_node)] = FunctionCode(func_node)
+        for func_node in self.functions_list:
+            self.compile_function(self.codes[id(func_node)], is_lambda=False)
+
+    # FUNCTIONS
+
+    def compile_function(self, code, is_lambda):
+        body = []
+        # only the top-level statements of a lambda see its captured variables
+        self.compile_block(body, code.node.dict['statements'], Context(code, is_lambda))
+        emit(body, RETURN_NIL)
+        code.body = body
+        return code
+
+    def compile_block(self, body, statement_nodes, ctx):
+        for node in statement_nodes or []:
+            self.compile_statement(body, node, ctx)
+
+    # STATEMENTS
+
+    def compile_statement(self, body, node, ctx):
+        elem_type = node.elem_type
+        if elem_type == '=':
+            self.compile_assignment(body, node, ctx)
+        elif elem_type == 'fcall' or elem_type == 'mcall':
+            # the return value of a call statement is thrown away
+            self.compile_call(body, node, ctx)
+            emit(body, POP)
+        elif elem_type == 'return':
+            if node.dict['expression'] is None:
+                emit(body, RETURN_NIL)
+            elif self.is_tail_call(node.dict['expression'], ctx):
+                self.compile_call(body, node.dict['expression'], ctx.block(), tail=True)
+            else:
+                self.compile_expression(body, node.dict['expression'], ctx)
+                emit(body, RETURN)
+        elif elem_type == 'if':
+            self.compile_if(body, node, ctx)
+        elif elem_type == 'while':
+            self.compile_while(body, node, ctx)
+
+    def compile_assignment(self, body, node, ctx):
+        target_var_name = node.dict['name']
+        self.compile_expression(body, node.dict['expression'], ctx)
+
+        if '.' in target_var_name:
+            split_names = target_var_name.split('.')
+            lookup_object = compile_lookup(split_names[0], ctx)
+            emit(body, STORE_FIELD, FieldSite(target_var_name, split_names[1], ctx.in_lambda, lookup_object))
+            return
+
+        slot = ctx.slot(target_var_name)
+        if slot is None:
+            emit(body, STORE_NAME, VarSite(target_var_name, ctx.in_lambda))
+        else:
+            emit(body, STORE_SLOT, VarSite(target_var_name, ctx.in_lambda, slot))
+
+    def compile_if(self, body, node, ctx):
+        # the optimizer marks blocks that can't create a variable as not needing a scope
+        scoped = node.dict.get('scoped', True)
+        self.compile_expression(body, node.dict['condition'], ctx.block())
+        skip_then = Jump("If condition does not evaluate to a boolean")
+        emit(body, JUMP_IF_FALSE, skip_then)
+
+        self.compile_scoped_block(body, node.dict['statements'], ctx, scoped)
+        if node.dict['else_statements'] is None:
+            skip_then.target = len(body)
+            return
+        skip_else = emit(body, JUMP)
+        skip_then.target = len(body)
+        self.compile_scoped_block(body, node.dict['else_statements'], ctx, scoped)
+        body[skip_else + 1] = len(body)
+
+    def compile_while(self, body, node, ctx):
+        scoped = node.dict.get('scoped', True)
+        # the first check of the condition reports a non-bool like an if does
+        self.compile_expression(body, node.dict['condition'], ctx.block())
+        skip_loop = Jump("If condition does not evaluate to a boolean")
+        emit(body, JUMP_IF_FALSE, skip_loop)
+
+        # new scope for each iteration
+        loop = Jump("While condition does not evaluate to a boolean")
+        loop.target = len(body)
+        self.compile_scoped_block(body, node.dict['statements'], ctx, scoped)
+        self.compile_expression(body, node.dict['condition'], ctx.block())
+        emit(body, JUMP_IF_TRUE, loop)
+        skip_loop.target = len(body)
+
+    # if/while bodies don't get the lambda node
+    def compile_scoped_block(self, body, statement_nodes, ctx, scoped):
+        if scoped:
+            emit(body, PUSH_SCOPE)
+        self.compile_block(body, statement_nodes, ctx.body(statement_nodes, self.function_table))
+        if scoped:
+            emit(body, POP_SCOPE)
+
+    # EXPRESSIONS
+
+    def compile_expression(self, body, node, ctx):
+        elem_type = node.elem_type
+
+        if elem_type == '@':
+            emit(body, NEW_OBJECT)
+        elif elem_type == 'value':
+            # a literal (or constant expression) the optimizer already made the Value for
+            emit(body, CONST, node.dict['val'])
+        elif elem_type == 'int' or elem_type == 'string':
+            val = node.dict['val']
+            if elem_type == 'string' and (val == 'true' or val == 'false' or val == 'nil'):
+                emit(body, CONST, Value(Type.STRING, val))
+            else:
+                emit(body, CONST, create_value(val))
+        elif elem_type == 'bool':
+            emit(body, CONST, bool_value(node.dict['val']))
+        elif elem_type == 'nil':
+            emit(body, CONST, NIL)
+        elif elem_type == 'var':
+            self.compile_var(body, node, ctx)
+        elif elem_type == '+':
+            self.compile_operands(body, node, ctx)
+            emit(body, BINARY_ADD, Operator(elem_type))
+        elif elem_type in ARITHMETIC_OPS:
+            self.compile_operands(body, node, ctx)
+            emit(body, BINARY_OP, Operator(elem_type, ARITHMETIC_OPS[elem_type]))
+        elif elem_type in COMPARISON_OPS:
+            self.compile_operands(body, node, ctx)
+            emit(body, COMPARE, Operator(elem_type, COMPARISON_OPS[elem_type]))
+        elif elem_type == 'neg':
+            self.compile_operands(body, node, ctx)
+            emit(body, NEG)
+        elif elem_type == '!':
+            self.compile_operands(body, node, ctx)
+            emit(body, NOT)
+        elif elem_type == '&&' or elem_type == '||':
+            # both sides are always evaluated
+            self.compile_operands(body, node, ctx)
+            emit(body, BOOL_AND if elem_type == '&&' else BOOL_OR)
+        elif elem_type == '==' or elem_type == '!=':
+            self.compile_operands(body, node, ctx)
+            emit(body, EQUAL if elem_type == '==' else NOT_EQUAL, Operator(elem_type))
+        elif node.dict.get('name') == 'inputi' or node.dict.get('name') == 'inputs':
+            self.compile_input(body, node, ctx)
+        elif elem_type == 'fcall' or elem_type == 'mcall':
+            # calls inside expressions don't pass on the lambda node
+            self.compile_call(body, node, ctx.block())
+        elif elem_type == 'lambda':
+            self.compile_lambda(body, node)
+        else:
+            emit(body, INVALID)
+
+    def compile_operands(self, body, node, ctx):
+        self.compile_expression(body, node.dict['op1'], ctx)
+        if 'op2' in node.dict:
+            self.compile_expression(body, node.dict['op2'], ctx)
+
+    def compile_var(self, body, node, ctx):
+        var_name = node.dict['name']
+
+        # a function name shadows variables, so that is known ahead of time
+        func_matches = self.function_table.overloads(var_name)
+        if len(func_matches) >= 1:
+            emit(body, LOAD_FUNC, FuncSite(var_name, ctx.in_lambda, func_matches[0], len(func_matches) > 1))
+            return
+
+        if '.' in var_name:
+            split_names = var_name.split('.')
+            lookup_object = compile_lookup(split_names[0], ctx)
+            emit(body, LOAD_FIELD, FieldSite(var_name, split_names[1], ctx.in_lambda, lookup_object))
+            return
+
+        slot = ctx.slot(var_name)
+        if slot is None:
+            emit(body, LOAD_NAME, VarSite(var_name, ctx.in_lambda))
+        else:
+            emit(body, LOAD_SLOT, VarSite(var_name, ctx.in_lambda, slot))
+
+    def compile_input(self, body, node, ctx):
+        args = node.dict['args']
+        if args:
+            # can't have more than one param to inputi/inputs
+            if len(args) > 1:
+                emit(body, INPUT_ARGS_ERROR, node.dict['name'])
+                return
+            self.compile_expression(body, args[0], ctx)
+            emit(body, PROMPT)
+        emit(body, INPUTI if node.dict['name'] == 'inputi' else INPUTS)
+
+    def compile_lambda(self, body, node):
+        code = FunctionCode(node)
+        code.name = f"lambda#{len(self.codes) - len(self.functions_list)}"
+        self.codes[id(node)] = code
+        self.compile_function(code, is_lambda=True)
+        # only the variables the body uses are captured
+        emit(body, MAKE_LAMBDA, LambdaSite(code.name, node, lambda_free_names(node)))
+
+    # CALLS
+
+    # whether "return node" can drop the caller's frame before the call runs
+    def is_tail_call(self, node, ctx):
+        if node.elem_type != 'fcall' or node.dict['name'] in ('print', 'inputi', 'inputs'):
+            return False
+        callee = self.function_table.lookup(node.dict['name'], len(node.dict['args']))
+        if callee is None:
+            return False
+        if reference_names([node], self.function_table):
+            # the variables it passes by reference can't go with the caller's frame
+            return False
+        if id(callee) not in self.scope_lookups:
+            self.scope_lookups[id(callee)] = scope_lookup_names(callee, self.function_table)
+        names = self.scope_lookups[id(callee)]
+        if names is None:
+            return False
+        # ref calls in the caller's blocks can leave variables in scopes of their own
+        caller = ctx.code.node
+        caller_names = frame_names(caller) | reference_names(caller.dict['statements'], self.function_table)
+        return names.isdisjoint(caller_names)
+
+    def compile_call(self, body, node, ctx, tail=False):
+        name = node.dict['name']
+        arg_nodes = node.dict['args']
+
+        if name == 'print':
+            for arg in arg_nodes:
+                self.compile_expression(body, arg, ctx)
+            emit(body, PRINT, len(arg_nodes))
+            return
+
+        arity = len(arg_nodes)
+        function_elem = self.function_table.lookup(name, arity)
+        if node.elem_type == 'mcall':
+            obj_name = node.dict['objref']
+            # "this" is a reference to the object variable
+            site = MethodSite(obj_name, name, arity, compile_lookup(obj_name, ctx), compile_reference(obj_name, ctx, 0))
+            emit(body, CALL_METHOD, site)
+        elif function_elem is not None:
+            emit(body, CALL_FUNCTION, CallSite(name, arity, ctx.in_lambda, code=self.codes[id(function_elem)]))
+        else:
+            # the name must be a variable that references a function or lambda
+            emit(body, CALL_VARIABLE, CallSite(name, arity, ctx.in_lambda, lookup=compile_lookup(name, ctx)))
+
+        if node.elem_type == 'fcall' and function_elem is not None:
+            param_names = [arg.get('name') for arg in function_elem.dict['args']]
+        else:
+            param_names = None
+
+        # args of user-defined functions are evaluated without the lambda node
+        for i in range(arity):
+            arg = arg_nodes[i]
+            bound_params = None if param_names is None else param_names[:i]
+            self.compile_expression(body, arg, ctx.args(bound_params))
+            emit(body, BIND_ARG, ArgSite(i, compile_arg_reference(arg, ctx, self.function_table)))
+        if tail:
+            emit(body, TAIL_ENTER)
+        elif node.elem_type == 'fcall' and function_elem is not None and self.memo is not None and self.memo.is_pure(function_elem):
+            emit(body, ENTER_MEMO)
+        else:
+            emit(body, ENTER)
+
+    # gets the code of the function a FUNC value names (memoized per name and arity)
+    def resolve_func_value(self, rt, func_value, arity):
+        key = (func_value.v.dict['name'], arity)
+        code = self.func_value_codes.get(key)
+        if code is not None:
+            return code
+        code = self.codes[id(find_func_value(rt, self.function_table, func_value, arity))]
+        self.func_value_codes[key] = code
+        return code
+
+
+# appends an instruction and gets its pc
+def emit(body, opcode, operand=None):
+    body.append(opcode)
+    body.append(operand)
+    return len(body) - 2
+
+
+# formats the instructions of a function, one per line
+def disassemble(code):
+    params = ", ".join(("ref " if is_ref else "") + name for name, is_ref in code.params)
+    lines = [f"{code.name}({params}):"]
+    body = code.body
+    targets = set()
+    for pc in range(0, len(body), 2):
+        if body[pc] == JUMP:
+            targets.add(body[pc + 1])
+        elif body[pc] == JUMP_IF_FALSE or body[pc] == JUMP_IF_TRUE:
+            targets.add(body[pc + 1].target)
+    for pc in range(0, len(body), 2):
+        marker = ">>" if pc in targets else "  "
+        lines.append(f"  {marker} {pc:4d} {OPCODE_NAMES[body[pc]]:17s}{format_operand(body[pc], body[pc + 1])}".rstrip())
+    return "\n".join(lines)
+
+
+def format_operand(opcode, operand):
+    if operand is None:
+        return ""
+    if opcode == CONST:
+        return format_value(operand)
+    if opcode == JUMP:
+        return f"to {operand}"
+    if opcode == JUMP_IF_FALSE or opcode == JUMP_IF_TRUE:
+        return f"to {operand.target}"
+    if opcode == CALL_FUNCTION or opcode == CALL_VARIABLE or opcode == CALL_METHOD:
+        return f"{operand.name}/{operand.arity}"
+    if hasattr(operand, 'name'):
+        return f"{operand.name}"
+    return f"{operand}"
+
+
+# formats every function of a compiled program, then the lambdas in them
+def disassemble_program(compiler):
+    return "\n\n".join(disassemble(code) for code in compiler.codes.values())
+
+
+# gets what every quickenable instruction of a compiled program has done so far: the
+# function it's in, its pc, the operator, the instruction it is now, the operand types it
+# saw last, and how many times it was quickened and deoptimized
+def specialization_stats(compiler):
+    stats = []
+    for code in compiler.codes.values():
+        body = code.body
+        for pc in range(0, len(body), 2):
+            site = body[pc + 1]
+            if not hasattr(site, 'quickenings'):
+                continue
+            stats.append({
+                'function': code.name,
+                'pc': pc,
+                'operator': site.name,
+                'instruction': OPCODE_NAMES[body[pc]],
+                'types': None if site.types is None else tuple(t.name for t in site.types),
+                'quickenings': site.quickenings,
+                'deopts': site.deopts,
+            })
+    return stats
+
+
+def format_specialization_stats(compiler):
+    lines = [f"{'function':16s} {'pc':>5s} {'op':3s} {'instruction':18s} {'types':16s} {'quickened':>9s} {'deopts':>6s}"]
+    for row in specialization_stats(compiler):
+        types = "-" if row['types'] is None else ",".join(row['types'])
+        lines.append(
+            f"{row['function']:16s} {row['pc']:5d} {row['operator']:3s} {row['instruction']:18s}"
+            f" {types:16s} {row['quickenings']:9d} {row['deopts']:6d}"
+        )
+    return "\n".join(lines)
+
+
+# usage: python bytecode.py [-O0|-O1|-O2] [--run] program.br
+# with --run, the program is run on the vm first (its inputs are read from stdin), and its
+# instructions are printed as they were quickened, then the specialization stats
+def main():
+    args = sys.argv[1:]
+    level = Optimizer.O1
+    if args and args[0].startswith('-O'):
+        level = int(args.pop(0)[2:])
+    run = '--run' in args
+    if run:
+        args.remove('--run')
+    if len(args) != 1:
+        print("usage: python bytecode.py [-O0|-O1|-O2] [--run] program.br")
+        sys.exit(1)
+
+    from brewparse import parse_program
+    from function_table import FunctionTable
+
+    with open(args[0]) as program_file:
+        source = program_file.read()
+    if not run:
+        ast = Optimizer(level).optimize(parse_program(source))
+        print(disassemble_program(BytecodeCompiler(ast, FunctionTable(ast.dict['functions']))))
+        return
+
+    from input_provider import StreamInput
+    from interpreterv4 import Interpreter
+
+    program = Interpreter(engine=Interpreter.VM_ENGINE, opt_level=level).compile(source)
+    result = program.run(StreamInput(sys.stdin))
+    for line in result.output:
+        print(line)
+    if result.error is not None:
+        print(f"({result.error})")
+    compiler = program.compiled.compiler
+    print()
+    print(disassemble_program(compiler))
+    print()
+    print(format_specialization_stats(compiler))
+
+
+if __name__ == "__main__":
+    main()
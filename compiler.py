@@ -0,0 +1,1069 @@
+from analysis import frame_slot_names, lambda_free_names, reference_names
+from copy_on_write import CAPTURED_VARS, LAMBDA_NODE, Heap, copy_value
+from env_v1 import Cell, FramePool
+from inline_cache import InlineCache
+from input_provider import parse_int
+from intbase import ErrorType
+from rope import concat_value
+from type_valuev1 import NIL, Type, Value, bool_value, create_value, get_print_text, get_printable, int_value
+
+# The Compiler turns every func (and lambda) node of a parsed program into a tree of
+# python closures, so running a program no longer re-dispatches on elem_type strings.
+#
+# Every compiled expression and statement is a closure f(rt, lambda_node):
+#   rt          - the running Interpreter (scope stacks, input/output, error())
+#   lambda_node - the [lambda node, captured vars] struct of the running lambda, or None
+# Expressions return a Value; statements return None, or the return Value of the
+# function. The closures never hold on to an interpreter, so a compiled program can be
+# run any number of times.
+#
+# The closures follow the tree-walking methods of Interpreter exactly (including the
+# places that deliberately drop the lambda node, like if/while bodies and call args),
+# so both engines produce the same output and errors.
+#
+# Each call runs in an EnvironmentManager frame. Variables that analysis.frame_slot_names
+# proves live in the running function's own frame are read and written through their slot
+# in rt.frame; every other variable is looked up in the scope list at runtime.
+#
+# A variable passed to a refarg is boxed in an env_v1.Cell where it lives, and the callee's
+# param holds that same Cell, so reads and writes go straight to the caller's variable
+# instead of being synced through Interpreter.variable_alias_list. (Passed from a block it
+# doesn't live in, it isn't shared, like with the alias cascade: see compile_reference.)
+# Anything that reads a scope has to unwrap a Cell it finds there.
+#
+# Pass-by-value and return copy objects and lambdas with copy_on_write.copy_value, so every
+# object fields dict and captured vars dict is a copy_on_write.Fields from rt.heap, and
+# has to go through rt.heap.write_barrier before it is changed (rt.heap.set_field does that
+# for object fields, and keeps their shapes.Shape up to date for the inline caches of the
+# field reads and method calls).
+
+ARITHMETIC_OPS = {
+    '+': lambda a, b: a + b,
+    '-': lambda a, b: a - b,
+    '*': lambda a, b: a * b,
+    '/': lambda a, b: a // b,
+}
+COMPARISON_OPS = {
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+}
+
+
+# compiled form of a func or lambda node
+class FunctionCode:
+    def __init__(self, node):
+        self.node = node
+        self.name = node.dict.get('name')
+        self.params = [(arg.get('name'), arg.elem_type == 'refarg') for arg in node.dict['args']]
+        self.slot_names = frame_slot_names(node)
+        self.param_slots = [self.slot_names[name] for name, _ in self.params]
+        self.param_indexes = {}  # param name -> index of its first param
+        for i, (name, _) in enumerate(self.params):
+            self.param_indexes.setdefault(name, i)
+        self.this_slot = self.slot_names.get('this')
+        self.frames = FramePool(self.slot_names)  # the frames of its calls, for reuse
+        self.body = None
+
+
+# what the compiler knows about the place it is compiling
+class Context:
+    def __init__(self, code, in_lambda, hidden_names=()):
+        self.code = code  # the FunctionCode whose body is being compiled
+        self.in_lambda = in_lambda  # whether the running lambda node is passed down to here
+        self.hidden_names = hidden_names  # names that can't be read through frame slots here
+
+    # if/while bodies and calls inside expressions don't get the lambda node
+    def block(self):
+        return Context(self.code, False, self.hidden_names)
+
+    # args are evaluated after the callee's frame is pushed, so the params bound so far
+    # shadow the caller's variables (None when the callee isn't known: shadows anything)
+    def args(self, bound_params=None):
+        if bound_params is None or self.hidden_names is None:
+            return Context(self.code, False, None)
+        return Context(self.code, False, set(self.hidden_names) | set(bound_params))
+
+    # if/while bodies: the variables calls in them can pass by reference can become
+    # variables of the block (see compile_reference), so they're read through the scopes
+    def body(self, statement_nodes, function_table):
+        if self.hidden_names is None:
+            return Context(self.code, False, None)
+        names = reference_names(statement_nodes, function_table)
+        return Context(self.code, False, set(self.hidden_names) | names)
+
+    # gets the frame slot of a variable that always lives in the running function's frame
+    def slot(self, var_name):
+        if self.hidden_names is None or var_name in self.hidden_names:
+            return None
+        return self.code.slot_names.get(var_name)
+
+
+class Compiler:
+    def __init__(self, ast, function_table, memo=None):
+        self.ast = ast
+        self.functions_list = ast.dict['functions'] or []
+        self.function_table = function_table
+        self.memo = memo  # the memo.Memo that calls to pure functions go through, or None
+        self.codes = {}  # id(func or lambda node) -> FunctionCode
+        self.func_value_codes = {}  # (function name, number of args) -> FunctionCode
+
+        # create all the codes first so calls can be bound before their callee is compiled
+        for func_node in self.functions_list:
+            self.codes[id(func_node)] = FunctionCode(func_node)
+        for func_node in self.functions_list:
+            self.compile_function(self.codes[id(func_node)], is_lambda=False)
+
+    def run_main(self, rt, main_node):
+        code = self.codes[id(main_node)]
+        rt.heap = Heap()
+        rt.frame = code.frames.acquire()
+        rt.variable_scope_list = [rt.frame]
+        return code.body(rt, None)
+
+    # FUNCTIONS
+
+    def compile_function(self, code, is_lambda):
+        # only the top-level statements of a lambda see its captured variables
+        statements = self.compile_block(code.node.dict['statements'], Context(code, is_lambda))
+
+        def run_func(rt, lambda_node):
+            return_value = NIL
+            for statement in statements:
+                temp_return_val = statement(rt, lambda_node)
+                if temp_return_val is not None:
+                    return_value = temp_return_val
+                    break
+
+            # delete outermost scope once function is done executing
+            frames.release(rt.variable_scope_list.pop())
+            return return_value
+
+        frames = code.frames
+        code.body = run_func
+        return code
+
+    def compile_block(self, statement_nodes, ctx):
+        if not statement_nodes:
+            return []
+        return [self.compile_statement(node, ctx) for node in statement_nodes]
+
+    # STATEMENTS
+
+    def compile_statement(self, node, ctx):
+        elem_type = node.elem_type
+        if elem_type == '=':
+            return self.compile_assignment(node, ctx)
+        if elem_type == 'fcall' or elem_type == 'mcall':
+            call = self.compile_call(node, ctx)
+
+            # the return value of a call statement is thrown away
+            def call_statement(rt, lambda_node):
+                call(rt, lambda_node)
+
+            return call_statement
+        if elem_type == 'return':
+            return self.compile_return(node, ctx)
+        if elem_type == 'if':
+            return self.compile_if(node, ctx)
+        if elem_type == 'while':
+            return self.compile_while(node, ctx)
+        return lambda rt, lambda_node: None
+
+    def compile_assignment(self, node, ctx):
+        target_var_name = node.dict['name']
+        expression = self.compile_expression(node.dict['expression'], ctx)
+        in_lambda = ctx.in_lambda
+
+        if '.' in target_var_name:
+            split_names = target_var_name.split('.')
+            obj_name = split_names[0]
+            field_name = split_names[1]
+            lookup_object = compile_lookup(obj_name, ctx)
+
+            def assign_field(rt, lambda_node):
+                resulting_value = expression(rt, lambda_node)
+                if in_lambda and lambda_node is not None:
+                    captured_vars_dict = lambda_node[CAPTURED_VARS]
+                    if target_var_name in captured_vars_dict:
+                        assign_captured(rt, captured_vars_dict, target_var_name, resulting_value)
+                        return None
+
+                # if assigning proto, make sure it's an object type
+                if field_name == 'proto' and resulting_value.t != Type.OBJ and resulting_value.t != Type.NIL:
+                    rt.error(
+                        ErrorType.TYPE_ERROR,
+                        "Can't set proto to non-object or non-nil type",
+                    )
+                obj = lookup_object(rt)
+                if obj.t != Type.OBJ:
+                    rt.error(
+                        ErrorType.TYPE_ERROR,
+                        "Attempting to get field/method from non-object type",
+                    )
+                rt.heap.set_field(obj.v, field_name, resulting_value)
+                return None
+
+            return assign_field
+
+        def assign(rt, lambda_node):
+            resulting_value = expression(rt, lambda_node)
+            if in_lambda and lambda_node is not None:
+                captured_vars_dict = lambda_node[CAPTURED_VARS]
+                if target_var_name in captured_vars_dict:
+                    assign_captured(rt, captured_vars_dict, target_var_name, resulting_value)
+                    return None
+            store_scopes(rt, target_var_name, resulting_value)
+            return None
+
+        slot = ctx.slot(target_var_name)
+        if slot is None:
+            return assign
+
+        def assign_slot(rt, lambda_node):
+            resulting_value = expression(rt, lambda_node)
+            if in_lambda and lambda_node is not None:
+                captured_vars_dict = lambda_node[CAPTURED_VARS]
+                if target_var_name in captured_vars_dict:
+                    assign_captured(rt, captured_vars_dict, target_var_name, resulting_value)
+                    return None
+            slots = rt.frame.slots
+            current = slots[slot]
+            if current is None:
+                # not created in this frame (yet), so it may live further down the scopes
+                store_scopes(rt, target_var_name, resulting_value)
+            elif current.__class__ is Cell:
+                current.value = resulting_value
+                if current.home is not None:
+                    current.settle()
+            else:
+                slots[slot] = resulting_value
+            return None
+
+        return assign_slot
+
+    def compile_return(self, node, ctx):
+        if node.dict['expression'] is None:
+            return lambda rt, lambda_node: NIL
+        expression = self.compile_expression(node.dict['expression'], ctx)
+        return lambda rt, lambda_node: copy_value(rt.heap, expression(rt, lambda_node))
+
+    def compile_condition(self, node, ctx, message):
+        condition = self.compile_expression(node, ctx.block())
+
+        def evaluate_condition(rt):
+            return condition_truth(rt, condition(rt, None), message)
+
+        return evaluate_condition
+
+    def compile_if(self, node, ctx):
+        condition = self.compile_condition(node.dict['condition'], ctx, "If condition does not evaluate to a boolean")
+        statements = self.compile_block(node.dict['statements'], ctx.body(node.dict['statements'], self.function_table))
+        has_else = node.dict['else_statements'] is not None
+        else_statements = self.compile_block(node.dict['else_statements'], ctx.body(node.dict['else_statements'], self.function_table))
+        # the optimizer marks blocks that can't create a variable as not needing a scope
+        scoped = node.dict.get('scoped', True)
+
+        def run_if(rt, lambda_node):
+            if condition(rt):
+                block = statements
+            elif has_else:
+                block = else_statements
+            else:
+                return None
+
+            # new scope for block
+            if scoped:
+                rt.variable_scope_list.append({})
+            return_value = None
+            for statement in block:
+                return_value = statement(rt, None)
+                if return_value is not None:
+                    break
+            if scoped:
+                rt.variable_scope_list.pop()
+            return return_value
+
+        return run_if
+
+    def compile_while(self, node, ctx):
+        first_condition = self.compile_condition(node.dict['condition'], ctx, "If condition does not evaluate to a boolean")
+        condition = self.compile_condition(node.dict['condition'], ctx, "While condition does not evaluate to a boolean")
+        statements = self.compile_block(node.dict['statements'], ctx.body(node.dict['statements'], self.function_table))
+
+        def run_while(rt, lambda_node):
+            scopes = rt.variable_scope_list
+            loop = first_condition(rt)
+            while loop:
+                # new scope for each iteration
+                scopes.append({})
+                for statement in statements:
+                    return_value = statement(rt, None)
+                    if return_value is not None:
+                        scopes.pop()
+                        return return_value
+                scopes.pop()
+                loop = condition(rt)
+            return None
+
+        def run_unscoped_while(rt, lambda_node):
+            loop = first_condition(rt)
+            while loop:
+                for statement in statements:
+                    return_value = statement(rt, None)
+                    if return_value is not None:
+                        return return_value
+                loop = condition(rt)
+            return None
+
+        # the optimizer marks blocks that can't create a variable as not needing a scope
+        if node.dict.get('scoped', True):
+            return run_while
+        return run_unscoped_while
+
+    # EXPRESSIONS
+
+    def compile_expression(self, node, ctx):
+        elem_type = node.elem_type
+
+        if elem_type == '@':
+            return lambda rt, lambda_node: Value(Type.OBJ, rt.heap.new_fields())
+
+        if elem_type == 'value':
+            # a literal (or constant expression) the optimizer already made the Value for
+            literal = node.dict['val']
+            return lambda rt, lambda_node: literal
+        if elem_type == 'int' or elem_type == 'string':
+            val = node.dict['val']
+            # literals are converted once, at compile time
+            if elem_type == 'string' and (val == 'true' or val == 'false' or val == 'nil'):
+                literal = Value(Type.STRING, val)
+            else:
+                literal = create_value(val)
+            return lambda rt, lambda_node: literal
+        if elem_type == 'bool':
+            literal = bool_value(node.dict['val'])
+            return lambda rt, lambda_node: literal
+        if elem_type == 'nil':
+            return lambda rt, lambda_node: NIL
+
+        if elem_type == 'var':
+            return self.compile_var(node, ctx)
+        if elem_type in ARITHMETIC_OPS or elem_type in COMPARISON_OPS:
+            return self.compile_binary_op(node, ctx)
+        if elem_type == 'neg':
+            return self.compile_neg(node, ctx)
+        if elem_type == '&&' or elem_type == '||':
+            return self.compile_bool_op(node, ctx)
+        if elem_type == '!':
+            return self.compile_not(node, ctx)
+        if elem_type == '==' or elem_type == '!=':
+            return self.compile_equality(node, ctx)
+        if node.dict.get('name') == 'inputi' or node.dict.get('name') == 'inputs':
+            return self.compile_input(node, ctx)
+        if elem_type == 'fcall' or elem_type == 'mcall':
+            # calls inside expressions don't pass on the lambda node
+            return self.compile_call(node, ctx.block())
+        if elem_type == 'lambda':
+            return self.compile_lambda(node)
+
+        def invalid(rt, lambda_node):
+            rt.error(
+                ErrorType.NAME_ERROR,
+                "Expression is invalid",
+            )
+
+        return invalid
+
+    def compile_var(self, node, ctx):
+        var_name = node.dict['name']
+        in_lambda = ctx.in_lambda
+
+        # a function name shadows variables, so that is known ahead of time
+        func_matches = self.function_table.overloads(var_name)
+
+        if len(func_matches) >= 1:
+            matched_elem = func_matches[0]
+            overloaded = len(func_matches) > 1
+
+            def read_function(rt, lambda_node):
+                if in_lambda and lambda_node is not None:
+                    value = read_captured(lambda_node, var_name)
+                    if value is not None:
+                        return value
+                if overloaded:
+                    rt.error(
+                        ErrorType.NAME_ERROR,
+                        f"Function {var_name} has been overloaded, so it can't be assigned to a variable",
+                    )
+                return Value(Type.FUNC, matched_elem)
+
+            return read_function
+
+        if '.' in var_name:
+            split_names = var_name.split('.')
+            obj_name = split_names[0]
+            field_name = split_names[1]
+            lookup_object = compile_lookup(obj_name, ctx)
+            cache = InlineCache(field_name)
+
+            def read_field(rt, lambda_node):
+                if in_lambda and lambda_node is not None:
+                    value = read_captured(lambda_node, var_name)
+                    if value is not None:
+                        return value
+                obj = lookup_object(rt)
+                if obj.t != Type.OBJ:
+                    rt.error(
+                        ErrorType.TYPE_ERROR,
+                        "Attempting to get field/method from non-object type",
+                    )
+                # follow the proto chain until the field is found
+                value = cache.lookup(rt.heap, obj)
+                if value is not None:
+                    return value
+                rt.error(
+                    ErrorType.NAME_ERROR,
+                    "Field does not exist on this object",
+                )
+
+            return read_field
+
+        slot = ctx.slot(var_name)
+        if slot is None:
+            def read_var(rt, lambda_node):
+                if in_lambda and lambda_node is not None:
+                    value = read_captured(lambda_node, var_name)
+                    if value is not None:
+                        return value
+                return read_scopes(rt, var_name)
+
+            return read_var
+
+        def read_slot(rt, lambda_node):
+            if in_lambda and lambda_node is not None:
+                value = read_captured(lambda_node, var_name)
+                if value is not None:
+                    return value
+            value = rt.frame.slots[slot]
+            if value is None:
+                # not created in this frame (yet), so it may live further down the scopes
+                return read_scopes(rt, var_name)
+            if value.__class__ is Cell:
+                return value.value
+            return value
+
+        return read_slot
+
+    def compile_binary_op(self, node, ctx):
+        op = node.elem_type
+        op1 = self.compile_expression(node.dict['op1'], ctx)
+        op2 = self.compile_expression(node.dict['op2'], ctx)
+
+        if op in COMPARISON_OPS:
+            compare = COMPARISON_OPS[op]
+
+            def comparison(rt, lambda_node):
+                a, b = check_ints(rt, op1(rt, lambda_node), op2(rt, lambda_node))
+                return bool_value(compare(a, b))
+
+            return comparison
+
+        arithmetic = ARITHMETIC_OPS[op]
+        if op == '+':
+            def add(rt, lambda_node):
+                op1_val = op1(rt, lambda_node)
+                op2_val = op2(rt, lambda_node)
+                # string concat
+                if op1_val.t == Type.STRING and op2_val.t == Type.STRING:
+                    return concat_value(op1_val.v, op2_val.v)
+                a, b = check_ints(rt, op1_val, op2_val)
+                return int_value(a + b)
+
+            return add
+
+        def arithmetic_op(rt, lambda_node):
+            a, b = check_ints(rt, op1(rt, lambda_node), op2(rt, lambda_node))
+            return int_value(arithmetic(a, b))
+
+        return arithmetic_op
+
+    def compile_neg(self, node, ctx):
+        op1 = self.compile_expression(node.dict['op1'], ctx)
+
+        def neg(rt, lambda_node):
+            op1_val = op1(rt, lambda_node)
+            if op1_val.t != Type.INT:
+                rt.error(
+                    ErrorType.TYPE_ERROR,
+                    "Incompatible type for arithmetic negation",
+                )
+            return int_value(-op1_val.v)
+
+        return neg
+
+    def compile_bool_op(self, node, ctx):
+        is_and = node.elem_type == '&&'
+        op1 = self.compile_expression(node.dict['op1'], ctx)
+        op2 = self.compile_expression(node.dict['op2'], ctx)
+
+        def bool_op(rt, lambda_node):
+            # both sides are always evaluated
+            op1_val = op1(rt, lambda_node)
+            op2_val = op2(rt, lambda_node)
+            a = op1_val.v != 0 if op1_val.t == Type.INT else op1_val.v
+            b = op2_val.v != 0 if op2_val.t == Type.INT else op2_val.v
+            if (op1_val.t != Type.INT and op1_val.t != Type.BOOL) or (op2_val.t != Type.INT and op2_val.t != Type.BOOL):
+                rt.error(
+                    ErrorType.TYPE_ERROR,
+                    "Incompatible types for boolean operation",
+                )
+            if is_and:
+                return bool_value(a and b)
+            return bool_value(a or b)
+
+        return bool_op
+
+    def compile_not(self, node, ctx):
+        op1 = self.compile_expression(node.dict['op1'], ctx)
+
+        def bool_not(rt, lambda_node):
+            op1_val = op1(rt, lambda_node)
+            if op1_val.t == Type.INT:
+                return bool_value(op1_val.v == 0)
+            if op1_val.t != Type.BOOL:
+                rt.error(
+                    ErrorType.TYPE_ERROR,
+                    "Incompatible type for boolean negation",
+                )
+            return bool_value(not op1_val.v)
+
+        return bool_not
+
+    def compile_equality(self, node, ctx):
+        is_eq = node.elem_type == '=='
+        op1 = self.compile_expression(node.dict['op1'], ctx)
+        op2 = self.compile_expression(node.dict['op2'], ctx)
+
+        def equality(rt, lambda_node):
+            equal = values_equal(op1(rt, lambda_node), op2(rt, lambda_node))
+            return bool_value(equal == is_eq)
+
+        return equality
+
+    def compile_input(self, node, ctx):
+        is_inputi = node.dict['name'] == 'inputi'
+        args = node.dict['args']
+        prompt = None
+        if args:
+            prompt = self.compile_expression(args[0], ctx)
+
+        def get_input(rt, lambda_node):
+            if args:
+                # can't have more than one param to inputi/inputs
+                if len(args) > 1:
+                    rt.error(
+                        ErrorType.NAME_ERROR,
+                        f"{node.dict['name']}() function found that takes > 1 parameter",
+                    )
+                rt.output(get_printable(prompt(rt, lambda_node)))
+            return read_input(rt, is_inputi)
+
+        return get_input
+
+    def compile_lambda(self, node):
+        code = FunctionCode(node)
+        self.codes[id(node)] = code
+        self.compile_function(code, is_lambda=True)
+        # only the variables the body uses are captured
+        capture_names = lambda_free_names(node)
+
+        def make_lambda(rt, lambda_node):
+            return Value(Type.LAMBDA, [node, capture_vars(rt, capture_names)])
+
+        return make_lambda
+
+    # CALLS
+
+    def compile_call(self, node, ctx):
+        name = node.dict['name']
+        arg_nodes = node.dict['args']
+        in_lambda = ctx.in_lambda
+
+        if name == 'print':
+            args = [self.compile_expression(arg, ctx) for arg in arg_nodes]
+
+            def print_call(rt, lambda_node):
+                rt.output("".join([get_print_text(arg(rt, lambda_node)) for arg in args]))
+                return NIL
+
+            return print_call
+
+        references = [compile_arg_reference(arg, ctx, self.function_table) for arg in arg_nodes]
+        arity = len(arg_nodes)
+        function_elem = self.function_table.lookup(name, arity)
+        if node.elem_type == 'fcall' and function_elem is not None:
+            param_names = [arg.get('name') for arg in function_elem.dict['args']]
+        else:
+            param_names = None
+
+        # args of user-defined functions are evaluated without the lambda node
+        args = []
+        for i in range(arity):
+            bound_params = None if param_names is None else param_names[:i]
+            args.append(self.compile_expression(arg_nodes[i], ctx.args(bound_params)))
+
+        if node.elem_type == 'mcall':
+            return self.compile_method_call(node, ctx, args, references)
+
+        if function_elem is not None:
+            code = self.codes[id(function_elem)]
+            memo = self.memo
+            if memo is not None and memo.is_pure(function_elem):
+
+                def call_pure_function(rt, lambda_node):
+                    return self.invoke_memoized(rt, code, args, memo)
+
+                return call_pure_function
+
+            def call_function(rt, lambda_node):
+                return self.invoke(rt, code, None, args, references, None)
+
+            return call_function
+
+        lookup_function = compile_lookup(name, ctx)
+
+        def call_variable(rt, lambda_node):
+            # the name must be a variable that references a function or lambda
+            var_value = lookup_function(rt)
+            if var_value.t == Type.FUNC:
+                code = self.resolve_func_value(rt, var_value, arity)
+                return self.invoke(rt, code, None, args, references, None)
+            # captured variables take precedence inside of a lambda
+            if in_lambda and lambda_node is not None and var_value.t == Type.LAMBDA and name in lambda_node[CAPTURED_VARS]:
+                captured_lambda = lambda_node[CAPTURED_VARS][name]
+                code = self.codes[id(captured_lambda.v[LAMBDA_NODE])]
+                return self.invoke(rt, code, captured_lambda, args, references, None)
+            if var_value.t == Type.LAMBDA:
+                code = self.codes[id(var_value.v[LAMBDA_NODE])]
+                if len(code.params) != arity:
+                    rt.error(
+                        ErrorType.TYPE_ERROR,
+                        "Invalid number of args passed into lambda",
+                    )
+                return self.invoke(rt, code, var_value.v, args, references, None)
+            rt.error(
+                ErrorType.TYPE_ERROR,
+                "Attempting to call function on non-function variable type",
+            )
+
+        return call_variable
+
+    def compile_method_call(self, node, ctx, args, references):
+        obj_name = node.dict['objref']
+        method_name = node.dict['name']
+        arity = len(args)
+        lookup_object = compile_lookup(obj_name, ctx)
+        # "this" is a reference to the object variable
+        reference_object = compile_reference(obj_name, ctx, 0)
+        cache = InlineCache(method_name)
+
+        def call_method(rt, lambda_node):
+            this_cell = reference_object(rt)
+            if this_cell is None:
+                lookup_object(rt)  # reports the undefined variable
+            obj = this_cell.value
+            if obj.t != Type.OBJ:
+                rt.error(
+                    ErrorType.TYPE_ERROR,
+                    "Trying to call method on non-object",
+                )
+
+            # follow the proto chain until the method is found
+            var_value = cache.lookup(rt.heap, obj)
+            if var_value is None:
+                rt.error(
+                    ErrorType.NAME_ERROR,
+                    "Method does not exist on this object",
+                )
+
+            if var_value.t == Type.FUNC:
+                code = self.resolve_func_value(rt, var_value, arity)
+                return self.invoke(rt, code, None, args, references, this_cell)
+            if var_value.t == Type.LAMBDA:
+                code = self.codes[id(var_value.v[LAMBDA_NODE])]
+                if len(code.params) != arity:
+                    rt.error(
+                        ErrorType.NAME_ERROR,
+                        "Invalid number of args passed into obj lambda method",
+                    )
+                return self.invoke(rt, code, var_value.v, args, references, this_cell)
+            rt.error(
+                ErrorType.TYPE_ERROR,
+                "Attempting to call function on non-function variable type",
+            )
+
+        return call_method
+
+    # gets the code of the function a FUNC value names (memoized per name and arity)
+    def resolve_func_value(self, rt, func_value, arity):
+        key = (func_value.v.dict['name'], arity)
+        code = self.func_value_codes.get(key)
+        if code is not None:
+            return code
+        code = self.codes[id(find_func_value(rt, self.function_table, func_value, arity))]
+        self.func_value_codes[key] = code
+        return code
+
+    # set up the frame for the function and run it
+    def invoke(self, rt, code, lambda_node, args, references, this_cell):
+        frame = code.frames.acquire()
+        rt.variable_scope_list.append(frame)
+
+        slots = frame.slots
+        for i in range(len(args)):
+            bind_arg(rt, code, slots, i, args[i](rt, None), references[i], this_cell)
+
+        # if this is an object, then add the this variable to be the objref
+        if this_cell is not None:
+            frame["this"] = this_cell
+
+        caller_frame = rt.frame
+        rt.frame = frame
+        return_value = code.body(rt, lambda_node)
+        rt.frame = caller_frame
+        return return_value
+
+    # like invoke, for a pure function (no refargs, no lambda node, no "this"): once its
+    # args are bound, the memo may already have its result
+    def invoke_memoized(self, rt, code, args, memo):
+        frame = code.frames.acquire()
+        rt.variable_scope_list.append(frame)
+
+        slots = frame.slots
+        param_slots = code.param_slots
+        for i in range(len(args)):
+            arg_val = args[i](rt, None)
+            if arg_val.t == Type.LAMBDA or arg_val.t == Type.OBJ:
+                arg_val = copy_value(rt.heap, arg_val)
+            slots[param_slots[i]] = arg_val
+
+        key = memo.key(code.node, [slots[slot] for slot in param_slots])
+        if key is not None:
+            return_value = memo.lookup(key)
+            if return_value is not None:
+                code.frames.release(rt.variable_scope_list.pop())
+                return return_value
+
+        caller_frame = rt.frame
+        rt.frame = frame
+        return_value = code.body(rt, None)
+        rt.frame = caller_frame
+        if key is not None:
+            memo.store(key, return_value)
+        return return_value
+
+
+# RUNTIME HELPERS (shared with the bytecode engine)
+
+# reads a captured variable of the running lambda (None if it isn't captured)
+def read_captured(lambda_node, var_name):
+    captured_vars = lambda_node[CAPTURED_VARS]
+    if not captured_vars.has_lambdas:
+        return captured_vars.get(var_name)
+    for key, value in captured_vars.items():
+        if var_name == key:
+            return value
+        if value.t == Type.LAMBDA:
+            for key2, value2 in value.v[CAPTURED_VARS].items():
+                if var_name == key2:
+                    return value2
+    return None
+
+
+# reads a variable from the closest scope that has it
+def read_scopes(rt, var_name):
+    scopes = rt.variable_scope_list
+    for scope_index in range(len(scopes) - 1, -1, -1):
+        scope = scopes[scope_index]
+        if var_name in scope:
+            value = scope[var_name]
+            if value.__class__ is Cell:
+                return value.value
+            return value
+    rt.error(
+        ErrorType.NAME_ERROR,
+        f"Variable {var_name} has not been defined",
+    )
+
+
+# updates the closest scope that has the variable, otherwise the innermost one
+def store_scopes(rt, var_name, value):
+    scopes = rt.variable_scope_list
+    for i in range(len(scopes) - 1, -1, -1):
+        if var_name in scopes[i]:
+            break
+    else:
+        scopes[-1][var_name] = value
+        return
+    scope = scopes[i]
+    current = scope[var_name]
+    if current.__class__ is Cell:
+        current.value = value
+        if current.home is not None:
+            current.settle()
+    else:
+        scope[var_name] = value
+
+
+# changes a captured variable of the running lambda
+def assign_captured(rt, captured_vars, var_name, value):
+    rt.heap.write_barrier(captured_vars)
+    if value.t == Type.LAMBDA:
+        captured_vars.has_lambdas = True
+    captured_vars[var_name] = value
+
+
+# compiles a lookup of a variable that holds an object or function to call
+def compile_lookup(var_name, ctx):
+    def lookup_scopes(rt):
+        scope_index = rt.validate_var_name(var_name)
+        value = rt.variable_scope_list[scope_index][var_name]
+        if value.__class__ is Cell:
+            return value.value
+        return value
+
+    slot = ctx.slot(var_name)
+    if slot is None:
+        return lookup_scopes
+
+    def lookup_slot(rt):
+        value = rt.frame.slots[slot]
+        if value is None:
+            return lookup_scopes(rt)
+        if value.__class__ is Cell:
+            return value.value
+        return value
+
+    return lookup_slot
+
+# compiles getting the Cell of a variable that is passed by reference, boxing the
+# variable where it lives the first time. the top skip_top scopes are not searched
+# (the callee's frame is already pushed when args are bound). gets None if not found
+#
+# Like the alias cascade of the tree engine, which writes a ref param through to the
+# variable of that name in the scope just below the callee's, a variable is only shared
+# when it lives in the innermost scope of the call. Passed from a block it doesn't live
+# in, it gets a pending Cell that becomes a variable of that block when the callee first
+# sets it, and goes with the block.
+def compile_reference(var_name, ctx, skip_top):
+    def reference_scopes(rt):
+        scopes = rt.variable_scope_list
+        innermost = len(scopes) - 1 - skip_top
+        for scope_index in range(innermost, -1, -1):
+            scope = scopes[scope_index]
+            if var_name in scope:
+                value = scope[var_name]
+                if scope_index != innermost:
+                    return pending_cell(scopes[innermost], var_name, value)
+                if value.__class__ is Cell:
+                    return value
+                cell = Cell(value)
+                scope[var_name] = cell
+                return cell
+        return None
+
+    slot = ctx.slot(var_name)
+    if slot is None:
+        return reference_scopes
+
+    def reference_slot(rt):
+        frame = rt.frame
+        slots = frame.slots
+        value = slots[slot]
+        if value is None:
+            return reference_scopes(rt)
+        scopes = rt.variable_scope_list
+        innermost = scopes[len(scopes) - 1 - skip_top]
+        if innermost is not frame:
+            # passed from a block of the function
+            return pending_cell(innermost, var_name, value)
+        if value.__class__ is Cell:
+            return value
+        cell = Cell(value)
+        slots[slot] = cell
+        return cell
+
+    return reference_slot
+
+
+# an arg that is a plain variable, which a refarg param can share
+class ArgReference:
+    __slots__ = ("var_name", "reference")
+
+    def __init__(self, var_name, reference):
+        self.var_name = var_name
+        self.reference = reference  # gets the Cell of the variable (see compile_reference)
+
+
+# gets the ArgReference of an arg of a call, or None if it isn't a plain variable
+def compile_arg_reference(arg_node, ctx, function_table):
+    if arg_node.elem_type != 'var' or '.' in arg_node.dict['name'] or function_table.overloads(arg_node.dict['name']):
+        return None
+    var_name = arg_node.dict['name']
+    # the callee's frame is pushed before the args are evaluated
+    return ArgReference(var_name, compile_reference(var_name, ctx, 1))
+
+
+# binds the value of the i-th arg of a call to its param in the callee's frame slots: a
+# refarg shares the caller's variable (an arg that isn't one is bound as is), and the other
+# params get copies of objects and lambdas
+def bind_arg(rt, code, slots, i, arg_val, arg_reference, this_cell):
+    slot = code.param_slots[i]
+    if code.params[i][1]:
+        cell = None
+        if arg_reference is not None:
+            cell = arg_reference.reference(rt)
+            if (cell is None or cell.home is not None) and code.param_indexes.get(arg_reference.var_name, i) < i:
+                # the arg names a param bound before it, which arg_val was read from (the
+                # args are evaluated in the callee's frame). unless the caller's innermost
+                # scope has that variable, it only gets there once the refarg is set
+                scopes = rt.variable_scope_list
+                cell = pending_cell(scopes[len(scopes) - 2], arg_reference.var_name, arg_val)
+        if cell is None:
+            cell = arg_val
+        elif cell.home is not None:
+            cell = share_pending(cell, slots, code.param_slots[:i], this_cell)
+        slots[slot] = cell
+    elif arg_val.t == Type.LAMBDA or arg_val.t == Type.OBJ:
+        slots[slot] = copy_value(rt.heap, arg_val)
+    else:
+        slots[slot] = arg_val
+
+
+# gets a pending Cell of a variable's value, that becomes the variable of home once set
+def pending_cell(home, var_name, value):
+    if value.__class__ is Cell:
+        value = value.value
+    return Cell(value, home, var_name)
+
+
+# the alias cascade writes every ref param (and "this") of a call that names the same
+# variable through to the same scope, so their pending Cells have to be one Cell: gets
+# the pending Cell of a param bound before it (or "this") instead, if there is one
+def share_pending(cell, slots, bound_slots, this_cell):
+    for value in [slots[slot] for slot in bound_slots] + [this_cell]:
+        if value.__class__ is Cell and value.home is not None and value.name == cell.name:
+            return value
+    return cell
+
+
+# gets the ints of the operands of an arithmetic or comparison operator
+def check_ints(rt, op1_val, op2_val):
+    a = op1_val.v
+    b = op2_val.v
+    if op1_val.t == Type.BOOL:
+        a = 1 if a else 0
+    elif op1_val.t != Type.INT:
+        a = None
+    if op2_val.t == Type.BOOL:
+        b = 1 if b else 0
+    elif op2_val.t != Type.INT:
+        b = None
+    if a is None or b is None:
+        rt.error(
+            ErrorType.TYPE_ERROR,
+            "Incompatible types for arithmetic operation",
+        )
+    return a, b
+
+
+def values_equal(op1_val, op2_val):
+    t1 = op1_val.t
+    t2 = op2_val.t
+    if t1 == t2:
+        if t1 == Type.LAMBDA or t1 == Type.OBJ:
+            return op1_val is op2_val
+        if t1 == Type.NIL:
+            return True
+        if t1 == Type.FUNC:
+            return op1_val.v is op2_val.v
+        return op1_val.v == op2_val.v
+    if t1 == Type.INT and t2 == Type.BOOL:
+        return (op1_val.v != 0) == op2_val.v
+    if t1 == Type.BOOL and t2 == Type.INT:
+        return op1_val.v == (op2_val.v != 0)
+    return False
+
+
+# whether an if/while condition holds
+def condition_truth(rt, value, message):
+    if value.t == Type.INT:
+        return value.v != 0
+    if value.t != Type.BOOL:
+        rt.error(ErrorType.TYPE_ERROR, message)
+    return value.v
+
+
+# gets the Value of an input line that was read elsewhere (None if there was none left)
+def input_value(rt, user_input, is_inputi):
+    if not is_inputi:
+        return create_value(user_input)
+    if user_input is None:
+        raise EOFError("No input left")
+    user_input = parse_int(user_input)
+    if user_input is None:
+        rt.error(
+            ErrorType.TYPE_ERROR,
+            "Input was not integer",
+        )
+    return int_value(user_input)
+
+
+def read_input(rt, is_inputi):
+    if not is_inputi:
+        return create_value(rt.get_input())
+    user_input = rt.get_int_input()
+    if user_input is None:
+        rt.error(
+            ErrorType.TYPE_ERROR,
+            "Input was not integer",
+        )
+    return int_value(user_input)
+
+
+# captures the non-object, non-lambda value of each variable from the outermost scope that
+# has one (those values are never changed in place, so they can be shared)
+def capture_vars(rt, capture_names):
+    captured_vars = rt.heap.new_captured_vars()
+    scopes = rt.variable_scope_list
+    for name in capture_names:
+        for scope in scopes:
+            value = scope.get(name)
+            if value is None:
+                continue
+            if value.__class__ is Cell:
+                value = value.value
+            if value.t != Type.OBJ and value.t != Type.LAMBDA:
+                captured_vars[name] = value
+                break
+    return captured_vars
+
+
+# a FUNC value names a function; every function with that name must take this many args
+def find_func_value(rt, function_table, func_value, arity):
+    function_elem = None
+    for elem in function_table.overloads(func_value.v.dict['name']):
+        if len(elem.dict['args']) != arity:
+            rt.error(
+                ErrorType.TYPE_ERROR,
+                "Invalid number of args passed into function",
+            )
+        function_elem = elem
+    if function_elem is None:
+        rt.error(
+            ErrorType.NAME_ERROR,
+            f"Function {func_value.v.dict['name']} has not been defined",
+        )
+    return function_elem
@@ -0,0 +1,212 @@
+import weakref
+
+from shapes import Shape
+from type_valuev1 import Type, Value
+
+# Copy-on-write copies of objects and lambdas, used for pass-by-value and return.
+#
+# Copying an OBJ or LAMBDA makes a LazyCopy in O(1): it reads through to the value it was
+# copied from, and only builds its own fields (or captured vars) when something needs them
+# - e.g. it is assigned to. Objects and lambdas reached from a LazyCopy are copied the same
+# way when they are read, and every copy made by one copy_value call shares a Snapshot, so
+# an object reached twice still gives the same copy (like the memo of copy.deepcopy).
+#
+# A LazyCopy is only right as long as nothing it reads through changes. Every fields dict
+# (Fields) records the epoch it was created in, and every Snapshot the epoch it was taken
+# in, so before a dict is changed the Heap materializes the pending snapshots that are
+# newer than that dict (the only ones that can reach it). A snapshot that dies before that
+# (like the params of a function that only reads them) is never materialized at all.
+#
+# The fields of an object also keep its shapes.Shape up to date, and count as a prototype
+# once some object's proto has been set to them. Adding a field to a prototype, or
+# changing its proto, moves Heap.proto_epoch on, which is what lets inline_cache.InlineCache
+# remember where in a proto chain a field was found.
+
+# same layout as Interpreter.LAMBDA_NODE / Interpreter.CAPTURED_VARS
+LAMBDA_NODE = 0
+CAPTURED_VARS = 1
+
+
+# a dict of values that copies can read through
+class Fields(dict):
+    __slots__ = ("epoch",)
+
+    def __init__(self, epoch):
+        super().__init__()
+        self.epoch = epoch
+
+
+# the fields of an object (inline caches keep weak references to them)
+class ObjectFields(Fields):
+    __slots__ = ("shape", "is_proto", "__weakref__")
+
+    def __init__(self, epoch, shape, is_proto=False):
+        super().__init__(epoch)
+        self.shape = shape
+        self.is_proto = is_proto
+
+
+# the captured vars of a lambda. has_lambdas tells if any of them may hold a lambda, whose
+# own captured vars are then searched too when a captured variable is read
+class CapturedVars(Fields):
+    __slots__ = ("has_lambdas",)
+
+    def __init__(self, epoch, has_lambdas=False):
+        super().__init__(epoch)
+        self.has_lambdas = has_lambdas
+
+
+# the objects and pending copies of one running program
+class Heap:
+    def __init__(self):
+        self.epoch = 0
+        self.pending = []  # (epoch, weakref to Snapshot), oldest first
+        self.root_shape = Shape()  # the shape of an object with no fields
+        self.proto_epoch = 0
+
+    def new_fields(self):
+        return ObjectFields(self.epoch, self.root_shape)
+
+    def new_captured_vars(self, has_lambdas=False):
+        return CapturedVars(self.epoch, has_lambdas)
+
+    # must be called before a Fields is changed
+    def write_barrier(self, fields):
+        pending = self.pending
+        while pending and fields.epoch < pending[-1][0]:
+            snapshot = pending.pop()[1]()
+            if snapshot is not None:
+                snapshot.materialize()
+
+    # sets a field of an object
+    def set_field(self, fields, field_name, value):
+        self.write_barrier(fields)
+        if field_name not in fields:
+            fields.shape = fields.shape.add(field_name)
+            if fields.is_proto:
+                self.proto_epoch += 1
+        if field_name == 'proto':
+            if value.t == Type.OBJ:
+                value.v.is_proto = True
+            if fields.is_proto:
+                self.proto_epoch += 1
+        fields[field_name] = value
+
+
+# one copy_value call
+class Snapshot:
+    __slots__ = ("heap", "epoch", "memo", "copies", "__weakref__")
+
+    def __init__(self, heap):
+        self.heap = heap
+        self.memo = {}  # id(value) -> (value, weakref to its copy)
+        self.copies = []  # weakrefs to the copies, in the order they were made
+
+        heap.epoch += 1
+        self.epoch = heap.epoch
+        # drop the snapshots that died since the last one
+        pending = heap.pending
+        while pending and pending[-1][1]() is None:
+            pending.pop()
+        pending.append((heap.epoch, weakref.ref(self)))
+
+    # gets the copy of a value reached from the copied one
+    def copy_of(self, val):
+        if val.t != Type.OBJ and val.t != Type.LAMBDA:
+            return val
+        entry = self.memo.get(id(val))
+        if entry is not None:
+            copy = entry[1]()
+            if copy is not None:
+                return copy
+        if val.__class__ is LazyCopy:
+            # a copy from another snapshot can't be read through, so build it first
+            val.materialize()
+        copy = LazyCopy(val, self)
+        ref = weakref.ref(copy)
+        self.memo[id(val)] = (val, ref)
+        self.copies.append(ref)
+        return copy
+
+    # materialize every copy that still reads through to the values it was copied from
+    def materialize(self):
+        copies = self.copies
+        i = 0
+        while i < len(copies):
+            copy = copies[i]()
+            if copy is not None and copy.__class__ is LazyCopy:
+                copy.materialize()
+            i += 1
+
+
+# the v slot of a Value, where a LazyCopy keeps (source, snapshot) until it's materialized
+VALUE_SLOT = Value.v
+
+
+# a Value whose v is built from the value it copies the first time it's needed
+# (after that it's turned into a plain Value)
+class LazyCopy(Value):
+    __slots__ = ()
+
+    def __init__(self, source, snapshot):
+        self.t = source.t
+        VALUE_SLOT.__set__(self, (source, snapshot))
+
+    @property
+    def v(self):
+        self.materialize()
+        return self.v
+
+    # gets (the value this copies, the Snapshot it belongs to)
+    def pending(self):
+        return VALUE_SLOT.__get__(self, LazyCopy)
+
+    # the built fields get the epoch of the snapshot, not the current one: every snapshot
+    # taken since then may have copied this copy and read through to them
+    def materialize(self):
+        source, snapshot = self.pending()
+        if self.t == Type.OBJ:
+            source_fields = source.v
+            # same fields in the same order, so the same shape
+            v = ObjectFields(snapshot.epoch, source_fields.shape, source_fields.is_proto)
+            for key, field_val in source_fields.items():
+                v[key] = snapshot.copy_of(field_val)
+        else:
+            source_captured_vars = source.v[CAPTURED_VARS]
+            captured_vars = CapturedVars(snapshot.epoch, source_captured_vars.has_lambdas)
+            for key, captured_val in source_captured_vars.items():
+                captured_vars[key] = snapshot.copy_of(captured_val)
+            v = [source.v[LAMBDA_NODE], captured_vars]
+        self.__class__ = Value
+        self.v = v
+
+
+# copy used for pass-by-value and return. other values are never changed in place, so
+# only objects and lambdas need copying
+def copy_value(heap, val):
+    if val.t != Type.OBJ and val.t != Type.LAMBDA:
+        return val
+    return Snapshot(heap).copy_of(val)
+
+
+# gets a field of an object, following the proto chain, without materializing copies
+# (None if it doesn't have it)
+def get_field(obj, field_name):
+    while True:
+        if obj.__class__ is LazyCopy:
+            source, snapshot = obj.pending()
+            fields = source.v
+            if field_name in fields:
+                return snapshot.copy_of(fields[field_name])
+            proto = fields.get('proto')
+            if proto is None or proto.t != Type.OBJ:
+                return None
+            obj = snapshot.copy_of(proto)
+        else:
+            fields = obj.v
+            if field_name in fields:
+                return fields[field_name]
+            proto = fields.get('proto')
+            if proto is None or proto.t != Type.OBJ:
+                return None
+            obj = proto
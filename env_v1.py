@@ -2,16 +2,106 @@
 # in a brewin program and the value of that variable - the value that's passed in can be
 # anything you like. In our implementation we pass in a Value object which holds a type
 # and a value (e.g., Int, 10).
+#
+# Variables whose position is known ahead of time (e.g. a function's params) live in a
+# list of slots and can be read by index; any other variable goes in the environment dict.
+# A slot holding None is a variable that has not been defined yet. It also supports
+# dict-style access, so a frame can sit in a scope list next to plain dicts.
+NO_SLOTS = {}
+
+
+# A variable that has been passed by reference is stored boxed in a Cell, and the callee's
+# param holds the very same Cell, so reads and writes through either name are shared.
+#
+# A pending Cell (one with a home) isn't in any scope yet: it's the param of a variable
+# passed from a scope it doesn't live in (see compiler.compile_reference), and it only
+# becomes the variable name of its home scope once it is first set.
+class Cell:
+    __slots__ = ("value", "home", "name")
+
+    def __init__(self, value, home=None, name=None):
+        self.value = value
+        self.home = home
+        self.name = name
+
+    # makes a pending Cell the variable of its home scope (once it has been set)
+    def settle(self):
+        self.home[self.name] = self
+        self.home = None
+
+
 class EnvironmentManager:
-    def __init__(self):
+    __slots__ = ("slot_names", "slots", "environment", "pool")
+
+    def __init__(self, slot_names=NO_SLOTS, pool=None):
+        self.slot_names = slot_names  # symbol -> slot index, shared by every frame of a function
+        self.slots = [None] * len(slot_names)
         self.environment = {}
+        self.pool = pool  # the FramePool the frame goes back to once its call returns
 
     # Gets the data associated a variable name
     def get(self, symbol):
-        if symbol in self.environment:
-            return self.environment[symbol]
-        return None
+        index = self.slot_names.get(symbol)
+        if index is not None:
+            return self.slots[index]
+        return self.environment.get(symbol)
 
     # Sets the data associated with a variable name
     def set(self, symbol, value):
-        self.environment[symbol] = value
+        index = self.slot_names.get(symbol)
+        if index is not None:
+            self.slots[index] = value
+        else:
+            self.environment[symbol] = value
+
+    def __contains__(self, symbol):
+        index = self.slot_names.get(symbol)
+        if index is not None:
+            return self.slots[index] is not None
+        return symbol in self.environment
+
+    def __getitem__(self, symbol):
+        value = self.get(symbol)
+        if value is None:
+            raise KeyError(symbol)
+        return value
+
+    def __setitem__(self, symbol, value):
+        self.set(symbol, value)
+
+    def items(self):
+        for symbol, index in self.slot_names.items():
+            if self.slots[index] is not None:
+                yield symbol, self.slots[index]
+        yield from self.environment.items()
+
+
+# Keeps the frames of the calls to one function that have returned, emptied, so the next
+# calls can take them instead of making new ones. A frame is only released once nothing
+# can read it any more (scopes never outlive their call: Cells and captured variables are
+# separate objects). Runs on several threads can share a pool.
+class FramePool:
+    MAX_FRAMES = 64
+
+    __slots__ = ("slot_names", "empty_slots", "frames")
+
+    def __init__(self, slot_names):
+        self.slot_names = slot_names
+        self.empty_slots = [None] * len(slot_names)
+        self.frames = []
+
+    def acquire(self):
+        if self.frames:
+            try:
+                return self.frames.pop()
+            except IndexError:
+                # another thread took the last one
+                pass
+        return EnvironmentManager(self.slot_names, self)
+
+    def release(self, frame):
+        if len(self.frames) < FramePool.MAX_FRAMES:
+            frame.slots[:] = self.empty_slots
+            if frame.environment:
+                frame.environment.clear()
+            self.frames.append(frame)
@@ -0,0 +1,182 @@
+import argparse
+import os
+import pickle
+import time
+
+from input_provider import FileInput, LineInput
+from interpreterv4 import Interpreter
+from program import Program, RunResult
+
+STATUS_NAMES = {Program.OK: "ok", Program.ERROR: "error", Program.CRASH: "crash", Program.TIMEOUT: "timeout"}
+
+# Runs one Brewin program against many input streams, paying for the setup it does before
+# its first inputi or inputs only once.
+#
+# The program is run (on any engine) until it first asks for input. Everything it has done
+# by then (its scopes, objects, lambdas, the output so far) is the snapshot, and it is
+# copied with os.fork: at that first request the process forks one child per input
+# stream, which picks up the run right where it is, reading from its own stream, and sends
+# back its RunResult through a pipe when its run ends. The parent only waits for the
+# children, so it never runs past the fork point itself. A forked child shares the
+# parent's memory pages until it writes to them, so a fork costs about the same however
+# big the setup made the heap.
+#
+# The snapshot can't be kept as data instead: the closure and tree engines keep a run's
+# state on the Python stack, and a vm run in a generator, and neither can be copied. So
+# where there's no os.fork (Windows), each stream gets a whole run of its own.
+#
+# At most workers children run at once (by default one per cpu). A program that never asks
+# for input runs just once, and every stream gets its result.
+#
+#   fan_out = FanOut(workers=8)
+#   results = fan_out.run(program, [["1", "2"], ["3", "4"], "inputs/5.txt"])
+#
+# usage: python fanout.py program.br inputs1.txt [inputs2.txt ...] [--workers N]
+#                         [--engine ENGINE] [--max-steps N]
+
+
+# raised in the parent (from the input request it forked at) to end its own run once every
+# child has run
+class ForkPoint(Exception):
+    pass
+
+
+# the input provider of a fanned out run: the first line asked for forks the process, and
+# each child then reads its own stream
+class ForkInput:
+    def __init__(self, fan_out, streams):
+        self.fan_out = fan_out
+        self.streams = streams
+        self.forked = False
+        self.source = None  # the provider of this process's stream, once it has forked
+
+    def next_line(self):
+        if self.source is None:
+            self.fan_out.fork(self)
+        return self.source.next_line()
+
+    def next_int(self):
+        if self.source is None:
+            self.fan_out.fork(self)
+        return self.source.next_int()
+
+
+# gets the input provider of a stream: a provider, a path of a file of lines, or a list (or
+# any iterable) of lines
+def stream_input(stream):
+    if hasattr(stream, 'next_line'):
+        return stream
+    if isinstance(stream, str):
+        return FileInput(stream)
+    return LineInput(stream)
+
+
+class FanOut:
+    def __init__(self, workers=None):
+        if workers is not None and workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.workers = workers or os.cpu_count() or 1
+        self.setup_time = 0.0  # how long the last run took to get to its first input
+        self.forks = 0  # children forked, across every run
+        self.start_time = None
+        self.pipe = None  # in a child, the pipe its result goes back through
+        self.results = None
+
+    # runs a Program once for every input stream and gets their RunResults in the same
+    # order. max_steps is each run's step budget (vm engine only), counting the steps
+    # before the fork too
+    def run(self, program, input_streams, max_steps=None):
+        streams = list(input_streams)
+        if not hasattr(os, 'fork'):
+            return [program.run(stream_input(stream), max_steps) for stream in streams]
+        self.results = [None] * len(streams)
+        fork_input = ForkInput(self, streams)
+        self.start_time = time.perf_counter()
+        try:
+            result = program.run(fork_input, max_steps)
+        except BaseException:
+            if self.pipe is not None:
+                # a child must never get back to its parent's caller
+                os._exit(1)
+            raise
+        if self.pipe is not None:
+            self.report(result)
+        if not fork_input.forked:
+            # it never asked for input, so every stream would have had this same run
+            self.setup_time = time.perf_counter() - self.start_time
+            return [result] * len(streams)
+        return self.results
+
+    # forks a child for each stream, and in the parent, waits for them all and ends the
+    # parent's own run. only returns in a child, with its stream set up to be read
+    def fork(self, fork_input):
+        self.setup_time = time.perf_counter() - self.start_time
+        fork_input.forked = True
+        running = []  # (index, pid, read end of its pipe), oldest first
+        for index, stream in enumerate(fork_input.streams):
+            if len(running) >= self.workers:
+                self.collect(*running.pop(0))
+            read_fd, write_fd = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                os.close(read_fd)
+                for _, _, other_fd in running:
+                    os.close(other_fd)
+                self.pipe = write_fd
+                fork_input.source = stream_input(stream)
+                return
+            os.close(write_fd)
+            self.forks += 1
+            running.append((index, pid, read_fd))
+        for child in running:
+            self.collect(*child)
+        raise ForkPoint("the run was forked for each input stream")
+
+    # in a child: sends its result back to the parent and ends the process
+    def report(self, result):
+        try:
+            try:
+                data = pickle.dumps(result)
+            except Exception as e:
+                data = pickle.dumps(RunResult(result.output, Program.CRASH, None, f"the result couldn't be sent back: {e}"))
+            with os.fdopen(self.pipe, 'wb') as pipe:
+                pipe.write(data)
+        finally:
+            os._exit(0)
+
+    # in the parent: reads a child's result (reading it all before waiting, so a child
+    # with a lot of output isn't stuck on a full pipe)
+    def collect(self, index, pid, read_fd):
+        with os.fdopen(read_fd, 'rb') as pipe:
+            data = pipe.read()
+        _, status = os.waitpid(pid, 0)
+        if data:
+            self.results[index] = pickle.loads(data)
+        else:
+            self.results[index] = RunResult((), Program.CRASH, None, f"the run's process exited with status {status}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a Brewin program on many input files, forking it at its first input.")
+    parser.add_argument('program', help="path of the Brewin program")
+    parser.add_argument('inputs', nargs='+', help="files of input lines, one run each")
+    parser.add_argument('--workers', type=int, default=None, help="children to run at once (default: one per cpu)")
+    parser.add_argument('--engine', choices=Interpreter.ENGINES, default=Interpreter.CLOSURE_ENGINE)
+    parser.add_argument('--max-steps', type=int, default=None, help="step budget of each run (vm engine only)")
+    args = parser.parse_args()
+
+    with open(args.program) as program_file:
+        program = Interpreter(console_output=False, engine=args.engine).compile(program_file.read())
+    fan_out = FanOut(args.workers)
+    start = time.perf_counter()
+    results = fan_out.run(program, args.inputs, args.max_steps)
+    elapsed = time.perf_counter() - start
+    for path, result in zip(args.inputs, results):
+        print(f"== {path}: {STATUS_NAMES[result.status]}" + (f" ({result.error})" if result.error else ""))
+        for line in result.output:
+            print(line)
+    print(f"== {len(results)} runs in {elapsed:.3f}s, setup {fan_out.setup_time:.3f}s, {fan_out.forks} forks")
+
+
+if __name__ == "__main__":
+    main()
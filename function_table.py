@@ -0,0 +1,25 @@
+# The FunctionTable indexes the func nodes of a program once, so calls and
+# function-as-value lookups don't have to scan the whole functions list.
+class FunctionTable:
+    def __init__(self, functions_list):
+        self.by_key = {}  # (name, arity) -> func node, the last one defined wins
+        self.by_name = {}  # name -> func nodes with that name, in the order they were defined
+        for func_node in functions_list or []:
+            name = func_node.dict['name']
+            self.by_key[(name, len(func_node.dict['args']))] = func_node
+            self.by_name.setdefault(name, []).append(func_node)
+
+    # gets the function that a call with this name and number of args resolves to
+    def lookup(self, name, arity):
+        return self.by_key.get((name, arity))
+
+    # gets every function defined with this name
+    def overloads(self, name):
+        return self.by_name.get(name, ())
+
+    # gets the first function defined with this name
+    def first(self, name):
+        overloads = self.by_name.get(name)
+        if overloads:
+            return overloads[0]
+        return None
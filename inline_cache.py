@@ -0,0 +1,74 @@
+import weakref
+
+from copy_on_write import LazyCopy, get_field
+from type_valuev1 import Type, Value
+
+# An InlineCache sits at one "x.f" or "x.m()" site of a program and remembers, for the
+# last few shapes of x seen there, where field f was found:
+#   - in x itself: x.v[f] can be read straight away
+#   - further up the proto chain: the fields dict that holds f, which stays right while x's
+#     proto is the same object and Heap.proto_epoch hasn't moved (no prototype got a new
+#     field or a new proto since)
+# so a repeated access costs a shape check instead of a walk of the proto chain.
+#
+# The caches are part of the compiled program, which every run of it shares, while shapes
+# and objects belong to the Heap of one run. So an entry only holds weak references to
+# them: it can never be hit by another run anyway, and it mustn't keep a finished run's
+# objects alive (e.g. in a resident server). An entry whose shape is gone is dead.
+
+
+class InlineCache:
+    SIZE = 4  # shapes remembered per site before old entries are dropped
+
+    __slots__ = ("field_name", "entries")
+
+    def __init__(self, field_name):
+        self.field_name = field_name
+        # (weakref to shape, weakref to the proto's fields, proto epoch, weakref to the
+        # holder fields), the last three None if it's an own field
+        self.entries = []
+
+    # gets field_name of obj, following the proto chain (None if it doesn't have it)
+    def lookup(self, heap, obj):
+        if obj.__class__ is LazyCopy:
+            return get_field(obj, self.field_name)
+        fields = obj.v
+        shape = fields.shape
+        for entry in self.entries:
+            if entry[0]() is shape:
+                if entry[3] is None:
+                    return fields[self.field_name]
+                proto = fields['proto']
+                if proto.__class__ is Value and proto.v is entry[1]() and entry[2] == heap.proto_epoch:
+                    holder = entry[3]()
+                    if holder is not None:
+                        return holder[self.field_name]
+        return self.fill(heap, fields)
+
+    # walks the proto chain and remembers where the field was found
+    def fill(self, heap, fields):
+        field_name = self.field_name
+        if field_name in fields:
+            self.add((weakref.ref(fields.shape), None, 0, None))
+            return fields[field_name]
+        proto = fields.get('proto')
+        holder = None
+        while proto is not None and proto.t == Type.OBJ:
+            if proto.__class__ is LazyCopy:
+                # copies are read through to what they copy, which can't be cached
+                return get_field(proto, field_name)
+            proto_fields = proto.v
+            if field_name in proto_fields:
+                holder = proto_fields
+                break
+            proto = proto_fields.get('proto')
+        if holder is None:
+            return None
+        self.add((weakref.ref(fields.shape), weakref.ref(fields['proto'].v), heap.proto_epoch, weakref.ref(holder)))
+        return holder[field_name]
+
+    def add(self, entry):
+        entries = self.entries
+        if len(entries) >= self.SIZE:
+            del entries[0]
+        entries.append(entry)
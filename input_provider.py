@@ -0,0 +1,137 @@
+import io
+import mmap
+import os
+
+# Input providers: where inputi and inputs get their input from. An Interpreter (or a
+# Program.run) given one asks it for each line with next_line, and inputi asks it for an
+# int straight away with next_int, so it doesn't have to decode a line to check it.
+#
+#   LineInput    the lines of a list or any iterable (or iterator) of lines
+#   StreamInput  the lines of a binary stream (or sys.stdin), read in chunks of chunk_size
+#   FileInput    the lines of a file: a large file is mapped into memory (mmap), a small
+#                one read in one go
+#
+# With tokens=True, StreamInput and FileInput give whitespace separated tokens instead of
+# lines, so a line of several numbers can be read with one inputi per number.
+#
+# next_line gets None once the input runs out (like InterpreterBase.get_input). next_int
+# gets None for a line that isn't an integer (inputi makes that a TYPE_ERROR), and raises
+# EOFError once the input runs out. Providers are also iterators over their lines.
+
+
+# gets the int of a line of digits (anything str.isdigit accepts), or None
+def parse_int(line):
+    if line.isdigit():
+        return int(line)
+    return None
+
+
+class LineInput:
+    def __init__(self, lines):
+        self.lines = iter(lines)
+
+    def next_line(self):
+        return next(self.lines, None)
+
+    def next_int(self):
+        line = next(self.lines, None)
+        if line is None:
+            raise EOFError("No input left")
+        return parse_int(line)
+
+    def __iter__(self):
+        return self.lines
+
+
+class StreamInput:
+    DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, stream, tokens=False, chunk_size=DEFAULT_CHUNK_SIZE):
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+        # a text stream (like sys.stdin) is read through its binary buffer
+        self.stream = getattr(stream, 'buffer', stream)
+        self.tokens = tokens
+        self.chunk_size = chunk_size
+        self.items = iter(())  # the lines (or tokens) read and not handed out yet, as bytes
+        self.partial = b""  # the end of the last chunk, after its last newline
+
+    # reads chunks until it has some lines, or the stream runs out
+    def fill(self):
+        while self.stream is not None:
+            chunk = self.stream.read(self.chunk_size)
+            if not chunk:
+                self.close()
+                data = self.partial
+                self.partial = b""
+            else:
+                # a chunk is only split up to its last newline; the rest is kept for the next
+                end = chunk.rfind(b"\n") + 1
+                if end == 0:
+                    self.partial += chunk
+                    continue
+                data = self.partial + chunk[:end]
+                self.partial = chunk[end:]
+            items = data.split() if self.tokens else data.splitlines()
+            if items:
+                self.items = iter(items)
+                return True
+        return False
+
+    # gets the next line (or token) once the ones read so far run out
+    def next_chunk_item(self):
+        if not self.fill():
+            return None
+        return next(self.items)
+
+    def next_line(self):
+        item = next(self.items, None)
+        if item is None:
+            item = self.next_chunk_item()
+            if item is None:
+                return None
+        return item.decode()
+
+    def next_int(self):
+        item = next(self.items, None)
+        if item is None:
+            item = self.next_chunk_item()
+            if item is None:
+                raise EOFError("No input left")
+        if item.isdigit():
+            return int(item)
+        # bytes.isdigit only takes ascii digits, str.isdigit takes any
+        return parse_int(item.decode())
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.next_line()
+        if line is None:
+            raise StopIteration
+        return line
+
+
+class FileInput(StreamInput):
+    # a file at least this big is mapped instead of read
+    MMAP_SIZE = 1024 * 1024
+
+    def __init__(self, path, tokens=False, chunk_size=StreamInput.DEFAULT_CHUNK_SIZE):
+        file = open(path, 'rb')
+        size = os.fstat(file.fileno()).st_size
+        if size < FileInput.MMAP_SIZE:
+            # a small file is read in one go (and split as one chunk)
+            with file:
+                data = file.read()
+            super().__init__(io.BytesIO(data), tokens, max(len(data), 1))
+            return
+        # the mapping keeps the file's pages, so the file itself can be closed
+        with file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        super().__init__(mapped, tokens, chunk_size)
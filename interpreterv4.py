@@ -1,41 +1,157 @@
 import copy
+from analysis import pure_functions
 from brewparse import parse_program
+from bytecode import BytecodeCompiler
+from compiler import Compiler
+from function_table import FunctionTable
+from input_provider import parse_int
 from intbase import ErrorType, InterpreterBase
-from type_valuev1 import Type, Value, create_value, get_printable
+from memo import Memo
+from optimizer import Optimizer
+from output_sink import ListSink
+from profiler import Profiler
+from program import Program
+from rope import concat_value
+from type_valuev1 import Type, Value, bool_value, create_value, get_print_text, get_printable
+from vm import VM
 
 class Interpreter(InterpreterBase):
     NIL_VALUE = create_value(InterpreterBase.NIL_DEF)
     LAMBDA_NODE = 0
     CAPTURED_VARS = 1
 
-    def __init__(self, console_output=True, inp=None, trace_output=False):
+    # execution engines
+    # "closure" compiles each function into python closures before running it
+    # "tree" walks the ast directly (the reference implementation)
+    # "vm" compiles each function into bytecode and runs it on a stack machine
+    CLOSURE_ENGINE = "closure"
+    TREE_ENGINE = "tree"
+    VM_ENGINE = "vm"
+    ENGINES = (CLOSURE_ENGINE, TREE_ENGINE, VM_ENGINE)
+
+    def __init__(self, console_output=True, inp=None, trace_output=False, engine=CLOSURE_ENGINE, opt_level=Optimizer.O1, max_depth=None, program_cache=None, max_steps=None, output_sink=None, input_provider=None, memo_size=None):
         super().__init__(console_output, inp) # call InterpreterBase's constructor
         self.trace_output = trace_output
+        if engine not in Interpreter.ENGINES:
+            raise ValueError(f"Unknown engine {engine}")
+        self.engine = engine
+        # how much the ast gets optimized before it's run (see Optimizer)
+        self.optimizer = Optimizer(opt_level)
+        # the vm engine keeps its own call stack, so its call depth is only limited by memory
+        # unless a max_depth is given
+        if max_depth is not None and (engine != Interpreter.VM_ENGINE or max_depth < 1):
+            raise ValueError(f"max_depth needs the {Interpreter.VM_ENGINE} engine and must be at least 1")
+        self.max_depth = max_depth
+        # the vm engine can also stop a run after max_steps loop iterations plus calls
+        if max_steps is not None and (engine != Interpreter.VM_ENGINE or max_steps < 0):
+            raise ValueError(f"max_steps needs the {Interpreter.VM_ENGINE} engine and can't be negative")
+        self.max_steps = max_steps
+        # a program_cache.ProgramCache to keep parsed (and optimized) programs in, or None
+        self.program_cache = program_cache
+        # an input_provider provider to read the input from instead of inp and the console,
+        # or None. the input methods are bound straight to it
+        self.input_provider = input_provider
+        if input_provider is not None:
+            self.get_input = input_provider.next_line
+            self.get_int_input = input_provider.next_int
+        # the profiler.Profiler of the last run with trace_output, or None
+        self.profiler = None
+        # where printed lines go (see output_sink). by default they're kept for get_output,
+        # and printed as well with console_output
+        self.output_sink = output_sink if output_sink is not None else ListSink(console_output)
+        self.output = self.output_sink.write
+        # with memo_size, the results of calls to pure functions are kept in a memo.Memo of
+        # (at most) that many results for each compiled program
+        if memo_size is not None and memo_size < 1:
+            raise ValueError("memo_size must be at least 1")
+        self.memo_size = memo_size
+        # the memo.Memo of the program last run, or None
+        self.memo = None
 
     def run(self, program):
-        ast = parse_program(program)
+        ast = self.parse(program)
         self.ast = ast
-        print(self.ast)
+        if self.trace_output:
+            print(self.ast)
         self.get_debug_info(ast)
-        main_node = self.get_main_node(ast) 
-        self.variable_scope_list = [{}]
-        self.variable_alias_list = [{}]
-        self.run_func(main_node)
-        
-    def get_main_node(self, ast):
-        functions_list = ast.dict['functions']
-        if functions_list:
-            for elem in functions_list:
-                if elem.dict['name'] == 'main':
-                    return elem
+        try:
+            if self.profiler is None:
+                self.compile_ast(ast).execute(self)
+            else:
+                self.run_profiled(ast)
+        finally:
+            self.output_sink.flush()
+
+    def run_profiled(self, ast):
+        # only the tree engine runs a program one call and one statement at a time
+        self.profiler.attach(self)
+        try:
+            self.compile_ast(ast, Interpreter.TREE_ENGINE).execute(self)
+        finally:
+            self.profiler.detach(self)
+            print(self.profiler.report())
+
+    # parses, optimizes and compiles a program once, so that Program.run can run it any
+    # number of times
+    def compile(self, program):
+        return self.compile_ast(self.parse(program))
+
+    def compile_ast(self, ast, engine=None):
+        engine = engine or self.engine
+        # index the functions once by name and by (name, arity)
+        function_table = FunctionTable(ast.dict['functions'])
+        main_node = self.get_main_node(function_table)
+        memo = None
+        if self.memo_size is not None:
+            memo = Memo(pure_functions(ast.dict['functions'] or [], function_table), self.memo_size)
+        if engine == Interpreter.TREE_ENGINE:
+            compiled = None
+        elif engine == Interpreter.VM_ENGINE:
+            # sets up its own frames for the scope list
+            compiled = VM(BytecodeCompiler(ast, function_table, memo), self.max_depth)
+        else:
+            # sets up its own frames for the scope list
+            compiled = Compiler(ast, function_table, memo)
+        return Program(type(self), engine, self.max_depth, ast, function_table, main_node, compiled, memo)
+
+    def get_output(self):
+        return self.output_sink.lines()
+
+    # gets the next input as an int, or None if it isn't one
+    def get_int_input(self):
+        return parse_int(self.get_input())
+
+    # parses and optimizes a program, or gets it from the program cache
+    def parse(self, program):
+        if self.program_cache is not None:
+            ast = self.program_cache.load(program, self.optimizer.level)
+            if ast is not None:
+                return ast
+        ast = self.optimizer.optimize(parse_program(program))
+        if self.program_cache is not None:
+            self.program_cache.store(program, self.optimizer.level, ast)
+        return ast
+
+    def get_main_node(self, function_table):
+        main_node = function_table.first('main')
+        if main_node is not None:
+            return main_node
         super().error(
             ErrorType.NAME_ERROR,
             "No main() function was found",
         )
 
+    # new scope for a block or function call (the alias list always has one dict per scope)
+    def push_scope(self):
+        self.variable_scope_list.append({})
+        self.variable_alias_list.append({})
+
+    def pop_scope(self):
+        self.variable_scope_list.pop()
+        self.variable_alias_list.pop()
+
     # basically same as run_func but return_value default is NONE    
-    def run_if_statements(self, func_node):
-        statements = func_node.dict.get('statements') # list of Statement nodes         
+    def run_if_statements(self, statements):
         return_value = None
 
         for statement_node in statements:
@@ -44,8 +160,8 @@ class Interpreter(InterpreterBase):
                 return_value = temp_return_val
                 break
 
-        # delete outermost scope once function is done executing
-        self.variable_scope_list.pop()
+        # delete outermost scope once block is done executing
+        self.pop_scope()
         return return_value
 
     def run_func(self, func_node, lambda_node = None):
@@ -63,8 +179,21 @@ class Interpreter(InterpreterBase):
                 break
 
         # delete outermost scope once function is done executing
-        self.variable_scope_list.pop()
-        self.variable_alias_list.pop()
+        self.pop_scope()
+        return return_value
+
+    # runs a pure function whose scope is set up, unless the memo has its result
+    def run_memoized(self, memo, func_node):
+        scope = self.variable_scope_list[-1]
+        key = memo.key(func_node, [scope[arg.get('name')] for arg in func_node.dict['args']])
+        if key is not None:
+            return_value = memo.lookup(key)
+            if return_value is not None:
+                self.pop_scope()
+                return return_value
+        return_value = self.run_func(func_node)
+        if key is not None:
+            memo.store(key, return_value)
         return return_value
 
     def run_statement(self, statement_node, lambda_node = None):
@@ -91,23 +220,13 @@ class Interpreter(InterpreterBase):
                     "If condition does not evaluate to a boolean",
                 )
 
-            # call run_func with statements or else_statements
+            # run statements or else_statements, in a new scope for the block
             if condition.v: 
-                # new scope for block
-                self.variable_scope_list.append({})
-                self.variable_alias_list.append({})
-                return self.run_if_statements(statement_node) # this should pop outermost scope...
+                self.push_scope()
+                return self.run_if_statements(statement_node.dict['statements']) # this pops the block's scope
             elif statement_node.dict['else_statements'] is not None:
-                # duplicate this statement node,
-                # but make its 'statements' field what 'else_statements' contains
-                # this is for easy compatibility with the run_func function (although, it is kinda hacky)
-                
-                # new scope for block
-                self.variable_scope_list.append({})
-                self.variable_alias_list.append({})
-                updated_statement_node = copy.deepcopy(statement_node)
-                updated_statement_node.dict['statements'] = statement_node.dict['else_statements']
-                return self.run_if_statements(updated_statement_node)
+                self.push_scope()
+                return self.run_if_statements(statement_node.dict['else_statements'])
         elif statement_node.elem_type == "while":
             condition = self.evaluate_expression(statement_node.dict['condition'])
             if condition.type() == Type.INT:
@@ -123,9 +242,7 @@ class Interpreter(InterpreterBase):
 
             while (condition.v):
                 # new scope for block
-                self.variable_scope_list.append({})
-                self.variable_alias_list.append({})
-
+                self.push_scope()
 
                 for statement in statement_node.get('statements'):
                     temp_return_val = self.run_statement(statement)
@@ -134,11 +251,11 @@ class Interpreter(InterpreterBase):
                         break # from for loop
                 
                 if return_value is not None:
-                    self.variable_scope_list.pop()
+                    self.pop_scope()
                     return return_value
                 
                 # delete outermost scope once loop iteration is done
-                self.variable_scope_list.pop()
+                self.pop_scope()
 
                 # update condition and verify still evaluates to bool
                 # (it could not evaluate to bool if, for instance, it uses a var whose type gets changed)
@@ -235,9 +352,7 @@ class Interpreter(InterpreterBase):
         return False
     
     def get_bool_value(self, bool):
-        if bool:
-            return create_value("true")
-        return create_value("false")
+        return bool_value(bool)
     
     def get_bool_from_int(self, int_val):
         if int_val != 0:
@@ -256,6 +371,9 @@ class Interpreter(InterpreterBase):
             return Value(Type.OBJ, obj_fields)
 
         # VALUE NODES
+        # (a value node holds a literal or constant expression the optimizer already evaluated)
+        if source_node.elem_type == 'value':
+            return source_node.dict['val']
         if source_node.elem_type == 'int' or source_node.elem_type == 'string':
             # weird edge case
             # if it's a string and val == true or false
@@ -291,22 +409,14 @@ class Interpreter(InterpreterBase):
                                 return value2
 
             # see if it is a function name
-            functions_list = self.ast.dict['functions']
-            if functions_list:
-                func_match_count = 0 # ONLY IF IT EQUALS ONE, set equal to func name
-                matched_elem = None
-                for elem in functions_list:
-                    if elem.dict['name'] == var_name:
-                        func_match_count += 1
-                        matched_elem = elem
-
-                if func_match_count == 1 and matched_elem is not None:
-                    return Value(Type.FUNC, matched_elem) # matched_elem = statement node
-                elif func_match_count > 1:
-                    super().error(
-                        ErrorType.NAME_ERROR,
-                        f"Function {var_name} has been overloaded, so it can't be assigned to a variable",
-                    )
+            func_matches = self.function_table.overloads(var_name)
+            if len(func_matches) == 1:
+                return Value(Type.FUNC, func_matches[0]) # func_matches[0] = statement node
+            elif len(func_matches) > 1:
+                super().error(
+                    ErrorType.NAME_ERROR,
+                    f"Function {var_name} has been overloaded, so it can't be assigned to a variable",
+                )
 
             # check if object variable
             # instead of getting the value in the variable scope list
@@ -409,7 +519,7 @@ class Interpreter(InterpreterBase):
    
             # string concat
             if (source_node.elem_type == '+' and op1_val.type() == Type.STRING and op2_val.type() == Type.STRING):
-                return create_value(op1_val.v + op2_val.v)
+                return concat_value(op1_val.v, op2_val.v)
 
             if (op1_val.type() == Type.BOOL):
                 op1_val = Value(Type.INT, self.get_int_from_bool(op1_val.v))
@@ -553,15 +663,15 @@ class Interpreter(InterpreterBase):
                     f"inputi() function found that takes > 1 parameter",
                     )
                 arg_value = self.evaluate_expression(source_node.dict['args'][0], lambda_node)
-                super().output(get_printable(arg_value)) 
+                self.output(get_printable(arg_value)) 
         
-            user_input = super().get_input()
-            if not user_input.isdigit():
+            user_input = self.get_int_input()
+            if user_input is None:
                 super().error(
                     ErrorType.TYPE_ERROR,
                     "Input was not integer",
                 )
-            return create_value(int(user_input))
+            return create_value(user_input)
 
         # EXPRESSION NODE - inputs
         elif ('name' in source_node.dict and source_node.dict['name'] == 'inputs'):
@@ -574,9 +684,9 @@ class Interpreter(InterpreterBase):
                     f"inputs() function found that takes > 1 parameter",
                     )
                 arg_value = self.evaluate_expression(source_node.dict['args'][0], lambda_node)
-                super().output(get_printable(arg_value))
+                self.output(get_printable(arg_value))
         
-            user_input = super().get_input()
+            user_input = self.get_input()
             return create_value(user_input)
         
         # USER-DEFINED FUNCTION
@@ -648,21 +758,17 @@ class Interpreter(InterpreterBase):
   
     def do_func_call(self, statement_node, outer_lambda_node = None):
         if statement_node.dict['name'] == 'print':
-            final_output = ""
-            for arg in statement_node.dict['args']:
-                arg_value = self.evaluate_expression(arg, outer_lambda_node)
-                final_output += get_printable(arg_value)
-            super().output(final_output)
+            args = statement_node.dict['args']
+            self.output("".join([get_print_text(self.evaluate_expression(arg, outer_lambda_node)) for arg in args]))
             return Interpreter.NIL_VALUE
         
         # if the statement node name matches a function name in the ast, then it is defined
-        function_elem = None
-        functions_list = self.ast.dict['functions']
-        if functions_list:
-            for elem in functions_list:
-                # if function name is same AND num of args is same
-                if elem.dict['name'] == statement_node.dict['name'] and len(elem.dict['args']) == len(statement_node.dict['args']):
-                    function_elem = elem
+        # (function name is same AND num of args is same)
+        function_elem = self.function_table.lookup(statement_node.dict['name'], len(statement_node.dict['args']))
+        # calls to pure functions by name can be memoized
+        memo = self.memo
+        if memo is not None and (statement_node.elem_type != 'fcall' or function_elem is None or not memo.is_pure(function_elem)):
+            memo = None
 
         lambda_node = None # INNER lambda node
         object =  None
@@ -715,16 +821,14 @@ class Interpreter(InterpreterBase):
                 if var_value.t == Type.FUNC:
                     updated_statement_node = var_value.v
                     # get new function elem
-                    if functions_list:
-                        for elem in functions_list:
-                            if elem.dict['name'] == updated_statement_node.dict['name']:
-                                if len(elem.dict['args']) != len(statement_node.dict['args']):
-                                    super().error(
-                                        ErrorType.TYPE_ERROR,
-                                        "Invalid number of args passed into function",
-                                    )
-                                else:
-                                    function_elem = elem
+                    for elem in self.function_table.overloads(updated_statement_node.dict['name']):
+                        if len(elem.dict['args']) != len(statement_node.dict['args']):
+                            super().error(
+                                ErrorType.TYPE_ERROR,
+                                "Invalid number of args passed into function",
+                            )
+                        else:
+                            function_elem = elem
 
                 elif var_value.t == Type.LAMBDA:
                     
@@ -757,16 +861,14 @@ class Interpreter(InterpreterBase):
                 if var_value.t == Type.FUNC:
                     updated_statement_node = var_value.v
                     # get new function elem
-                    if functions_list:
-                        for elem in functions_list:
-                            if elem.dict['name'] == updated_statement_node.dict['name']:
-                                if len(elem.dict['args']) != len(statement_node.dict['args']):
-                                    super().error(
-                                        ErrorType.TYPE_ERROR,
-                                        "Invalid number of args passed into function",
-                                    )
-                                else:
-                                    function_elem = elem
+                    for elem in self.function_table.overloads(updated_statement_node.dict['name']):
+                        if len(elem.dict['args']) != len(statement_node.dict['args']):
+                            super().error(
+                                ErrorType.TYPE_ERROR,
+                                "Invalid number of args passed into function",
+                            )
+                        else:
+                            function_elem = elem
                 # CAPTURED VARIABLES TAKE PRECEDENCE OVER PASS BY REFERENCE INSIDE OF A LAMBDA
                 # that is, if we update x which references y, if y is a captured variable,
                 # then we update the y variable outside of the lambda still
@@ -801,8 +903,7 @@ class Interpreter(InterpreterBase):
         if function_elem is not None:
             # set up scope for this function
             # run the function
-            self.variable_scope_list.append({}) # scope for new function
-            self.variable_alias_list.append({})
+            self.push_scope() # scope for new function
             scope_index = len(self.variable_scope_list) - 1
 
             args_val_list = statement_node.dict['args']
@@ -828,6 +929,8 @@ class Interpreter(InterpreterBase):
                 self.variable_scope_list[scope_index]["this"] = object
                 self.variable_alias_list[scope_index]["this"] = statement_node.dict['objref'] # obj name
 
+            if memo is not None:
+                return self.run_memoized(memo, function_elem)
             return self.run_func(function_elem, lambda_node)
         else:
             super().error(
@@ -835,8 +938,10 @@ class Interpreter(InterpreterBase):
                     f"Function {statement_node.dict['name']} has not been defined",
                 )
         
+    # with trace_output, the run is profiled (see profiler.Profiler) and the report is
+    # printed once it ends
     def get_debug_info(self, ast):
-        pass
+        self.profiler = Profiler(ast) if self.trace_output else None
 
 def main():
     interpreter = Interpreter(trace_output=True)
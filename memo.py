@@ -0,0 +1,83 @@
+from collections import OrderedDict
+
+from type_valuev1 import Type, Value
+
+# A Memo remembers the results of calls to the pure functions of a program (see
+# analysis.pure_functions), so a call made again with the same args gets its result
+# without running the function. Only direct calls by name are memoized (calls through a
+# FUNC value or as a method run the function as usual), and on the vm engine only the
+# ones that aren't tail calls (see bytecode).
+#
+# A call is only memoized when every arg is an int, string, bool or nil, and only a
+# result of one of those types is kept (Values are never changed, so one can be handed
+# to every caller). At most max_entries results are kept; the least recently used one
+# goes first.
+#
+# hits counts the calls that got a kept result, misses the ones that had to run. The
+# Memo of a Program is shared by all its runs, so they're counted across runs.
+
+MEMO_TYPES = frozenset((Type.INT, Type.STRING, Type.BOOL, Type.NIL))
+
+
+class Memo:
+    DEFAULT_MAX_ENTRIES = 4096
+
+    def __init__(self, pure, max_entries=DEFAULT_MAX_ENTRIES):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.pure = pure  # ids of the func nodes whose calls are memoized
+        self.max_entries = max_entries
+        self.results = OrderedDict()  # call key -> result, least recently used first
+        self.hits = 0
+        self.misses = 0
+
+    def is_pure(self, func_node):
+        return id(func_node) in self.pure
+
+    # gets the key of a call to func_node with these arg Values, or None if the call
+    # can't be memoized
+    def key(self, func_node, args):
+        key = [id(func_node)]
+        for arg in args:
+            if arg.t not in MEMO_TYPES:
+                return None
+            key.append(arg.t)
+            key.append(arg.v)
+        return tuple(key)
+
+    # gets the kept result of a call, or None
+    def lookup(self, key):
+        result = self.results.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            self.results.move_to_end(key)
+        except KeyError:
+            # another run dropped it meanwhile
+            pass
+        return result
+
+    def store(self, key, result):
+        if result.t not in MEMO_TYPES:
+            return
+        if result.t == Type.STRING and result.v.__class__ is not str:
+            # a rope.Rope shares its parts with the ropes made from it, which only works
+            # within one run
+            result = Value(Type.STRING, str(result.v))
+        results = self.results
+        results[key] = result
+        if len(results) > self.max_entries:
+            try:
+                results.popitem(last=False)
+            except KeyError:
+                pass
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self.results),
+            'max_entries': self.max_entries,
+        }
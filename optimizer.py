@@ -0,0 +1,332 @@
+import sys
+
+from analysis import base_name, reference_names
+from element import Element
+from intbase import InterpreterBase
+from type_valuev1 import NIL, Type, Value, bool_value, create_value, get_printable, int_value, string_value
+
+# The Optimizer rewrites the ast from parse_program before either engine runs it.
+#
+#   O0 - nothing, the ast is run as parsed
+#   O1 - literals become "value" nodes holding their Value, made once instead of on every
+#        evaluation, and expressions whose operands are all constant are folded into one
+#   O2 - also: if/while statements whose condition is constant lose the branch that can't
+#        run, functions that main can't reach are dropped, and if/while blocks that assign
+#        no variables and pass none by reference are marked scoped=False (nothing can ever
+#        be created in their scope, so an engine doesn't have to push one)
+#
+# Folding only happens when evaluating the expression at runtime couldn't fail, so every
+# runtime error still happens where and when it did before. Nodes are copied, never changed,
+# so the parsed ast can still be run as is.
+
+
+class Optimizer:
+    O0 = 0
+    O1 = 1
+    O2 = 2
+    LEVELS = (O0, O1, O2)
+
+    VALUE_NODE = 'value'
+
+    def __init__(self, level=O1):
+        if level not in Optimizer.LEVELS:
+            raise ValueError(f"Unknown optimization level {level}")
+        self.level = level
+
+    def optimize(self, ast):
+        if self.level == Optimizer.O0:
+            return ast
+        functions = [self.optimize_node(func_node) for func_node in ast.dict['functions'] or []]
+        if self.level >= Optimizer.O2:
+            functions = reachable_functions(functions)
+        return new_node(ast, functions=functions)
+
+    def optimize_node(self, node):
+        elem_type = node.elem_type
+        if elem_type == 'func' or elem_type == 'lambda':
+            return new_node(node, statements=self.optimize_block(node.dict['statements']))
+        if elem_type == 'if':
+            return self.optimize_if(node)
+        if elem_type == 'while':
+            return self.optimize_while(node)
+        if elem_type == '=' or elem_type == 'return':
+            if node.dict['expression'] is None:
+                return node
+            return new_node(node, expression=self.optimize_node(node.dict['expression']))
+        if elem_type == 'fcall' or elem_type == 'mcall':
+            return new_node(node, args=[self.optimize_node(arg) for arg in node.dict['args']])
+        if elem_type == 'int':
+            return value_node(int_value(node.dict['val']))
+        if elem_type == 'string':
+            # "true", "false" and "nil" string literals stay strings
+            return value_node(string_value(node.dict['val']))
+        if elem_type == 'bool':
+            return value_node(bool_value(node.dict['val']))
+        if elem_type == 'nil':
+            return value_node(NIL)
+        if 'op1' in node.dict:
+            operands = {key: self.optimize_node(node.dict[key]) for key in ('op1', 'op2') if key in node.dict}
+            if all(operand.elem_type == Optimizer.VALUE_NODE for operand in operands.values()):
+                folded = fold(elem_type, [operand.dict['val'] for operand in operands.values()])
+                if folded is not None:
+                    return value_node(folded)
+            return new_node(node, **operands)
+        return node
+
+    def optimize_block(self, statements):
+        if statements is None:
+            return None
+        optimized = []
+        for statement in statements:
+            statement = self.optimize_node(statement)
+            if statement is not None:
+                optimized.append(statement)
+        return optimized
+
+    def optimize_if(self, node):
+        condition = self.optimize_node(node.dict['condition'])
+        statements = self.optimize_block(node.dict['statements'])
+        else_statements = self.optimize_block(node.dict['else_statements'])
+        if self.level >= Optimizer.O2:
+            truth = constant_truth(condition)
+            if truth is False:
+                if else_statements is None:
+                    return None
+                # the else branch always runs
+                statements = else_statements
+                else_statements = None
+                condition = value_node(bool_value(True))
+            elif truth is True:
+                else_statements = None
+            return new_node(
+                node,
+                condition=condition,
+                statements=statements,
+                else_statements=else_statements,
+                scoped=declares_variables(statements) or declares_variables(else_statements),
+            )
+        return new_node(node, condition=condition, statements=statements, else_statements=else_statements)
+
+    def optimize_while(self, node):
+        condition = self.optimize_node(node.dict['condition'])
+        statements = self.optimize_block(node.dict['statements'])
+        if self.level >= Optimizer.O2:
+            if constant_truth(condition) is False:
+                return None
+            return new_node(node, condition=condition, statements=statements, scoped=declares_variables(statements))
+        return new_node(node, condition=condition, statements=statements)
+
+
+def new_node(node, **changes):
+    copied = Element(node.elem_type)
+    copied.dict = dict(node.dict)
+    copied.dict.update(changes)
+    return copied
+
+
+def value_node(value):
+    node = Element(Optimizer.VALUE_NODE)
+    node.dict = {'val': value}
+    return node
+
+
+# gets whether a constant if/while condition is true or false, or None if it isn't constant
+# (or isn't a valid condition, which has to fail at runtime)
+def constant_truth(condition):
+    if condition.elem_type != Optimizer.VALUE_NODE:
+        return None
+    value = condition.dict['val']
+    if value.t == Type.INT:
+        return value.v != 0
+    if value.t == Type.BOOL:
+        return value.v
+    return None
+
+
+# whether running these statements can create a variable in the block's scope: by
+# assigning one, or by passing one by reference to a callee that sets it
+def declares_variables(statements):
+    for statement in statements or []:
+        if statement.elem_type == '=' and '.' not in statement.dict['name']:
+            return True
+    return bool(reference_names(statements))
+
+
+# the ints of int and bool operands, or None if an operand is neither
+def as_ints(values):
+    ints = []
+    for value in values:
+        if value.t == Type.INT:
+            ints.append(value.v)
+        elif value.t == Type.BOOL:
+            ints.append(1 if value.v else 0)
+        else:
+            return None
+    return ints
+
+
+# the bools of int and bool operands, or None if an operand is neither
+def as_bools(values):
+    ints = as_ints(values)
+    if ints is None:
+        return None
+    return [i != 0 for i in ints]
+
+
+# evaluates an operator on constant operands the way both engines do, or gets None when
+# that would fail (or isn't worth doing at compile time)
+def fold(op, values):
+    if op in ('+', '-', '*', '/', '<', '<=', '>', '>='):
+        if len(values) != 2:
+            return None
+        if op == '+' and values[0].t == Type.STRING and values[1].t == Type.STRING:
+            # a concat can make "true", which create_value turns into a bool
+            return create_value(values[0].v + values[1].v)
+        ints = as_ints(values)
+        if ints is None:
+            return None
+        a, b = ints
+        if op == '+':
+            return int_value(a + b)
+        if op == '-':
+            return int_value(a - b)
+        if op == '*':
+            return int_value(a * b)
+        if op == '/':
+            if b == 0:
+                return None
+            return int_value(a // b)
+        if op == '<':
+            return bool_value(a < b)
+        if op == '<=':
+            return bool_value(a <= b)
+        if op == '>':
+            return bool_value(a > b)
+        return bool_value(a >= b)
+    if op == 'neg':
+        if len(values) != 1 or values[0].t != Type.INT:
+            return None
+        return int_value(-values[0].v)
+    if op == '!':
+        if len(values) != 1:
+            return None
+        bools = as_bools(values)
+        if bools is None:
+            return None
+        return bool_value(not bools[0])
+    if op == '&&' or op == '||':
+        if len(values) != 2:
+            return None
+        bools = as_bools(values)
+        if bools is None:
+            return None
+        if op == '&&':
+            return bool_value(bools[0] and bools[1])
+        return bool_value(bools[0] or bools[1])
+    if op == '==' or op == '!=':
+        if len(values) != 2:
+            return None
+        a, b = values
+        if a.t == b.t:
+            equal = a.t == Type.NIL or a.v == b.v
+        elif a.t == Type.INT and b.t == Type.BOOL:
+            equal = (a.v != 0) == b.v
+        elif a.t == Type.BOOL and b.t == Type.INT:
+            equal = a.v == (b.v != 0)
+        else:
+            equal = False
+        return bool_value(equal == (op == '=='))
+    return None
+
+
+# drops the functions that can't be reached from main. a function is reached by name,
+# either by calling it or by using it as a value, so every overload of a reached name is kept
+def reachable_functions(functions):
+    by_name = {}
+    for func_node in functions:
+        by_name.setdefault(func_node.dict['name'], []).append(func_node)
+
+    reached = set()
+    to_visit = ['main']
+    while to_visit:
+        name = to_visit.pop()
+        if name in reached or name not in by_name:
+            continue
+        reached.add(name)
+        for func_node in by_name[name]:
+            to_visit.extend(referenced_names(func_node))
+    return [func_node for func_node in functions if func_node.dict['name'] in reached]
+
+
+# every name a function (or a lambda in it) calls or reads
+def referenced_names(node):
+    names = set()
+    to_visit = [node]
+    while to_visit:
+        node = to_visit.pop()
+        elem_type = node.elem_type
+        if elem_type == 'fcall':
+            names.add(node.dict['name'])
+        elif elem_type == 'var':
+            names.add(base_name(node.dict['name']))
+        for value in node.dict.values():
+            if isinstance(value, Element):
+                to_visit.append(value)
+            elif isinstance(value, list):
+                to_visit.extend(child for child in value if isinstance(child, Element))
+    return names
+
+
+# formats an ast one node per line, indented by depth, with the Values of value nodes
+def dump_ast(node, depth=0):
+    lines = []
+    indent = "  " * depth
+    fields = []
+    children = []
+    for key, value in node.dict.items():
+        if isinstance(value, Element):
+            children.append((key, [value]))
+        elif isinstance(value, list):
+            children.append((key, value))
+        elif isinstance(value, Value):
+            fields.append(f"{key}={format_value(value)}")
+        else:
+            fields.append(f"{key}={value!r}")
+    lines.append(f"{indent}{node.elem_type} {' '.join(fields)}".rstrip())
+    for key, child_nodes in children:
+        lines.append(f"{indent}  {key}:")
+        for child in child_nodes:
+            if isinstance(child, Element):
+                lines.append(dump_ast(child, depth + 2))
+            else:
+                lines.append(f"{indent}    {child!r}")
+    return "\n".join(lines)
+
+
+def format_value(value):
+    if value.t == Type.STRING:
+        return f"{value.v!r}"
+    if value.t == Type.NIL:
+        return InterpreterBase.NIL_DEF
+    return f"{get_printable(value)}"
+
+
+# usage: python optimizer.py [-O0|-O1|-O2] program.br
+def main():
+    args = sys.argv[1:]
+    level = Optimizer.O2
+    if args and args[0].startswith('-O'):
+        level = int(args.pop(0)[2:])
+    if len(args) != 1:
+        print("usage: python optimizer.py [-O0|-O1|-O2] program.br")
+        sys.exit(1)
+
+    from brewparse import parse_program
+
+    with open(args[0]) as program_file:
+        ast = parse_program(program_file.read())
+    print(dump_ast(Optimizer(level).optimize(ast)))
+
+
+if __name__ == "__main__":
+    main()
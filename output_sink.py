@@ -0,0 +1,115 @@
+import collections
+import sys
+
+# Output sinks: where the lines a brewin program prints go. An Interpreter sends every line
+# to its sink's write (rt.output is bound straight to it, so a print costs one call), gets
+# them back for get_output from the sink's lines, and flushes the sink when a run ends.
+#
+#   ListSink      keeps every line (what get_output has always returned), and prints each
+#                 one too with echo; the default
+#   ConsoleSink   writes each line to the console (or a stream) as it's printed, and keeps
+#                 nothing
+#   BufferedSink  writes the lines to a file or pipe in blocks of flush_size characters,
+#                 and keeps nothing
+#   RingSink      keeps only the last max_lines lines
+#   CountSink     keeps nothing, and only counts the lines and characters (for benchmarks)
+#
+# The console and stream sinks look up sys.stdout when they write, like print does, so a
+# redirected stdout is honored.
+
+
+class ListSink:
+    def __init__(self, echo=False):
+        self.echo = echo
+        self.output_lines = []
+        if echo:
+            self.write = self.write_echo
+        else:
+            self.write = self.output_lines.append
+
+    def write_echo(self, line):
+        print(line)
+        self.output_lines.append(line)
+
+    def lines(self):
+        return self.output_lines
+
+    def flush(self):
+        pass
+
+
+class ConsoleSink:
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def write(self, line):
+        stream = self.stream or sys.stdout
+        stream.write(f"{line}\n")
+        stream.flush()
+
+    def lines(self):
+        return []
+
+    def flush(self):
+        pass
+
+
+class BufferedSink:
+    DEFAULT_FLUSH_SIZE = 64 * 1024
+
+    def __init__(self, stream=None, flush_size=DEFAULT_FLUSH_SIZE):
+        if flush_size < 1:
+            raise ValueError("flush_size must be at least 1")
+        self.stream = stream
+        self.flush_size = flush_size
+        self.pending = []
+        self.pending_size = 0
+
+    def write(self, line):
+        self.pending.append(line)
+        self.pending_size += len(line) + 1
+        if self.pending_size >= self.flush_size:
+            self.flush()
+
+    def lines(self):
+        return []
+
+    def flush(self):
+        if not self.pending:
+            return
+        stream = self.stream or sys.stdout
+        self.pending.append("")
+        stream.write("\n".join(self.pending))
+        stream.flush()
+        self.pending = []
+        self.pending_size = 0
+
+
+class RingSink:
+    def __init__(self, max_lines):
+        if max_lines < 1:
+            raise ValueError("max_lines must be at least 1")
+        self.output_lines = collections.deque(maxlen=max_lines)
+        self.write = self.output_lines.append
+
+    def lines(self):
+        return list(self.output_lines)
+
+    def flush(self):
+        pass
+
+
+class CountSink:
+    def __init__(self):
+        self.count = 0
+        self.chars = 0
+
+    def write(self, line):
+        self.count += 1
+        self.chars += len(line)
+
+    def lines(self):
+        return []
+
+    def flush(self):
+        pass
@@ -0,0 +1,235 @@
+import argparse
+import marshal
+import sys
+import time
+
+from analysis import walk_body
+
+# The Profiler counts what one run of a brewin program does, like python's cProfile: for
+# every function, lambda and method it calls, how many times it was called and the time
+# spent in it (inclusive of what it called, and exclusive), and for every statement how
+# many times it ran.
+#
+# It works on the tree engine, the only one that runs a program one call and one statement
+# at a time: Profiler.attach wraps the run_func and run_statement of one Interpreter, as
+# instance attributes, so an interpreter that isn't being profiled keeps calling the plain
+# methods and pays nothing for it.
+#
+# Functions are named "name(params)", lambdas "lambda@line" (or "lambda#n in function"
+# when the parser doesn't give line numbers), and statements by their function and line
+# (or their position in the function). A method is counted under the function or lambda
+# it calls. The names are kept on the ast nodes, as profile_label, because the tree engine
+# runs deep copies of lambdas (and their bodies), and a copy has to be counted with the
+# lambda it was copied from.
+#
+# usage: python profiler.py [-O LEVEL] [--sort calls|tottime|cumtime] [--limit N]
+#                           [--pstats FILE] program.br
+# (the program's inputs are read from stdin)
+
+
+# the calls of one function, or the calls one function made to another
+class CallStats:
+    __slots__ = ("calls", "primitive_calls", "tottime", "cumtime")
+
+    def __init__(self):
+        self.calls = 0
+        self.primitive_calls = 0  # the calls made while it wasn't already running
+        self.tottime = 0.0  # the time spent in its own statements
+        self.cumtime = 0.0  # the time spent in its primitive calls, callees included
+
+    def add(self, elapsed, exclusive, recursive):
+        self.calls += 1
+        self.tottime += exclusive
+        if not recursive:
+            self.primitive_calls += 1
+            self.cumtime += elapsed
+
+
+class Profiler:
+    SORT_KEYS = ('calls', 'tottime', 'cumtime')
+
+    def __init__(self, ast, filename="<brewin>"):
+        self.filename = filename
+        self.functions = {}  # label -> CallStats
+        self.callers = {}  # label -> {caller label -> CallStats}
+        self.lines = {}  # function label -> line number (0 if the parser gave none)
+        self.statement_hits = {}  # statement label -> times it ran
+        self.total_time = 0.0
+        self.stack = []  # [label, start, time spent in callees] of each running call
+        self.running = {}  # label -> its calls that haven't returned yet
+        for func_node in ast.dict['functions']:
+            params = ", ".join(arg.get('name') for arg in func_node.dict['args'])
+            self.label_function(func_node, f"{func_node.dict['name']}({params})")
+
+    def label_function(self, func_node, label):
+        func_node.profile_label = label
+        self.lines[label] = line_number(func_node) or 0
+        for position, statement in enumerate(statement_nodes(func_node.dict['statements']), 1):
+            line = line_number(statement)
+            where = f"line {line}" if line else f"#{position}"
+            statement.profile_label = f"{label} {where}: {describe(statement)}"
+            self.statement_hits.setdefault(statement.profile_label, 0)
+
+        lambda_count = 0
+        for node, _ in walk_body(func_node.dict['statements']):
+            if node.elem_type == 'lambda':
+                lambda_count += 1
+                line = line_number(node)
+                self.label_function(node, f"lambda@{line}" if line else f"lambda#{lambda_count} in {label}")
+
+    # makes rt count its calls and statements into this profiler
+    def attach(self, rt):
+        run_func = rt.run_func
+        run_statement = rt.run_statement
+        statement_hits = self.statement_hits
+
+        def profiled_run_func(func_node, lambda_node=None):
+            self.enter(func_node.profile_label)
+            try:
+                return run_func(func_node, lambda_node)
+            finally:
+                self.exit()
+
+        def profiled_run_statement(statement_node, lambda_node=None):
+            label = statement_node.profile_label
+            statement_hits[label] = statement_hits.get(label, 0) + 1
+            return run_statement(statement_node, lambda_node)
+
+        rt.run_func = profiled_run_func
+        rt.run_statement = profiled_run_statement
+
+    def detach(self, rt):
+        del rt.run_func
+        del rt.run_statement
+
+    def enter(self, label):
+        self.running[label] = self.running.get(label, 0) + 1
+        self.stack.append([label, time.perf_counter(), 0.0])
+
+    def exit(self):
+        label, start, callee_time = self.stack.pop()
+        elapsed = time.perf_counter() - start
+        self.running[label] -= 1
+        recursive = self.running[label] > 0
+
+        stats = self.functions.get(label)
+        if stats is None:
+            stats = self.functions[label] = CallStats()
+        stats.add(elapsed, elapsed - callee_time, recursive)
+        if not self.stack:
+            self.total_time += elapsed
+            return
+        caller = self.stack[-1]
+        caller[2] += elapsed
+        callers = self.callers.setdefault(label, {})
+        edge = callers.get(caller[0])
+        if edge is None:
+            edge = callers[caller[0]] = CallStats()
+        edge.add(elapsed, elapsed - callee_time, recursive)
+
+    # formats the calls as a table sorted by sort (most first), then the statements by hits
+    def report(self, sort='cumtime', limit=None):
+        if sort not in Profiler.SORT_KEYS:
+            raise ValueError(f"Unknown sort key {sort}")
+        total_calls = sum(stats.calls for stats in self.functions.values())
+        lines = [
+            f"{total_calls} calls in {self.total_time:.6f} seconds",
+            "",
+            f"{'calls':>12} {'tottime':>10} {'percall':>10} {'cumtime':>10} {'percall':>10}  function",
+        ]
+        rows = sorted(self.functions.items(), key=lambda item: getattr(item[1], sort), reverse=True)
+        for label, stats in rows[:limit]:
+            calls = str(stats.calls)
+            if stats.primitive_calls != stats.calls:
+                calls = f"{stats.calls}/{stats.primitive_calls}"
+            lines.append(
+                f"{calls:>12} {stats.tottime:10.6f} {stats.tottime / stats.calls:10.6f}"
+                f" {stats.cumtime:10.6f} {stats.cumtime / max(stats.primitive_calls, 1):10.6f}  {label}"
+            )
+
+        lines += ["", f"{'hits':>12}  statement"]
+        hits = sorted(self.statement_hits.items(), key=lambda item: item[1], reverse=True)
+        for label, count in hits[:limit]:
+            lines.append(f"{count:>12}  {label}")
+        return "\n".join(lines)
+
+    # gets the calls in the form pstats.Stats keeps them:
+    # (file, line, name) -> (primitive calls, calls, tottime, cumtime, callers)
+    def pstats_dict(self):
+        stats = {}
+        for label, function_stats in self.functions.items():
+            callers = {
+                self.key(caller): (edge.primitive_calls, edge.calls, edge.tottime, edge.cumtime)
+                for caller, edge in self.callers.get(label, {}).items()
+            }
+            stats[self.key(label)] = (
+                function_stats.primitive_calls,
+                function_stats.calls,
+                function_stats.tottime,
+                function_stats.cumtime,
+                callers,
+            )
+        return stats
+
+    def key(self, label):
+        return (self.filename, self.lines[label], label)
+
+    # writes the calls to a file that pstats.Stats (or snakeviz etc.) can load
+    def dump_stats(self, path):
+        with open(path, 'wb') as stats_file:
+            marshal.dump(self.pstats_dict(), stats_file)
+
+
+# yields every statement of a body and of the blocks in it, in the order they appear
+def statement_nodes(statements):
+    for statement in statements or []:
+        yield statement
+        if statement.elem_type == 'if' or statement.elem_type == 'while':
+            yield from statement_nodes(statement.dict['statements'])
+            yield from statement_nodes(statement.dict.get('else_statements'))
+
+
+def line_number(node):
+    return getattr(node, 'lineno', None)
+
+
+def describe(statement):
+    elem_type = statement.elem_type
+    if elem_type == '=':
+        return f"{statement.dict['name']} = ..."
+    if elem_type == 'fcall':
+        return f"{statement.dict['name']}(...)"
+    if elem_type == 'mcall':
+        return f"{statement.dict['objref']}.{statement.dict['name']}(...)"
+    return elem_type
+
+
+def main():
+    from interpreterv4 import Interpreter
+    from optimizer import Optimizer
+
+    parser = argparse.ArgumentParser(description="Profile a run of a Brewin program.")
+    parser.add_argument('program')
+    parser.add_argument('-O', dest='opt_level', type=int, choices=Optimizer.LEVELS, default=Optimizer.O1)
+    parser.add_argument('--sort', choices=Profiler.SORT_KEYS, default='cumtime')
+    parser.add_argument('--limit', type=int, default=None, help="rows of each table to print")
+    parser.add_argument('--pstats', default=None, help="also write the calls here, for pstats")
+    args = parser.parse_args()
+
+    with open(args.program) as program_file:
+        source = program_file.read()
+    interpreter = Interpreter(engine=Interpreter.TREE_ENGINE, opt_level=args.opt_level)
+    ast = interpreter.parse(source)
+    profiler = Profiler(ast, args.program)
+    profiler.attach(interpreter)
+    try:
+        interpreter.compile_ast(ast).execute(interpreter)
+    finally:
+        profiler.detach(interpreter)
+        print(profiler.report(args.sort, args.limit), file=sys.stderr)
+        if args.pstats is not None:
+            profiler.dump_stats(args.pstats)
+
+
+if __name__ == "__main__":
+    main()
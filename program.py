@@ -0,0 +1,111 @@
+from input_provider import LineInput
+
+# A Program is a parsed, optimized and compiled Brewin program, made once by
+# Interpreter.compile and run any number of times with Program.run. Nothing about a run is
+# kept in the Program: each run gets its own runtime (an interpreter with its own scopes,
+# heap, inputs and output), so one Program can be run from several threads at once.
+#
+# What the runs share is only ever added to, never changed in a way another run could see:
+# the function table, the compiled code and the caches inside it (inline caches and the
+# FUNC value memo only remember where something was found), and the memo of pure calls
+# (which only remembers results that can't change).
+
+
+# raised to end a run that went over its time or step budget
+class ExecutionTimeout(Exception):
+    pass
+
+
+# what one run of a Program did
+class RunResult:
+    __slots__ = ("output", "status", "error_type", "error")
+
+    def __init__(self, output, status, error_type=None, error=None):
+        self.output = output  # the lines the program printed, in order
+        self.status = status  # Program.OK, ERROR, CRASH or TIMEOUT
+        self.error_type = error_type  # the ErrorType of a Program.ERROR
+        self.error = error  # the message of the exception that ended the run, if any
+
+    def __repr__(self):
+        return f"RunResult(status={self.status}, output={self.output!r}, error={self.error!r})"
+
+
+class Program:
+    OK = 0  # main returned
+    ERROR = 1  # the program raised a Brewin error
+    CRASH = 2  # the program raised anything else
+    TIMEOUT = 3  # the run went over its step budget (or was ended by ExecutionTimeout)
+
+    __slots__ = ("interpreter_class", "engine", "max_depth", "ast", "function_table", "main_node", "compiled", "memo")
+
+    def __init__(self, interpreter_class, engine, max_depth, ast, function_table, main_node, compiled, memo=None):
+        self.interpreter_class = interpreter_class  # what each run's runtime is made from
+        self.engine = engine
+        self.max_depth = max_depth
+        self.ast = ast
+        self.function_table = function_table
+        self.main_node = main_node
+        self.compiled = compiled  # the engine's compiled form of ast (None for the tree engine)
+        self.memo = memo  # the memo.Memo its runs keep the results of pure calls in, or None
+
+    # runs the program on a list (or any iterable or iterator) of input lines, or on an
+    # input_provider provider; a run only gets the inputs it was given. max_steps limits
+    # the loop iterations plus calls of the run (vm engine only), and output_sink is where
+    # its printed lines go (a sink from output_sink, for this run only; by default they're
+    # all kept)
+    def run(self, inputs=(), max_steps=None, output_sink=None):
+        rt = self.runtime(inputs, max_steps, output_sink)
+        try:
+            self.execute(rt)
+        except Exception as e:
+            return run_result(rt, e)
+        return run_result(rt)
+
+    # starts a run that can be suspended (vm engine only): gets its runtime and the
+    # generator that runs it, which yields vm.VM.SLICE_END after every slice_steps loop
+    # iterations plus calls, and vm.VM.NEEDS_INPUT at every inputi/inputs for the input
+    # line to be sent back. (scheduler runs these.)
+    def start(self, max_steps=None, slice_steps=None, output_sink=None):
+        if getattr(self.compiled, 'start_main', None) is None:
+            raise ValueError(f"a run of a {self.engine} program can't be suspended")
+        if slice_steps is not None and slice_steps < 1:
+            raise ValueError("slice_steps must be at least 1")
+        rt = self.runtime((), max_steps, output_sink)
+        rt.ast = self.ast
+        rt.function_table = self.function_table
+        rt.memo = self.memo
+        return rt, self.compiled.start_main(rt, self.main_node, slice_steps, True)
+
+    def runtime(self, inputs, max_steps, output_sink):
+        return self.interpreter_class(
+            console_output=False,
+            input_provider=inputs if hasattr(inputs, 'next_line') else LineInput(inputs),
+            engine=self.engine,
+            max_depth=self.max_depth,
+            max_steps=max_steps,
+            output_sink=output_sink,
+        )
+
+    # runs main on an interpreter's runtime
+    def execute(self, rt):
+        rt.ast = self.ast
+        rt.function_table = self.function_table
+        rt.memo = self.memo
+        if self.compiled is None:
+            rt.variable_scope_list = [{}]
+            rt.variable_alias_list = [{}]
+            rt.run_func(self.main_node)
+        else:
+            self.compiled.run_main(rt, self.main_node)
+
+
+# gets the RunResult of a run that has ended, given the exception that ended it if any
+def run_result(rt, error=None):
+    rt.output_sink.flush()
+    output = tuple(rt.get_output())
+    if error is None:
+        return RunResult(output, Program.OK)
+    if isinstance(error, ExecutionTimeout):
+        return RunResult(output, Program.TIMEOUT, None, str(error))
+    status = Program.CRASH if rt.error_type is None else Program.ERROR
+    return RunResult(output, status, rt.error_type, str(error))
@@ -0,0 +1,154 @@
+import hashlib
+import importlib
+import io
+import os
+import pickle
+import sys
+import tempfile
+
+from type_valuev1 import NIL, Type, Value, bool_value, int_value
+
+# A ProgramCache keeps the optimized ast of every program run through it in a directory,
+# like python's __pycache__, so running the same source again skips parse_program (and
+# the optimizer) entirely.
+#
+# An entry is a pickle of the ast in "<version>-<source hash>.ast", where the source hash
+# covers the source text and optimization level, and the version covers everything that
+# decides what ast a source turns into (the parser, the optimizer and the analyses it
+# runs, and the node and Value types, hashed from their files, plus this python). An entry written under another version can
+# never be hit again, so it is stale and is removed on the next store.
+#
+# Every hit touches the entry's mtime, and when a store takes the directory past max_bytes
+# the least recently used entries are removed until it fits again.
+#
+# Entries are unpickled, so the directory must only be writable by whoever runs the
+# interpreter (it is created 0o700).
+#
+# The compiled forms of a program (closures, bytecode sites) hold python functions that
+# can't be pickled, so they are still made on every run, from the cached ast.
+
+# bump when the layout of an entry changes
+CACHE_FORMAT = 1
+
+# the modules that decide what ast a source turns into
+VERSION_MODULES = ('analysis', 'brewparse', 'element', 'intbase', 'optimizer', 'type_valuev1')
+
+
+class ProgramCache:
+    DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+    SUFFIX = '.ast'
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        if max_bytes < 0:
+            raise ValueError("max_bytes can't be negative")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.version = interpreter_version()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    def path(self, source, opt_level):
+        source_hash = hashlib.sha256(f"{opt_level}\0{source}".encode()).hexdigest()
+        return os.path.join(self.directory, f"{self.version}-{source_hash}{ProgramCache.SUFFIX}")
+
+    # gets the cached ast of a source, or None if it isn't cached
+    def load(self, source, opt_level):
+        path = self.path(source, opt_level)
+        try:
+            with open(path, 'rb') as entry:
+                ast = pickle.load(entry)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception:
+            # a damaged entry is treated as a miss and replaced by the next store
+            self.misses += 1
+            self.remove(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return ast
+
+    def store(self, source, opt_level, ast):
+        buffer = io.BytesIO()
+        ValuePickler(buffer, pickle.HIGHEST_PROTOCOL).dump(ast)
+        data = buffer.getvalue()
+        if len(data) > self.max_bytes:
+            return
+        # written under a temporary name and renamed, so a reader never sees half an entry
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as entry:
+                entry.write(data)
+            os.replace(temp_path, self.path(source, opt_level))
+        except OSError:
+            self.remove(temp_path)
+            return
+        self.evict()
+
+    # removes the stale entries, then the least recently used ones until the cache fits
+    def evict(self):
+        entries = []
+        total = 0
+        prefix = f"{self.version}-"
+        for name in os.listdir(self.directory):
+            if not name.endswith(ProgramCache.SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            if not name.startswith(prefix):
+                self.remove(path)
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self.remove(path)
+            total -= size
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(ProgramCache.SUFFIX):
+                self.remove(os.path.join(self.directory, name))
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# pickles Values so that they are loaded back as the shared ones where there is one
+class ValuePickler(pickle.Pickler):
+    def reducer_override(self, obj):
+        if obj.__class__ is Value:
+            return load_value, (obj.t, obj.v)
+        return NotImplemented
+
+
+def load_value(t, v):
+    if t == Type.INT:
+        return int_value(v)
+    if t == Type.BOOL:
+        return bool_value(v)
+    if t == Type.NIL:
+        return NIL
+    return Value(t, v)
+
+
+def interpreter_version():
+    digest = hashlib.sha256(f"{CACHE_FORMAT} {sys.version}".encode())
+    for module_name in VERSION_MODULES:
+        module = importlib.import_module(module_name)
+        with open(module.__file__, 'rb') as module_file:
+            digest.update(module_file.read())
+    return digest.hexdigest()[:16]
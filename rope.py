@@ -0,0 +1,97 @@
+from type_valuev1 import Type, Value, create_value
+
+# A Rope is the text of a long STRING value made by concatenation, kept as the list of
+# the strings it was made from and only joined into one (flattened) when something needs
+# the whole text: print, an inputi/inputs prompt, ==/!=, or a memo key. So a loop that
+# builds a string with "s = s + ..." takes time linear in its length, where copying the
+# whole string on every + took quadratic time.
+#
+# Ropes never change, but the ropes made by appending to one share its list of parts:
+# a rope only uses the first count parts, and appending to a rope whose count is the end
+# of the list appends to the list in place. Appending to an older rope (one whose list
+# was appended to since) copies its parts first.
+#
+# Only a concat of at least ROPE_MIN_LENGTH characters makes a rope; shorter ones are
+# plain strs, which are faster to make and compare. Putting text in front of a rope
+# flattens it, so that costs what it always did.
+#
+# A Rope compares and hashes like its text, so code that compares or hashes the v of
+# STRING values works on either. len is its length, and str flattens it (once: the text
+# is kept).
+
+ROPE_MIN_LENGTH = 256
+
+
+class Rope:
+    __slots__ = ("parts", "count", "length", "text")
+
+    def __init__(self, parts, length):
+        self.parts = parts
+        self.count = len(parts)  # how many of parts are this rope's
+        self.length = length
+        self.text = None  # the flattened text, once something needed it
+
+    # gets the rope of this one followed by a str or rope
+    def append(self, other):
+        parts = self.parts
+        if self.count != len(parts):
+            # a rope made from this one since owns the rest of the list
+            parts = parts[:self.count]
+        if other.__class__ is str:
+            parts.append(other)
+        elif other.text is not None:
+            parts.append(other.text)
+        else:
+            parts.extend(other.parts[:other.count])
+        return Rope(parts, self.length + len(other))
+
+    def __str__(self):
+        text = self.text
+        if text is None:
+            parts = self.parts
+            if self.count != len(parts):
+                parts = parts[:self.count]
+            text = self.text = "".join(parts)
+        return text
+
+    def __len__(self):
+        return self.length
+
+    def __eq__(self, other):
+        if other.__class__ is Rope or other.__class__ is str:
+            # texts of different lengths can't be equal, and that's known without joining
+            return self.length == len(other) and str(self) == str(other)
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(str(self))
+
+    def __repr__(self):
+        return f"Rope({str(self)!r})"
+
+    # Values (and so ropes) are never changed, so a copy can be the rope itself
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+# gets the str or Rope of a + b, for strs or Ropes a and b
+def concat(a, b):
+    if a.__class__ is Rope:
+        return a.append(b)
+    length = len(a) + len(b)
+    if b.__class__ is Rope:
+        return Rope([a, str(b)], length)
+    if length < ROPE_MIN_LENGTH:
+        return a + b
+    return Rope([a, b], length)
+
+
+# gets the Value of the string concat a + b: like create_value(a + b), a concat that
+# makes "true", "false" or "nil" gets that value instead of a string
+def concat_value(a, b):
+    if a.__class__ is str and b.__class__ is str and len(a) + len(b) < ROPE_MIN_LENGTH:
+        return create_value(a + b)
+    return Value(Type.STRING, concat(a, b))
@@ -0,0 +1,97 @@
+import asyncio
+import time
+
+from input_provider import LineInput
+from program import ExecutionTimeout, run_result
+from vm import VM
+
+# Runs many Brewin programs in one process, on one asyncio event loop, without one that
+# never ends holding up the rest.
+#
+# Each run is a suspendable vm run (Program.start): it runs a slice of slice_steps steps
+# (loop iterations plus calls) and then gives the loop back to the other runs, which are
+# resumed in turn, so every run gets the same share of the process. An inputi or inputs is
+# a suspension point too: the run waits for its next input line, from an async iterable,
+# without holding up the others.
+#
+# A run can be limited to max_steps steps and to time_limit seconds of its own running
+# time (the time its slices took, not the time it spent waiting for its turn or its input).
+# One that goes over either ends with the status Program.TIMEOUT.
+#
+#   scheduler = Scheduler()
+#   results = await asyncio.gather(*(scheduler.run(program, inputs) for inputs in input_sets))
+
+
+class Scheduler:
+    DEFAULT_SLICE_STEPS = 1000
+
+    def __init__(self, slice_steps=DEFAULT_SLICE_STEPS):
+        if slice_steps < 1:
+            raise ValueError("slice_steps must be at least 1")
+        self.slice_steps = slice_steps
+        self.running = 0  # runs started and not finished yet
+        self.slices = 0  # slices run, across every run
+
+    # runs a vm Program to the end and gets its RunResult. inputs is an async iterable of
+    # input lines, an input_provider provider or an iterable of lines
+    async def run(self, program, inputs=(), max_steps=None, time_limit=None, output_sink=None):
+        rt, steps = program.start(max_steps, self.slice_steps, output_sink)
+        read_line = input_reader(inputs)
+        run_time = 0.0
+        sent = None
+        self.running += 1
+        try:
+            while True:
+                start = time.perf_counter()
+                request = steps.send(sent)
+                run_time += time.perf_counter() - start
+                sent = None
+                if request == VM.NEEDS_INPUT:
+                    sent = await read_line()
+                    continue
+                self.slices += 1
+                if time_limit is not None and run_time > time_limit:
+                    raise ExecutionTimeout(f"Time limit of {time_limit}s exceeded")
+                # lets every other ready run have its slice first
+                await asyncio.sleep(0)
+        except StopIteration:
+            return run_result(rt)
+        except Exception as e:
+            return run_result(rt, e)
+        finally:
+            steps.close()
+            self.running -= 1
+
+    # runs a program once for every set of inputs, at most concurrency runs at a time (all
+    # at once by default), and gets their RunResults in the same order
+    async def run_all(self, program, input_sets, concurrency=None, **run_args):
+        if concurrency is None:
+            return await asyncio.gather(*(self.run(program, inputs, **run_args) for inputs in input_sets))
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run_one(inputs):
+            async with semaphore:
+                return await self.run(program, inputs, **run_args)
+
+        return await asyncio.gather(*(run_one(inputs) for inputs in input_sets))
+
+
+# gets an async function that reads the next input line (None once there are no more)
+def input_reader(inputs):
+    if hasattr(inputs, '__aiter__'):
+        lines = inputs.__aiter__()
+
+        async def read_async_line():
+            try:
+                return await lines.__anext__()
+            except StopAsyncIteration:
+                return None
+
+        return read_async_line
+
+    provider = inputs if hasattr(inputs, 'next_line') else LineInput(inputs)
+
+    async def read_line():
+        return provider.next_line()
+
+    return read_line
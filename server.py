@@ -0,0 +1,191 @@
+import argparse
+import hashlib
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from interpreterv4 import Interpreter
+from optimizer import Optimizer
+from program import Program
+from program_cache import ProgramCache
+
+# A resident interpreter: it pays for python startup, the imports and the parser once,
+# then answers run requests, one JSON object per line, either on stdin/stdout or on each
+# connection to a Unix socket.
+#
+# A request:
+#   {"id": 1, "source": "func main() { ... }", "inputs": ["5"], "max_steps": 100000}
+# or, for a program sent before, its key instead of the source:
+#   {"id": 2, "key": "<key from an earlier response>", "inputs": ["6"]}
+# ("id" is echoed back; "inputs" and "max_steps" can be left out, and max_steps needs the
+# vm engine.)
+#
+# A response:
+#   {"id": 1, "key": "...", "status": "ok", "output": ["..."], "elapsed": 0.0012}
+# where status is "ok", "error" (a Brewin error, with "error_type" and "error"), "crash",
+# "timeout" or "bad_request" (the request couldn't be run; "error" says why).
+#
+# Compiled programs are kept by the sha256 of their source in an LRU of --cache-size
+# Programs, so a program sent again (by source or by key) isn't parsed or compiled again.
+# With --cache-dir, parsed programs are also kept on disk (see program_cache) across runs
+# of the server.
+#
+# usage: python server.py [--socket PATH] [--engine ENGINE] [-O LEVEL] [--cache-size N]
+#                         [--cache-dir DIR]
+
+STATUS_NAMES = {
+    Program.OK: "ok",
+    Program.ERROR: "error",
+    Program.CRASH: "crash",
+    Program.TIMEOUT: "timeout",
+}
+BAD_REQUEST = "bad_request"
+
+
+class BadRequest(Exception):
+    pass
+
+
+class ProgramServer:
+    DEFAULT_CACHE_SIZE = 128
+
+    def __init__(self, engine=Interpreter.CLOSURE_ENGINE, opt_level=Optimizer.O1, cache_size=DEFAULT_CACHE_SIZE, cache_dir=None):
+        program_cache = None if cache_dir is None else ProgramCache(cache_dir)
+        self.interpreter = Interpreter(console_output=False, engine=engine, opt_level=opt_level, program_cache=program_cache)
+        self.cache_size = cache_size
+        self.programs = OrderedDict()  # key -> Program, least recently used first
+        self.lock = threading.Lock()
+        # the first parse can be slow (the parser builds its tables), so it's done up front
+        self.interpreter.compile("func main() { }")
+
+    # gets the compiled program of a request, compiling it if it isn't in the LRU
+    def get_program(self, request):
+        source = request.get('source')
+        if source is not None:
+            if not isinstance(source, str):
+                raise BadRequest("source must be a string")
+            key = hashlib.sha256(source.encode()).hexdigest()
+        else:
+            key = request.get('key')
+            if key is None:
+                raise BadRequest("a request needs a source or a key")
+
+        with self.lock:
+            program = self.programs.get(key)
+            if program is not None:
+                self.programs.move_to_end(key)
+                return key, program
+        if source is None:
+            raise BadRequest(f"no program with key {key}; send its source")
+
+        # compiled outside the lock, so a slow compile doesn't hold up other requests
+        program = self.interpreter.compile(source)
+        with self.lock:
+            self.programs[key] = program
+            self.programs.move_to_end(key)
+            while len(self.programs) > self.cache_size:
+                self.programs.popitem(last=False)
+        return key, program
+
+    # handles one request line and gets its response
+    def handle(self, line):
+        start = time.perf_counter()
+        response = {}
+        self.respond(line, response)
+        response['elapsed'] = round(time.perf_counter() - start, 6)
+        return response
+
+    def respond(self, line, response):
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise BadRequest("a request must be a JSON object")
+            if 'id' in request:
+                response['id'] = request['id']
+            inputs = request.get('inputs', [])
+            if not isinstance(inputs, list):
+                raise BadRequest("inputs must be a list")
+            try:
+                key, program = self.get_program(request)
+            except BadRequest:
+                raise
+            except Exception as e:
+                # the source didn't parse, or has no main
+                response.update(status=STATUS_NAMES[Program.ERROR], output=[], error=str(e))
+                return
+            response['key'] = key
+            try:
+                result = program.run([str(value) for value in inputs], max_steps=request.get('max_steps'))
+            except ValueError as e:
+                raise BadRequest(str(e))
+        except (ValueError, BadRequest) as e:
+            # ValueError also covers a line that isn't JSON
+            response.update(status=BAD_REQUEST, error=str(e))
+            return
+
+        response.update(status=STATUS_NAMES[result.status], output=[str(line) for line in result.output])
+        if result.error_type is not None:
+            response['error_type'] = result.error_type.name
+        if result.error is not None:
+            response['error'] = result.error
+
+    # answers every request line of a stream
+    def serve_stream(self, lines, out):
+        for line in lines:
+            if not line.strip():
+                continue
+            out.write(json.dumps(self.handle(line)) + "\n")
+            out.flush()
+
+    def serve_socket(self, path):
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                lines = (line.decode() for line in self.rfile)
+                server.serve_stream(lines, SocketWriter(self.wfile))
+
+        if os.path.exists(path):
+            os.remove(path)
+        with socketserver.ThreadingUnixStreamServer(path, Handler) as unix_server:
+            os.chmod(path, 0o600)
+            try:
+                unix_server.serve_forever()
+            finally:
+                os.remove(path)
+
+
+# lets serve_stream write text to a socket
+class SocketWriter:
+    def __init__(self, wfile):
+        self.wfile = wfile
+
+    def write(self, text):
+        self.wfile.write(text.encode())
+
+    def flush(self):
+        self.wfile.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Brewin programs sent as JSON lines.")
+    parser.add_argument('--socket', default=None, help="listen on this Unix socket instead of stdin")
+    parser.add_argument('--engine', choices=Interpreter.ENGINES, default=Interpreter.CLOSURE_ENGINE)
+    parser.add_argument('-O', dest='opt_level', type=int, choices=Optimizer.LEVELS, default=Optimizer.O1)
+    parser.add_argument('--cache-size', type=int, default=ProgramServer.DEFAULT_CACHE_SIZE, help="compiled programs kept in memory")
+    parser.add_argument('--cache-dir', default=None, help="also keep parsed programs in this directory")
+    args = parser.parse_args()
+
+    server = ProgramServer(args.engine, args.opt_level, args.cache_size, args.cache_dir)
+    if args.socket is None:
+        server.serve_stream(sys.stdin, sys.stdout)
+    else:
+        server.serve_socket(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+# Hidden classes for brewin objects.
+#
+# Every object's fields dict carries a Shape that stands for the names of its fields, in
+# the order they were added. Objects that got the same fields in the same order share the
+# same Shape, so "does this object have field x" can be answered once per Shape instead of
+# once per object. Fields are never removed, so an object only moves along a transition to
+# a new Shape when it gets a new field.
+class Shape:
+    __slots__ = ("transitions", "__weakref__")
+
+    def __init__(self):
+        self.transitions = {}  # field name -> the Shape after adding it
+
+    # gets the Shape of an object with this one's fields plus field_name
+    def add(self, field_name):
+        shape = self.transitions.get(field_name)
+        if shape is None:
+            shape = Shape()
+            self.transitions[field_name] = shape
+        return shape
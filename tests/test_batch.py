@@ -0,0 +1,75 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import batch  # noqa: E402
+from interpreterv4 import Interpreter  # noqa: E402
+
+ECHO = "func main() { x = inputi(); print(x * 2); }"
+LOOP = "func main() { while (true) { } }"
+UNDEFINED = "func main() { print(y); }"
+NO_MAIN = "func foo() { }"
+
+
+def write_manifest(tmp_path, programs, lines):
+    for name, source in programs.items():
+        (tmp_path / name).write_text(source)
+    manifest = tmp_path / "manifest.jsonl"
+    manifest.write_text("".join(json.dumps(line) + "\n" for line in lines))
+    return batch.read_manifest(str(manifest))
+
+
+def results_by_id(cases, **options):
+    return {result['id']: result for result in batch.run_batch(cases, workers=2, **options)}
+
+
+def test_statuses(tmp_path):
+    (tmp_path / "echo.in").write_text("21\n")
+    (tmp_path / "echo.out").write_text("42\n")
+    cases = write_manifest(tmp_path, {"echo.br": ECHO, "undefined.br": UNDEFINED, "no_main.br": NO_MAIN}, [
+        {"id": "pass", "program": "echo.br", "inputs": "echo.in", "expected": "echo.out"},
+        {"id": "fail", "program": "echo.br", "inputs": ["5"], "expected": ["11"]},
+        {"id": "ok", "program": "echo.br", "inputs": [3]},
+        {"id": "error", "program": "undefined.br"},
+        {"id": "no-main", "program": "no_main.br"},
+        {"program": "echo.br", "inputs": "missing.in"},
+    ])
+    results = results_by_id(cases)
+
+    assert results["pass"]['status'] == batch.PASS
+    assert results["pass"]['output'] == ["42"]
+    assert results["fail"]['status'] == batch.FAIL
+    assert results["fail"]['expected'] == ["11"]
+    assert results["ok"]['status'] == batch.OK
+    assert results["ok"]['output'] == ["6"]
+    assert results["error"]['status'] == batch.ERROR
+    assert "ErrorType.NAME_ERROR" in results["error"]['error']
+    assert results["no-main"]['status'] == batch.ERROR
+    # the id defaults to the line number
+    assert results[6]['status'] == batch.CRASH
+
+
+def test_step_budget_times_out(tmp_path):
+    cases = write_manifest(tmp_path, {"loop.br": LOOP, "echo.br": ECHO}, [
+        {"id": "loop", "program": "loop.br"},
+        {"id": "echo", "program": "echo.br", "inputs": ["1"], "expected": ["2"]},
+    ])
+    results = results_by_id(cases, max_steps=1000, engine=Interpreter.VM_ENGINE)
+    assert results["loop"]['status'] == batch.TIMEOUT
+    assert results["echo"]['status'] == batch.PASS
+
+
+def test_wall_clock_times_out(tmp_path):
+    cases = write_manifest(tmp_path, {"loop.br": LOOP}, [{"id": "loop", "program": "loop.br"}])
+    results = results_by_id(cases, timeout=0.2, engine=Interpreter.CLOSURE_ENGINE)
+    assert results["loop"]['status'] == batch.TIMEOUT
+
+
+def test_step_budget_needs_the_vm_engine(tmp_path):
+    cases = write_manifest(tmp_path, {"echo.br": ECHO}, [{"program": "echo.br", "inputs": ["1"]}])
+    with pytest.raises(ValueError, match="max_steps needs the vm engine"):
+        list(batch.run_batch(cases, workers=1, max_steps=10, engine=Interpreter.CLOSURE_ENGINE))
@@ -0,0 +1,61 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from interpreterv4 import Interpreter  # noqa: E402
+from optimizer import Optimizer  # noqa: E402
+
+# Runs every program in tests/programs on every engine, at every optimization level, with
+# and without the memo of pure calls, and checks that each run prints the same lines and
+# ends the same way (with the same error) as the tree engine at O0, which the others are
+# only faster versions of. A program name.br reads its input lines from name.in.
+
+PROGRAMS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "programs")
+PROGRAMS = sorted(name[:-3] for name in os.listdir(PROGRAMS_DIR) if name.endswith(".br"))
+OPT_LEVELS = (Optimizer.O0, Optimizer.O1, Optimizer.O2)
+MEMO_SIZES = (None, 64)
+
+# the tree engine takes several python frames per brewin call
+sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+
+reference_results = {}
+
+
+def read_program(name):
+    with open(os.path.join(PROGRAMS_DIR, name + ".br")) as program_file:
+        source = program_file.read()
+    inputs = []
+    input_path = os.path.join(PROGRAMS_DIR, name + ".in")
+    if os.path.exists(input_path):
+        with open(input_path) as input_file:
+            inputs = input_file.read().splitlines()
+    return source, inputs
+
+
+def run_program(name, engine, opt_level, memo_size):
+    source, inputs = read_program(name)
+    interpreter = Interpreter(console_output=False, engine=engine, opt_level=opt_level, memo_size=memo_size)
+    try:
+        program = interpreter.compile(source)
+    except Exception as e:
+        # some errors are found before the run (e.g. by constant folding)
+        return "compile", (), type(e).__name__, str(e)
+    result = program.run(inputs)
+    return result.status, result.output, result.error_type, result.error
+
+
+def reference_result(name):
+    if name not in reference_results:
+        reference_results[name] = run_program(name, Interpreter.TREE_ENGINE, Optimizer.O0, None)
+    return reference_results[name]
+
+
+@pytest.mark.parametrize("memo_size", MEMO_SIZES, ids=lambda size: "memo" if size else "nomemo")
+@pytest.mark.parametrize("opt_level", OPT_LEVELS, ids=lambda level: f"O{level}")
+@pytest.mark.parametrize("engine", Interpreter.ENGINES)
+@pytest.mark.parametrize("name", PROGRAMS)
+def test_matches_tree_engine(name, engine, opt_level, memo_size):
+    assert run_program(name, engine, opt_level, memo_size) == reference_result(name)
@@ -0,0 +1,77 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fanout import FanOut  # noqa: E402
+from interpreterv4 import Interpreter  # noqa: E402
+from intbase import ErrorType  # noqa: E402
+from program import Program  # noqa: E402
+
+SCALE = """
+func main() {
+  o = @;
+  o.factor = 3;
+  print("setup");
+  n = inputi();
+  while (n > 0) {
+    print(inputs(), " ", n * o.factor);
+    n = n - 1;
+  }
+}
+"""
+
+needs_fork = pytest.mark.skipif(not hasattr(os, 'fork'), reason="needs os.fork")
+
+
+def compile_program(source, engine):
+    return Interpreter(console_output=False, engine=engine).compile(source)
+
+
+@needs_fork
+@pytest.mark.parametrize("engine", Interpreter.ENGINES)
+def test_results_per_stream(engine, tmp_path):
+    path = tmp_path / "input.txt"
+    path.write_text("1\nfile\n")
+    fan_out = FanOut(workers=2)
+    results = fan_out.run(compile_program(SCALE, engine), [["2", "a", "b"], ["x"], str(path), ["0"]])
+
+    assert results[0].status == Program.OK
+    assert results[0].output == ("setup", "a 6", "b 3")
+    assert results[1].status == Program.ERROR
+    assert results[1].error_type == ErrorType.TYPE_ERROR
+    assert results[1].output == ("setup",)
+    assert results[2].output == ("setup", "file 3")
+    assert results[3].output == ("setup",)
+    assert fan_out.forks == 4
+    assert fan_out.setup_time > 0
+
+
+@needs_fork
+def test_program_without_input_runs_once():
+    fan_out = FanOut()
+    results = fan_out.run(compile_program('func main() { print("hi"); }', Interpreter.CLOSURE_ENGINE), [["1"], ["2"]])
+    assert [result.output for result in results] == [("hi",), ("hi",)]
+    assert fan_out.forks == 0
+
+
+@needs_fork
+def test_step_budget_of_each_stream():
+    results = FanOut().run(compile_program(SCALE, Interpreter.VM_ENGINE), [["1", "a"], ["100000"] + ["x"] * 100000], max_steps=1000)
+    assert results[0].status == Program.OK
+    assert results[1].status == Program.TIMEOUT
+
+
+def test_without_fork_each_stream_gets_a_whole_run(monkeypatch):
+    monkeypatch.delattr(os, 'fork', raising=False)
+    fan_out = FanOut()
+    results = fan_out.run(compile_program(SCALE, Interpreter.CLOSURE_ENGINE), [["1", "a"], ["1", "b"]])
+    assert [result.output for result in results] == [("setup", "a 3"), ("setup", "b 3")]
+    assert fan_out.forks == 0
+
+
+def test_workers_must_be_positive():
+    with pytest.raises(ValueError):
+        FanOut(workers=0)
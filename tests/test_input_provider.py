@@ -0,0 +1,117 @@
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import input_provider  # noqa: E402
+from input_provider import FileInput, LineInput, StreamInput, parse_int  # noqa: E402
+from interpreterv4 import Interpreter  # noqa: E402
+from intbase import ErrorType  # noqa: E402
+from program import Program  # noqa: E402
+
+SUM = """
+func main() {
+  n = inputi();
+  total = 0;
+  while (n > 0) {
+    total = total + inputi();
+    n = n - 1;
+  }
+  print(inputs(), total);
+}
+"""
+
+
+def test_parse_int():
+    assert parse_int("42") == 42
+    assert parse_int("007") == 7
+    assert parse_int("-1") is None
+    assert parse_int("4 2") is None
+    assert parse_int("") is None
+
+
+def test_line_input():
+    provider = LineInput(["1", "x", "two"])
+    assert provider.next_int() == 1
+    assert provider.next_int() is None
+    assert provider.next_line() == "two"
+    assert provider.next_line() is None
+    with pytest.raises(EOFError):
+        provider.next_int()
+
+
+def test_stream_input_splits_lines_across_chunks():
+    provider = StreamInput(io.BytesIO(b"12\nhello world\n345\nlast"), chunk_size=3)
+    assert provider.next_int() == 12
+    assert provider.next_line() == "hello world"
+    assert provider.next_int() == 345
+    # the last line needs no newline
+    assert provider.next_line() == "last"
+    assert provider.next_line() is None
+    with pytest.raises(EOFError):
+        provider.next_int()
+    assert provider.stream is None
+
+
+def test_stream_input_tokens():
+    provider = StreamInput(io.BytesIO(b"1 2\n\n 3\tx \n"), tokens=True, chunk_size=2)
+    assert [provider.next_int(), provider.next_int(), provider.next_int()] == [1, 2, 3]
+    assert provider.next_int() is None
+    with pytest.raises(EOFError):
+        provider.next_int()
+
+
+def test_stream_input_reads_a_text_stream_through_its_buffer():
+    text = io.TextIOWrapper(io.BytesIO(b"a\nb\n"))
+    assert list(StreamInput(text)) == ["a", "b"]
+
+
+def test_chunk_size_must_be_positive():
+    with pytest.raises(ValueError):
+        StreamInput(io.BytesIO(b""), chunk_size=0)
+
+
+@pytest.mark.parametrize("mmap_size", [1024 * 1024, 1], ids=["read", "mmap"])
+def test_file_input(tmp_path, monkeypatch, mmap_size):
+    monkeypatch.setattr(input_provider.FileInput, 'MMAP_SIZE', mmap_size)
+    path = tmp_path / "input.txt"
+    path.write_bytes(b"3\n10\n20\n30\ndone\n")
+    provider = FileInput(str(path), chunk_size=4)
+    assert [provider.next_int() for _ in range(4)] == [3, 10, 20, 30]
+    assert list(provider) == ["done"]
+    with pytest.raises(EOFError):
+        provider.next_int()
+
+
+def test_empty_file(tmp_path):
+    path = tmp_path / "empty.txt"
+    path.write_bytes(b"")
+    provider = FileInput(str(path))
+    assert provider.next_line() is None
+    with pytest.raises(EOFError):
+        provider.next_int()
+
+
+@pytest.mark.parametrize("engine", Interpreter.ENGINES)
+def test_programs_read_from_providers(engine, tmp_path):
+    program = Interpreter(console_output=False, engine=engine).compile(SUM)
+    path = tmp_path / "input.txt"
+    path.write_bytes(b"3\n1\n2\n3\nsum \n")
+    assert program.run(FileInput(str(path))).output == ("sum 6",)
+    assert program.run(StreamInput(io.BytesIO(b"2 5 6 total"), tokens=True)).output == ("total11",)
+    assert program.run(["1", "4", "x"]).output == ("x4",)
+
+
+@pytest.mark.parametrize("engine", Interpreter.ENGINES)
+def test_input_errors(engine):
+    program = Interpreter(console_output=False, engine=engine).compile(SUM)
+    not_int = program.run(["1", "four"])
+    assert not_int.status == Program.ERROR
+    assert not_int.error_type == ErrorType.TYPE_ERROR
+
+    ran_out = program.run(["2", "1"])
+    assert ran_out.status == Program.CRASH
+    assert ran_out.error == "No input left"
@@ -0,0 +1,93 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from interpreterv4 import Interpreter  # noqa: E402
+from memo import Memo  # noqa: E402
+from type_valuev1 import NIL, Type, Value, int_value  # noqa: E402
+
+FIB = """
+func fib(n) {
+  if (n < 2) { return n; }
+  return fib(n - 1) + fib(n - 2);
+}
+func main() { print(fib(inputi())); }
+"""
+
+IMPURE = """
+func shout(n) { print("ran ", n); return n; }
+func reads_input(n) { return inputi() + n; }
+func square(n) { return n * n; }
+func size(o) { return o.n; }
+func main() {
+  shout(1);
+  shout(1);
+  print(reads_input(1), " ", reads_input(1));
+  print(square(3) + square(3));
+  o = @; o.n = 5;
+  print(size(o), size(o));
+}
+"""
+
+
+def compile_memoized(source, engine, memo_size=64):
+    return Interpreter(console_output=False, engine=engine, memo_size=memo_size).compile(source)
+
+
+@pytest.mark.parametrize("engine", Interpreter.ENGINES)
+def test_hits_and_misses(engine):
+    program = compile_memoized(FIB, engine)
+    assert program.run(["20"]).output == ("6765",)
+    stats = program.memo.stats()
+    # fib(20) down to fib(0) each ran once
+    assert stats['misses'] == 21
+    assert stats['hits'] > 0
+    assert stats['entries'] == 21
+
+    # the memo is kept across runs of the program
+    assert program.run(["20"]).output == ("6765",)
+    assert program.memo.misses == 21
+
+
+@pytest.mark.parametrize("engine", Interpreter.ENGINES)
+def test_only_pure_calls_with_plain_args_are_memoized(engine):
+    program = compile_memoized(IMPURE, engine)
+    result = program.run(["10", "20"])
+    assert result.output == ("ran 1", "ran 1", "11 21", "18", "55")
+    # only square is pure and called with plain values
+    assert (program.memo.misses, program.memo.hits) == (1, 1)
+
+
+def test_memo_size_must_be_positive():
+    with pytest.raises(ValueError):
+        Interpreter(memo_size=0)
+    with pytest.raises(ValueError):
+        Memo(set(), max_entries=0)
+
+
+def test_least_recently_used_result_is_evicted():
+    memo = Memo({1}, max_entries=2)
+    keys = [(1, Type.INT, n) for n in range(3)]
+    memo.store(keys[0], int_value(0))
+    memo.store(keys[1], int_value(1))
+    assert memo.lookup(keys[0]) is not None
+    memo.store(keys[2], int_value(2))
+    assert memo.lookup(keys[1]) is None
+    assert memo.lookup(keys[0]) is not None
+    assert memo.stats() == {'hits': 2, 'misses': 1, 'entries': 2, 'max_entries': 2}
+
+
+def test_keys_and_results_are_plain_values_only():
+    func_node = object()
+    memo = Memo({id(func_node)})
+    assert memo.is_pure(func_node)
+    assert memo.key(func_node, [int_value(1), NIL]) == (id(func_node), Type.INT, 1, Type.NIL, None)
+    assert memo.key(func_node, [Value(Type.OBJ, {})]) is None
+    # 1 and true are different args
+    assert memo.key(func_node, [int_value(1)]) != memo.key(func_node, [Value(Type.BOOL, True)])
+
+    memo.store((1,), Value(Type.OBJ, {}))
+    assert memo.lookup((1,)) is None
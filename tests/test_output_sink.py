@@ -0,0 +1,88 @@
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from interpreterv4 import Interpreter  # noqa: E402
+from output_sink import BufferedSink, ConsoleSink, CountSink, ListSink, RingSink  # noqa: E402
+
+SOURCE = """
+func main() {
+  i = 1;
+  while (i <= 5) {
+    print("line ", i, " ", i > 2);
+    i = i + 1;
+  }
+}
+"""
+LINES = ["line 1 false", "line 2 false", "line 3 true", "line 4 true", "line 5 true"]
+
+
+def run(output_sink=None, engine=Interpreter.CLOSURE_ENGINE):
+    program = Interpreter(console_output=False, engine=engine).compile(SOURCE)
+    return program.run([], output_sink=output_sink)
+
+
+def test_list_sink_keeps_every_line():
+    for engine in Interpreter.ENGINES:
+        assert run(engine=engine).output == tuple(LINES)
+
+
+def test_list_sink_echo(capsys):
+    sink = ListSink(echo=True)
+    sink.write("a")
+    sink.write("b")
+    assert sink.lines() == ["a", "b"]
+    assert capsys.readouterr().out == "a\nb\n"
+
+
+def test_console_sink_writes_each_line_and_keeps_none():
+    stream = io.StringIO()
+    result = run(ConsoleSink(stream))
+    assert stream.getvalue() == "".join(line + "\n" for line in LINES)
+    assert result.output == ()
+
+
+def test_console_sink_follows_sys_stdout(capsys):
+    ConsoleSink().write("hello")
+    assert capsys.readouterr().out == "hello\n"
+
+
+def test_buffered_sink_writes_in_blocks():
+    stream = io.StringIO()
+    sink = BufferedSink(stream, flush_size=len(LINES[0]) * 2 + 2)
+    sink.write(LINES[0])
+    assert stream.getvalue() == ""
+    sink.write(LINES[1])
+    assert stream.getvalue() == LINES[0] + "\n" + LINES[1] + "\n"
+    sink.write(LINES[2])
+    sink.flush()
+    assert stream.getvalue() == "".join(line + "\n" for line in LINES[:3])
+    assert sink.lines() == []
+
+
+def test_buffered_sink_is_flushed_when_the_run_ends():
+    stream = io.StringIO()
+    run(BufferedSink(stream))
+    assert stream.getvalue() == "".join(line + "\n" for line in LINES)
+
+
+def test_ring_sink_keeps_the_last_lines():
+    assert run(RingSink(2)).output == tuple(LINES[-2:])
+
+
+def test_count_sink_counts():
+    sink = CountSink()
+    assert run(sink).output == ()
+    assert sink.count == len(LINES)
+    assert sink.chars == sum(len(line) for line in LINES)
+
+
+def test_sizes_must_be_positive():
+    with pytest.raises(ValueError):
+        BufferedSink(flush_size=0)
+    with pytest.raises(ValueError):
+        RingSink(0)
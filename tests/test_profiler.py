@@ -0,0 +1,102 @@
+import os
+import pstats
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from interpreterv4 import Interpreter  # noqa: E402
+from optimizer import Optimizer  # noqa: E402
+from profiler import Profiler  # noqa: E402
+
+SOURCE = """
+func fib(n) {
+  if (n < 2) {
+    return n;
+  }
+  return fib(n - 1) + fib(n - 2);
+}
+
+func main() {
+  i = 0;
+  while (i < 3) {
+    i = i + 1;
+  }
+  twice = lambda(x) { return x * 2; };
+  print(twice(fib(5)));
+}
+"""
+
+
+def profile(source):
+    interpreter = Interpreter(console_output=False, engine=Interpreter.TREE_ENGINE, opt_level=Optimizer.O0)
+    ast = interpreter.parse(source)
+    profiler = Profiler(ast, "prog.br")
+    profiler.attach(interpreter)
+    try:
+        interpreter.compile_ast(ast).execute(interpreter)
+    finally:
+        profiler.detach(interpreter)
+    return interpreter, profiler
+
+
+def hits(profiler, function_label, description):
+    return sum(count for label, count in profiler.statement_hits.items()
+               if label.startswith(function_label + " ") and label.endswith(": " + description))
+
+
+def test_call_counts():
+    interpreter, profiler = profile(SOURCE)
+    assert interpreter.get_output() == ["10"]
+    fib = profiler.functions["fib(n)"]
+    assert fib.calls == 15
+    # only the call from main started while fib wasn't already running
+    assert fib.primitive_calls == 1
+    assert profiler.functions["main()"].calls == 1
+    [lambda_label] = [label for label in profiler.functions if label.startswith("lambda")]
+    assert profiler.functions[lambda_label].calls == 1
+    assert set(profiler.callers["fib(n)"]) == {"main()", "fib(n)"}
+    assert profiler.callers["fib(n)"]["fib(n)"].calls == 14
+
+
+def test_times_add_up():
+    _, profiler = profile(SOURCE)
+    main = profiler.functions["main()"]
+    fib = profiler.functions["fib(n)"]
+    assert 0 <= main.tottime <= main.cumtime
+    assert fib.cumtime <= main.cumtime
+    assert profiler.total_time == main.cumtime
+
+
+def test_statement_hits():
+    _, profiler = profile(SOURCE)
+    assert hits(profiler, "main()", "while") == 1
+    assert hits(profiler, "main()", "i = ...") == 4
+    assert hits(profiler, "fib(n)", "if") == 15
+    assert hits(profiler, "fib(n)", "return") == 15
+
+
+def test_detach_restores_the_plain_methods():
+    interpreter, _ = profile(SOURCE)
+    assert 'run_func' not in vars(interpreter)
+    assert 'run_statement' not in vars(interpreter)
+
+
+def test_pstats_round_trip(tmp_path):
+    _, profiler = profile(SOURCE)
+    path = str(tmp_path / "prog.prof")
+    profiler.dump_stats(path)
+    stats = pstats.Stats(path)
+    by_name = {name: entry for (_, _, name), entry in stats.stats.items()}
+    primitive_calls, calls, tottime, cumtime, callers = by_name["fib(n)"]
+    assert (primitive_calls, calls) == (1, 15)
+    assert tottime == profiler.functions["fib(n)"].tottime
+    assert {name for (_, _, name) in callers} == {"main()", "fib(n)"}
+    assert stats.total_calls == sum(function_stats.calls for function_stats in profiler.functions.values())
+
+
+def test_report_lists_calls_and_statements():
+    _, profiler = profile(SOURCE)
+    report = profiler.report(sort='calls', limit=2)
+    lines = report.splitlines()
+    assert lines[0].startswith(f"{sum(stats.calls for stats in profiler.functions.values())} calls")
+    assert "15/1" in lines[3] and lines[3].endswith("fib(n)")
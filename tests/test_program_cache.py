@@ -0,0 +1,101 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import program_cache  # noqa: E402
+from interpreterv4 import Interpreter  # noqa: E402
+from optimizer import Optimizer, dump_ast  # noqa: E402
+from program_cache import ProgramCache  # noqa: E402
+from type_valuev1 import NIL, TRUE  # noqa: E402
+
+SOURCE = """
+func main() {
+  x = 1 + 2;
+  if (x > 2) { print("big ", x, true); }
+  y = nil;
+}
+"""
+
+
+def entries(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(ProgramCache.SUFFIX))
+
+
+def test_miss_then_hit(tmp_path):
+    cache = ProgramCache(str(tmp_path))
+    interpreter = Interpreter(console_output=False, program_cache=cache)
+    first = interpreter.parse(SOURCE)
+    assert (cache.hits, cache.misses) == (0, 1)
+    assert len(entries(tmp_path)) == 1
+
+    second = interpreter.parse(SOURCE)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert second is not first
+    assert dump_ast(second) == dump_ast(first)
+
+
+def test_source_and_opt_level_are_part_of_the_key(tmp_path):
+    cache = ProgramCache(str(tmp_path))
+    Interpreter(console_output=False, program_cache=cache, opt_level=Optimizer.O1).parse(SOURCE)
+    Interpreter(console_output=False, program_cache=cache, opt_level=Optimizer.O2).parse(SOURCE)
+    Interpreter(console_output=False, program_cache=cache).parse(SOURCE + "\n")
+    assert (cache.hits, cache.misses) == (0, 3)
+    assert len(entries(tmp_path)) == 3
+
+
+def test_loaded_values_are_the_shared_ones(tmp_path):
+    cache = ProgramCache(str(tmp_path))
+    cache.store("src", Optimizer.O0, [TRUE, NIL])
+    assert ProgramCache(str(tmp_path)).load("src", Optimizer.O0) == [TRUE, NIL]
+    loaded = cache.load("src", Optimizer.O0)
+    assert loaded[0] is TRUE and loaded[1] is NIL
+
+
+def test_another_version_misses_and_its_entries_are_removed(tmp_path, monkeypatch):
+    old_cache = ProgramCache(str(tmp_path))
+    Interpreter(console_output=False, program_cache=old_cache).parse(SOURCE)
+    [old_entry] = entries(tmp_path)
+
+    monkeypatch.setattr(program_cache, 'CACHE_FORMAT', program_cache.CACHE_FORMAT + 1)
+    new_cache = ProgramCache(str(tmp_path))
+    assert new_cache.version != old_cache.version
+    Interpreter(console_output=False, program_cache=new_cache).parse(SOURCE)
+    assert (new_cache.hits, new_cache.misses) == (0, 1)
+    assert old_entry not in entries(tmp_path)
+    assert len(entries(tmp_path)) == 1
+
+
+def test_version_covers_the_modules_that_build_the_ast():
+    assert {'brewparse', 'element', 'optimizer', 'type_valuev1'} <= set(program_cache.VERSION_MODULES)
+
+
+def test_damaged_entry_is_a_miss_and_removed(tmp_path):
+    cache = ProgramCache(str(tmp_path))
+    cache.store("src", Optimizer.O0, [TRUE])
+    with open(cache.path("src", Optimizer.O0), 'wb') as entry:
+        entry.write(b"not a pickle")
+    assert cache.load("src", Optimizer.O0) is None
+    assert cache.misses == 1
+    assert entries(tmp_path) == []
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ProgramCache(str(tmp_path))
+    cache.store("a", Optimizer.O0, ["x" * 1000])
+    entry_size = os.path.getsize(cache.path("a", Optimizer.O0))
+    cache.max_bytes = entry_size * 2
+    cache.store("b", Optimizer.O0, ["y" * 1000])
+    # make a the older entry, then b the more recently used one
+    os.utime(cache.path("a", Optimizer.O0), (1, 1))
+    assert cache.load("b", Optimizer.O0) is not None
+    cache.store("c", Optimizer.O0, ["z" * 1000])
+    assert cache.load("a", Optimizer.O0) is None
+    assert cache.load("b", Optimizer.O0) is not None
+    assert cache.load("c", Optimizer.O0) is not None
+
+
+def test_entry_over_max_bytes_is_not_stored(tmp_path):
+    cache = ProgramCache(str(tmp_path), max_bytes=10)
+    cache.store("a", Optimizer.O0, ["x" * 1000])
+    assert entries(tmp_path) == []
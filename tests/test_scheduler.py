@@ -0,0 +1,91 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from interpreterv4 import Interpreter  # noqa: E402
+from program import Program  # noqa: E402
+from scheduler import Scheduler  # noqa: E402
+
+COUNT = """
+func main() {
+  n = inputi();
+  i = 0;
+  while (i < n) {
+    i = i + 1;
+  }
+  print(inputs(), i);
+}
+"""
+FOREVER = "func main() { while (true) { } }"
+
+
+def compile_vm(source):
+    return Interpreter(console_output=False, engine=Interpreter.VM_ENGINE).compile(source)
+
+
+def test_runs_to_the_end_in_slices():
+    scheduler = Scheduler(slice_steps=10)
+    result = asyncio.run(scheduler.run(compile_vm(COUNT), ["100", "n="]))
+    assert result.status == Program.OK
+    assert result.output == ("n=100",)
+    # the last slice ends the run instead
+    assert scheduler.slices >= 9
+    assert scheduler.running == 0
+
+
+def test_step_budget():
+    result = asyncio.run(Scheduler(slice_steps=10).run(compile_vm(FOREVER), max_steps=500))
+    assert result.status == Program.TIMEOUT
+
+
+def test_time_budget_does_not_hold_up_other_runs():
+    scheduler = Scheduler(slice_steps=100)
+    forever = compile_vm(FOREVER)
+    count = compile_vm(COUNT)
+
+    async def both():
+        return await asyncio.gather(
+            scheduler.run(forever, time_limit=0.2),
+            scheduler.run(count, ["1000", ""]),
+        )
+
+    forever_result, count_result = asyncio.run(both())
+    assert forever_result.status == Program.TIMEOUT
+    assert "0.2" in forever_result.error
+    assert count_result.status == Program.OK
+    assert count_result.output == ("1000",)
+
+
+def test_async_inputs():
+    async def lines():
+        for line in ("3", "count "):
+            await asyncio.sleep(0)
+            yield line
+
+    result = asyncio.run(Scheduler().run(compile_vm(COUNT), lines()))
+    assert result.output == ("count 3",)
+
+
+def test_errors_end_the_run():
+    result = asyncio.run(Scheduler().run(compile_vm(COUNT), ["x"]))
+    assert result.status == Program.ERROR
+
+
+def test_run_all_keeps_the_order():
+    scheduler = Scheduler(slice_steps=5)
+    input_sets = [[str(n), f"{n}:"] for n in (50, 1, 20, 0)]
+    for concurrency in (None, 2):
+        results = asyncio.run(scheduler.run_all(compile_vm(COUNT), input_sets, concurrency=concurrency))
+        assert [result.output for result in results] == [("50:50",), ("1:1",), ("20:20",), ("0:0",)]
+
+
+def test_needs_the_vm_engine():
+    program = Interpreter(console_output=False, engine=Interpreter.CLOSURE_ENGINE).compile(COUNT)
+    with pytest.raises(ValueError):
+        asyncio.run(Scheduler().run(program))
+    with pytest.raises(ValueError):
+        Scheduler(slice_steps=0)
@@ -0,0 +1,128 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from interpreterv4 import Interpreter  # noqa: E402
+
+# The tree engine pushes a scope and an alias dict for every call and block. Checks that
+# it pops both of them at the end of if blocks, of every while iteration, and on a return
+# from inside a loop, so the two lists stay the same length and a long loop doesn't make
+# them grow.
+
+ITERATIONS = 500
+
+LOOP_SOURCE = """
+func bump(count) {
+  return count + 1;
+}
+
+func find(limit) {
+  k = 0;
+  while (true) {
+    k = k + 1;
+    if (k == limit) {
+      return k;
+    }
+  }
+}
+
+func first_odd(n) {
+  j = 0;
+  while (j < n) {
+    while (true) {
+      if (j - j / 2 * 2 == 1) {
+        return j;
+      }
+      j = j + 1;
+    }
+  }
+  return -1;
+}
+
+func main() {
+  n = inputi();
+  i = 0;
+  total = 0;
+  last = 0;
+  while (i < n) {
+    total = bump(total);
+    if (i - i / 2 * 2 == 0) {
+      last = find(2);
+    } else {
+      last = first_odd(4);
+    }
+    i = i + 1;
+  }
+  print(total, " ", last);
+}
+"""
+
+
+# checks the scope and alias lists at every statement it runs
+class CheckedInterpreter(Interpreter):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_scopes = 0
+        self.max_aliases = 0
+        self.mismatches = 0
+
+    def run_statement(self, statement_node, lambda_node=None):
+        self.check_scopes()
+        return_value = super().run_statement(statement_node, lambda_node)
+        self.check_scopes()
+        return return_value
+
+    def check_scopes(self):
+        if len(self.variable_scope_list) != len(self.variable_alias_list):
+            self.mismatches += 1
+        self.max_scopes = max(self.max_scopes, len(self.variable_scope_list))
+        self.max_aliases = max(self.max_aliases, len(self.variable_alias_list))
+
+
+def run_checked(source, inputs):
+    program = CheckedInterpreter(console_output=False, engine=Interpreter.TREE_ENGINE).compile(source)
+    rt = program.runtime(inputs, None, None)
+    program.execute(rt)
+    return rt
+
+
+def test_loops_keep_scope_and_alias_lists_in_lockstep():
+    rt = run_checked(LOOP_SOURCE, [str(ITERATIONS)])
+    assert rt.get_output() == [f"{ITERATIONS} 1"]
+    assert rt.mismatches == 0
+    # main's loop and if, then first_odd with its two loops and if
+    assert rt.max_scopes == 7
+
+
+def test_scopes_do_not_grow_with_iterations():
+    short = run_checked(LOOP_SOURCE, ["2"])
+    long = run_checked(LOOP_SOURCE, [str(ITERATIONS)])
+    assert long.max_scopes == short.max_scopes
+    assert long.max_aliases == short.max_aliases
+
+
+def test_if_blocks_pop_their_scopes():
+    source = """
+func main() {
+  x = 0;
+  if (true) { y = 1; if (true) { z = 2; x = y + z; } }
+  if (false) { x = 10; } else { x = x + 1; }
+  print(x);
+}
+"""
+    rt = run_checked(source, [])
+    assert rt.get_output() == ["4"]
+    assert rt.mismatches == 0
+    assert rt.max_scopes == 3
+
+
+def test_frame_pool_reuses_call_frames():
+    for engine in (Interpreter.CLOSURE_ENGINE, Interpreter.VM_ENGINE):
+        program = Interpreter(console_output=False, engine=engine).compile(LOOP_SOURCE)
+        assert program.run([str(ITERATIONS)]).output == (f"{ITERATIONS} 1",)
+        compiler = getattr(program.compiled, 'compiler', program.compiled)
+        codes = {code.name: code for code in compiler.codes.values()}
+        # every call to find ran in the one frame its pool keeps handing back
+        assert len(codes['find'].frames.frames) == 1
+        assert len(codes['main'].frames.frames) == 1
@@ -0,0 +1,78 @@
+import io
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from interpreterv4 import Interpreter  # noqa: E402
+from server import BAD_REQUEST, ProgramServer  # noqa: E402
+
+DOUBLE = "func main() { x = inputi(); print(x * 2); }"
+LOOP = "func main() { while (true) { } }"
+
+
+def request(server, **fields):
+    return server.handle(json.dumps(fields))
+
+
+def test_run_by_source_then_by_key():
+    server = ProgramServer()
+    first = request(server, id=1, source=DOUBLE, inputs=[21])
+    assert first['id'] == 1
+    assert first['status'] == "ok"
+    assert first['output'] == ["42"]
+    assert first['elapsed'] >= 0
+
+    second = request(server, id="b", key=first['key'], inputs=["5"])
+    assert second['id'] == "b"
+    assert second['status'] == "ok"
+    assert second['output'] == ["10"]
+    assert second['key'] == first['key']
+
+
+def test_brewin_errors_and_compile_errors():
+    server = ProgramServer()
+    error = request(server, source="func main() { print(y); }")
+    assert error['status'] == "error"
+    assert error['error_type'] == "NAME_ERROR"
+    assert error['output'] == []
+
+    no_main = request(server, source="func foo() { }")
+    assert no_main['status'] == "error"
+    assert 'key' not in no_main
+
+
+def test_bad_requests():
+    server = ProgramServer()
+    for line in ("not json", "[1, 2]", json.dumps({"id": 3}), json.dumps({"source": 5}),
+                 json.dumps({"source": DOUBLE, "inputs": "5"}), json.dumps({"key": "unknown"})):
+        response = server.handle(line)
+        assert response['status'] == BAD_REQUEST
+        assert response['error']
+    assert server.handle(json.dumps({"id": 3}))['id'] == 3
+
+
+def test_max_steps():
+    vm_server = ProgramServer(engine=Interpreter.VM_ENGINE)
+    assert request(vm_server, source=LOOP, max_steps=100)['status'] == "timeout"
+    # max_steps needs the vm engine
+    assert request(ProgramServer(), source=LOOP, max_steps=100)['status'] == BAD_REQUEST
+
+
+def test_least_recently_used_program_is_dropped():
+    server = ProgramServer(cache_size=1)
+    first = request(server, source=DOUBLE, inputs=["1"])
+    request(server, source="func main() { print(1); }")
+    assert request(server, key=first['key'])['status'] == BAD_REQUEST
+    assert len(server.programs) == 1
+
+
+def test_serve_stream_answers_every_line():
+    server = ProgramServer()
+    lines = [json.dumps({"id": 1, "source": DOUBLE, "inputs": ["2"]}), "", "oops\n", json.dumps({"id": 2, "source": DOUBLE, "inputs": ["3"]})]
+    out = io.StringIO()
+    server.serve_stream(lines, out)
+    responses = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [response['status'] for response in responses] == ["ok", BAD_REQUEST, "ok"]
+    assert responses[2]['output'] == ["6"]
@@ -14,7 +14,10 @@ class Type(Enum):
 
 
 # Represents a value, which has a type and its value
+# Values are never changed once created (so the ones below can be shared)
 class Value:
+    __slots__ = ("t", "v", "__weakref__")
+
     def __init__(self, type, value=None):
         self.t = type
         self.v = value
@@ -30,13 +33,40 @@ class Value:
         self.v = other.v
 
 
+TRUE = Value(Type.BOOL, True)
+FALSE = Value(Type.BOOL, False)
+NIL = Value(Type.NIL, None)
+
+# ints in this range are only created once
+SMALL_INT_MIN = -128
+SMALL_INT_MAX = 1023
+SMALL_INTS = [Value(Type.INT, i) for i in range(SMALL_INT_MIN, SMALL_INT_MAX + 1)]
+
+
+# typed constructors, for when the type of the value is already known
+def int_value(val):
+    if SMALL_INT_MIN <= val <= SMALL_INT_MAX:
+        return SMALL_INTS[val - SMALL_INT_MIN]
+    return Value(Type.INT, val)
+
+
+def bool_value(val):
+    return TRUE if val else FALSE
+
+
+def string_value(val):
+    return Value(Type.STRING, val)
+
+
 def create_value(val):
+    if val.__class__ is int:
+        return int_value(val)
     if val == InterpreterBase.TRUE_DEF:
-        return Value(Type.BOOL, True)
+        return TRUE
     elif val == InterpreterBase.FALSE_DEF:
-        return Value(Type.BOOL, False)
+        return FALSE
     elif val == InterpreterBase.NIL_DEF:
-        return Value(Type.NIL, None)
+        return NIL
     elif isinstance(val, str):
         return Value(Type.STRING, val)
     elif isinstance(val, int):
@@ -50,9 +80,20 @@ def get_printable(val):
     if val.type() == Type.INT:
         return str(val.value())
     if val.type() == Type.STRING:
-        return val.value()
+        # a long concat may be a rope.Rope, which is only joined here
+        text = val.value()
+        return text if text.__class__ is str else str(text)
     if val.type() == Type.BOOL:
         if val.value() is True:
             return "true"
         return "false"
     return None
+
+
+# gets the text print writes for one of its args. printing a value that has none (nil, an
+# object, a function) fails the way the baseline's string concatenation did
+def get_print_text(val):
+    text = get_printable(val)
+    if text is None:
+        raise TypeError('can only concatenate str (not "NoneType") to str')
+    return text
@@ -0,0 +1,588 @@
+import sys
+
+from bytecode import (
+    BINARY_ADD, BINARY_ADD_INT, BINARY_ADD_STRING, BINARY_OP, BINARY_OP_INT, BIND_ARG, BOOL_AND,
+    BOOL_OR, CALL_FUNCTION, CALL_METHOD, CALL_VARIABLE, COMPARE, COMPARE_INT, CONST, ENTER,
+    ENTER_MEMO, EQUAL, EQUAL_INT, GENERIC, INPUT_ARGS_ERROR, INPUTI, INPUTS, JUMP, JUMP_IF_FALSE,
+    JUMP_IF_TRUE, LOAD_FIELD, LOAD_FUNC, LOAD_NAME, LOAD_SLOT, MAKE_LAMBDA, MAX_DEOPTS, NEG,
+    NEW_OBJECT, NOT, NOT_EQUAL, NOT_EQUAL_INT, POP, POP_SCOPE, PRINT, PROMPT, PUSH_SCOPE, RETURN,
+    RETURN_NIL, SPECIALIZED, STORE_FIELD, STORE_NAME, STORE_SLOT, TAIL_ENTER,
+)
+from compiler import (
+    assign_captured, bind_arg, capture_vars, check_ints, condition_truth, input_value, read_captured,
+    read_input, read_scopes, store_scopes, values_equal,
+)
+from copy_on_write import CAPTURED_VARS, LAMBDA_NODE, Heap, copy_value
+from env_v1 import Cell
+from intbase import ErrorType
+from program import ExecutionTimeout
+from rope import concat_value
+from type_valuev1 import NIL, Type, Value, bool_value, create_value, get_print_text, get_printable, int_value
+
+# The VM runs the code of a bytecode.BytecodeCompiler. A Brewin call doesn't call back into
+# python: the running function's (body, pc, lambda node, scope base) is pushed on the VM's
+# own call stack and the callee's body is run by the same loop, so recursion is only
+# limited by memory, or by max_depth (the most calls that can be running at once, main
+# included) when one is given. A tail call (see bytecode) replaces the running call.
+#
+# rt.max_steps, when set, is a budget for the run: every loop iteration after the first
+# and every call takes a step, and running out raises program.ExecutionTimeout. Those are
+# the only ways a program can keep running, so any program that never ends runs out.
+#
+# execute is a generator, so a run can also be suspended and resumed (see scheduler): with
+# slice_steps it yields VM.SLICE_END after every slice_steps steps, and with suspend_input
+# it yields VM.NEEDS_INPUT at every inputi/inputs and gets the input line sent back
+# (None once there is no more). Between two steps a run only does a bounded amount of
+# work, so every slice is short. run_main runs main to the end without suspending it.
+#
+# Scopes, frames, Cells and the heap are the same as in the closure engine (see compiler),
+# so rt.variable_scope_list and rt.frame look the same to anything that reads them.
+#
+# The arithmetic, comparison and equality instructions are quickened as they run (see
+# bytecode): the generic ones pass the types of their operands to quicken, and a
+# specialized one whose guard fails is deoptimized and run again as the generic one.
+# Bodies are shared by every run of a Program, so what one run quickened the next starts
+# with.
+
+# the operand types the specialized instructions are for, looked up once
+INT = Type.INT
+STRING = Type.STRING
+
+
+# a call whose frame is pushed but whose args are still being bound
+class PendingCall:
+    __slots__ = ("code", "lambda_node", "frame", "scope_base", "this_cell")
+
+    def __init__(self, code, lambda_node, frame, scope_base, this_cell):
+        self.code = code
+        self.lambda_node = lambda_node
+        self.frame = frame
+        self.scope_base = scope_base  # index of frame in the scope list
+        self.this_cell = this_cell
+
+
+class VM:
+    # what a suspended run yields
+    SLICE_END = 0
+    NEEDS_INPUT = 1
+
+    def __init__(self, compiler, max_depth=None):
+        self.compiler = compiler
+        self.max_depth = max_depth
+
+    def run_main(self, rt, main_node):
+        steps = self.start_main(rt, main_node)
+        try:
+            # without slices or suspended input, this never yields
+            next(steps)
+        except StopIteration as stop:
+            return stop.value
+
+    # gets the generator that runs main (see execute)
+    def start_main(self, rt, main_node, slice_steps=None, suspend_input=False):
+        code = self.compiler.codes[id(main_node)]
+        rt.heap = Heap()
+        rt.frame = code.frames.acquire()
+        rt.variable_scope_list = [rt.frame]
+        return self.execute(rt, code, slice_steps, suspend_input)
+
+    # pushes the frame of a call and gets its PendingCall
+    def begin_call(self, rt, code, lambda_node, this_cell):
+        frame = code.frames.acquire()
+        scopes = rt.variable_scope_list
+        scopes.append(frame)
+        return PendingCall(code, lambda_node, frame, len(scopes) - 1, this_cell)
+
+    def call_variable(self, rt, site, lambda_node):
+        var_value = site.lookup(rt)
+        if var_value.t == Type.FUNC:
+            return self.begin_call(rt, self.compiler.resolve_func_value(rt, var_value, site.arity), None, None)
+        # captured variables take precedence inside of a lambda
+        if site.in_lambda and lambda_node is not None and var_value.t == Type.LAMBDA and site.name in lambda_node[CAPTURED_VARS]:
+            captured_lambda = lambda_node[CAPTURED_VARS][site.name]
+            code = self.compiler.codes[id(captured_lambda.v[LAMBDA_NODE])]
+            return self.begin_call(rt, code, captured_lambda, None)
+        if var_value.t == Type.LAMBDA:
+            code = self.compiler.codes[id(var_value.v[LAMBDA_NODE])]
+            if len(code.params) != site.arity:
+                rt.error(
+                    ErrorType.TYPE_ERROR,
+                    "Invalid number of args passed into lambda",
+                )
+            return self.begin_call(rt, code, var_value.v, None)
+        rt.error(
+            ErrorType.TYPE_ERROR,
+            "Attempting to call function on non-function variable type",
+        )
+
+    def call_method(self, rt, site):
+        this_cell = site.reference(rt)
+        if this_cell is None:
+            site.lookup(rt)  # reports the undefined variable
+        obj = this_cell.value
+        if obj.t != Type.OBJ:
+            rt.error(
+                ErrorType.TYPE_ERROR,
+                "Trying to call method on non-object",
+            )
+
+        # follow the proto chain until the method is found
+        var_value = site.cache.lookup(rt.heap, obj)
+        if var_value is None:
+            rt.error(
+                ErrorType.NAME_ERROR,
+                "Method does not exist on this object",
+            )
+
+        if var_value.t == Type.FUNC:
+            code = self.compiler.resolve_func_value(rt, var_value, site.arity)
+            return self.begin_call(rt, code, None, this_cell)
+        if var_value.t == Type.LAMBDA:
+            code = self.compiler.codes[id(var_value.v[LAMBDA_NODE])]
+            if len(code.params) != site.arity:
+                rt.error(
+                    ErrorType.NAME_ERROR,
+                    "Invalid number of args passed into obj lambda method",
+                )
+            return self.begin_call(rt, code, var_value.v, this_cell)
+        rt.error(
+            ErrorType.TYPE_ERROR,
+            "Attempting to call function on non-function variable type",
+        )
+
+    # ends the steps a run was given: raises ExecutionTimeout if the run used up its step
+    # budget, otherwise suspends it and gets (steps left in the next slice, the budget left
+    # after that slice) once it's resumed, with this step taken
+    def next_slice(self, rt, slice_steps, budget_left):
+        if budget_left == 0:
+            raise ExecutionTimeout(f"Step limit of {rt.max_steps} exceeded")
+        yield VM.SLICE_END
+        steps = min(slice_steps, budget_left)
+        return steps - 1, budget_left - steps
+
+    # runs a function (and everything it calls) and returns its return value
+    def execute(self, rt, code, slice_steps=None, suspend_input=False):
+        heap = rt.heap
+        scopes = rt.variable_scope_list
+        stack = []  # operand stack, shared by every running function
+        # (body, pc, lambda node, scope base, frame) of each caller, and the memo key of
+        # the call it made (None unless it went through ENTER_MEMO)
+        calls = []
+        memo = self.compiler.memo
+        max_callers = sys.maxsize if self.max_depth is None else self.max_depth - 1
+        # steps_left counts down the steps of the current slice (without slices, the whole
+        # budget), and budget_left is what's left of the budget after it
+        budget_left = sys.maxsize if rt.max_steps is None else rt.max_steps
+        steps_left = budget_left if slice_steps is None else min(slice_steps, budget_left)
+        budget_left -= steps_left
+
+        body = code.body
+        pc = 0
+        lambda_node = None
+        scope_base = len(scopes) - 1
+
+        while True:
+            op = body[pc]
+            arg = body[pc + 1]
+            pc += 2
+
+            # the loop and arithmetic instructions come first, calls and the rest after them
+            if op < LOAD_FIELD:
+                if op == LOAD_SLOT:
+                    if arg.in_lambda and lambda_node is not None:
+                        value = read_captured(lambda_node, arg.name)
+                        if value is not None:
+                            stack.append(value)
+                            continue
+                    value = rt.frame.slots[arg.slot]
+                    if value is None:
+                        # not created in this frame (yet), so it may live further down the scopes
+                        value = read_scopes(rt, arg.name)
+                    elif value.__class__ is Cell:
+                        value = value.value
+                    stack.append(value)
+
+                elif op == CONST:
+                    stack.append(arg)
+
+                elif op == LOAD_NAME:
+                    if arg.in_lambda and lambda_node is not None:
+                        value = read_captured(lambda_node, arg.name)
+                        if value is not None:
+                            stack.append(value)
+                            continue
+                    stack.append(read_scopes(rt, arg.name))
+
+                elif op == STORE_SLOT:
+                    value = stack.pop()
+                    if arg.in_lambda and lambda_node is not None:
+                        captured_vars = lambda_node[CAPTURED_VARS]
+                        if arg.name in captured_vars:
+                            assign_captured(rt, captured_vars, arg.name, value)
+                            continue
+                    slots = rt.frame.slots
+                    current = slots[arg.slot]
+                    if current is None:
+                        store_scopes(rt, arg.name, value)
+                    elif current.__class__ is Cell:
+                        current.value = value
+                        if current.home is not None:
+                            current.settle()
+                    else:
+                        slots[arg.slot] = value
+
+                elif op == STORE_NAME:
+                    value = stack.pop()
+                    if arg.in_lambda and lambda_node is not None:
+                        captured_vars = lambda_node[CAPTURED_VARS]
+                        if arg.name in captured_vars:
+                            assign_captured(rt, captured_vars, arg.name, value)
+                            continue
+                    store_scopes(rt, arg.name, value)
+
+                elif op == COMPARE_INT:
+                    op2_val = stack.pop()
+                    op1_val = stack[-1]
+                    if op1_val.t == INT and op2_val.t == INT:
+                        stack[-1] = bool_value(arg.fn(op1_val.v, op2_val.v))
+                    else:
+                        # the guard failed: run it again as the generic instruction
+                        deoptimize(body, pc - 2, arg)
+                        stack.append(op2_val)
+                        pc -= 2
+
+                elif op == BINARY_ADD_INT:
+                    op2_val = stack.pop()
+                    op1_val = stack[-1]
+                    if op1_val.t == INT and op2_val.t == INT:
+                        stack[-1] = int_value(op1_val.v + op2_val.v)
+                    else:
+                        deoptimize(body, pc - 2, arg)
+                        stack.append(op2_val)
+                        pc -= 2
+
+                elif op == BINARY_OP_INT:
+                    op2_val = stack.pop()
+                    op1_val = stack[-1]
+                    if op1_val.t == INT and op2_val.t == INT:
+                        stack[-1] = int_value(arg.fn(op1_val.v, op2_val.v))
+                    else:
+                        deoptimize(body, pc - 2, arg)
+                        stack.append(op2_val)
+                        pc -= 2
+
+                elif op == EQUAL_INT or op == NOT_EQUAL_INT:
+                    op2_val = stack.pop()
+                    op1_val = stack[-1]
+                    if op1_val.t == INT and op2_val.t == INT:
+                        stack[-1] = bool_value((op1_val.v == op2_val.v) == (op == EQUAL_INT))
+                    else:
+                        deoptimize(body, pc - 2, arg)
+                        stack.append(op2_val)
+                        pc -= 2
+
+                elif op == BINARY_ADD_STRING:
+                    op2_val = stack.pop()
+                    op1_val = stack[-1]
+                    if op1_val.t == STRING and op2_val.t == STRING:
+                        stack[-1] = concat_value(op1_val.v, op2_val.v)
+                    else:
+                        deoptimize(body, pc - 2, arg)
+                        stack.append(op2_val)
+                        pc -= 2
+
+                elif op == BINARY_ADD:
+                    op2_val = stack.pop()
+                    op1_val = stack[-1]
+                    # string concat
+                    if op1_val.t == Type.STRING and op2_val.t == Type.STRING:
+                        stack[-1] = concat_value(op1_val.v, op2_val.v)
+                    else:
+                        a, b = check_ints(rt, op1_val, op2_val)
+                        stack[-1] = int_value(a + b)
+                    if arg.warmup:
+                        quicken(body, pc - 2, arg, op1_val.t, op2_val.t)
+
+                elif op == BINARY_OP:
+                    op2_val = stack.pop()
+                    op1_val = stack[-1]
+                    a, b = check_ints(rt, op1_val, op2_val)
+                    stack[-1] = int_value(arg.fn(a, b))
+                    if arg.warmup:
+                        quicken(body, pc - 2, arg, op1_val.t, op2_val.t)
+
+                elif op == COMPARE:
+                    op2_val = stack.pop()
+                    op1_val = stack[-1]
+                    a, b = check_ints(rt, op1_val, op2_val)
+                    stack[-1] = bool_value(arg.fn(a, b))
+                    if arg.warmup:
+                        quicken(body, pc - 2, arg, op1_val.t, op2_val.t)
+
+                elif op == JUMP_IF_FALSE:
+                    if not condition_truth(rt, stack.pop(), arg.message):
+                        pc = arg.target
+
+                elif op == JUMP_IF_TRUE:
+                    if condition_truth(rt, stack.pop(), arg.message):
+                        pc = arg.target
+                        steps_left -= 1
+                        if steps_left < 0:
+                            steps_left, budget_left = yield from self.next_slice(rt, slice_steps, budget_left)
+
+                elif op == JUMP:
+                    pc = arg
+
+                elif op == PUSH_SCOPE:
+                    scopes.append({})
+
+                elif op == POP_SCOPE:
+                    scopes.pop()
+
+            else:
+                if op == LOAD_FIELD:
+                    if arg.in_lambda and lambda_node is not None:
+                        value = read_captured(lambda_node, arg.name)
+                        if value is not None:
+                            stack.append(value)
+                            continue
+                    obj = arg.lookup(rt)
+                    if obj.t != Type.OBJ:
+                        rt.error(
+                            ErrorType.TYPE_ERROR,
+                            "Attempting to get field/method from non-object type",
+                        )
+                    # follow the proto chain until the field is found
+                    value = arg.cache.lookup(heap, obj)
+                    if value is None:
+                        rt.error(
+                            ErrorType.NAME_ERROR,
+                            "Field does not exist on this object",
+                        )
+                    stack.append(value)
+
+                elif op == STORE_FIELD:
+                    value = stack.pop()
+                    if arg.in_lambda and lambda_node is not None:
+                        captured_vars = lambda_node[CAPTURED_VARS]
+                        if arg.name in captured_vars:
+                            assign_captured(rt, captured_vars, arg.name, value)
+                            continue
+                    # if assigning proto, make sure it's an object type
+                    if arg.field_name == 'proto' and value.t != Type.OBJ and value.t != Type.NIL:
+                        rt.error(
+                            ErrorType.TYPE_ERROR,
+                            "Can't set proto to non-object or non-nil type",
+                        )
+                    obj = arg.lookup(rt)
+                    if obj.t != Type.OBJ:
+                        rt.error(
+                            ErrorType.TYPE_ERROR,
+                            "Attempting to get field/method from non-object type",
+                        )
+                    heap.set_field(obj.v, arg.field_name, value)
+
+                elif op == CALL_FUNCTION:
+                    frame = arg.code.frames.acquire()
+                    scopes.append(frame)
+                    stack.append(PendingCall(arg.code, None, frame, len(scopes) - 1, None))
+
+                elif op == CALL_VARIABLE:
+                    stack.append(self.call_variable(rt, arg, lambda_node))
+
+                elif op == CALL_METHOD:
+                    stack.append(self.call_method(rt, arg))
+
+                elif op == BIND_ARG:
+                    arg_val = stack.pop()
+                    call = stack[-1]
+                    bind_arg(rt, call.code, call.frame.slots, arg.index, arg_val, arg.reference, call.this_cell)
+
+                elif op == ENTER or op == ENTER_MEMO:
+                    call = stack.pop()
+                    memo_key = None
+                    if op == ENTER_MEMO:
+                        frame_slots = call.frame.slots
+                        memo_key = memo.key(call.code.node, [frame_slots[slot] for slot in call.code.param_slots])
+                        if memo_key is not None:
+                            value = memo.lookup(memo_key)
+                            if value is not None:
+                                # the callee doesn't run: its frame goes straight away
+                                del scopes[call.scope_base:]
+                                call.code.frames.release(call.frame)
+                                stack.append(value)
+                                continue
+                    # if this is an object, then add the this variable to be the objref
+                    if call.this_cell is not None:
+                        call.frame["this"] = call.this_cell
+                    steps_left -= 1
+                    if steps_left < 0:
+                        steps_left, budget_left = yield from self.next_slice(rt, slice_steps, budget_left)
+                    if len(calls) >= max_callers:
+                        rt.error(
+                            ErrorType.FAULT_ERROR,
+                            f"Maximum call depth of {self.max_depth} exceeded",
+                        )
+                    calls.append((body, pc, lambda_node, scope_base, rt.frame, memo_key))
+                    rt.frame = call.frame
+                    body = call.code.body
+                    pc = 0
+                    lambda_node = call.lambda_node
+                    scope_base = call.scope_base
+
+                elif op == TAIL_ENTER:
+                    # the caller's frame (and any block scopes in it) go, and the callee's
+                    # frame takes its place
+                    call = stack.pop()
+                    steps_left -= 1
+                    if steps_left < 0:
+                        steps_left, budget_left = yield from self.next_slice(rt, slice_steps, budget_left)
+                    del scopes[scope_base:call.scope_base]
+                    rt.frame.pool.release(rt.frame)
+                    rt.frame = call.frame
+                    body = call.code.body
+                    pc = 0
+                    lambda_node = call.lambda_node
+
+                elif op == RETURN or op == RETURN_NIL:
+                    value = NIL if op == RETURN_NIL else copy_value(heap, stack.pop())
+                    # delete the function's scopes once it is done executing
+                    del scopes[scope_base:]
+                    rt.frame.pool.release(rt.frame)
+                    if not calls:
+                        return value
+                    body, pc, lambda_node, scope_base, rt.frame, memo_key = calls.pop()
+                    if memo_key is not None:
+                        memo.store(memo_key, value)
+                    stack.append(value)
+
+                elif op == POP:
+                    stack.pop()
+
+                elif op == PRINT:
+                    if arg:
+                        rt.output("".join([get_print_text(value) for value in stack[-arg:]]))
+                        del stack[-arg:]
+                    else:
+                        rt.output("")
+                    stack.append(NIL)
+
+                elif op == EQUAL or op == NOT_EQUAL:
+                    op2_val = stack.pop()
+                    op1_val = stack[-1]
+                    stack[-1] = bool_value(values_equal(op1_val, op2_val) == (op == EQUAL))
+                    if arg.warmup:
+                        quicken(body, pc - 2, arg, op1_val.t, op2_val.t)
+
+                elif op == BOOL_AND or op == BOOL_OR:
+                    op2_val = stack.pop()
+                    op1_val = stack[-1]
+                    a = op1_val.v != 0 if op1_val.t == Type.INT else op1_val.v
+                    b = op2_val.v != 0 if op2_val.t == Type.INT else op2_val.v
+                    if (op1_val.t != Type.INT and op1_val.t != Type.BOOL) or (op2_val.t != Type.INT and op2_val.t != Type.BOOL):
+                        rt.error(
+                            ErrorType.TYPE_ERROR,
+                            "Incompatible types for boolean operation",
+                        )
+                    if op == BOOL_AND:
+                        stack[-1] = bool_value(a and b)
+                    else:
+                        stack[-1] = bool_value(a or b)
+
+                elif op == NOT:
+                    op1_val = stack[-1]
+                    if op1_val.t == Type.INT:
+                        stack[-1] = bool_value(op1_val.v == 0)
+                    else:
+                        if op1_val.t != Type.BOOL:
+                            rt.error(
+                                ErrorType.TYPE_ERROR,
+                                "Incompatible type for boolean negation",
+                            )
+                        stack[-1] = bool_value(not op1_val.v)
+
+                elif op == NEG:
+                    op1_val = stack[-1]
+                    if op1_val.t != Type.INT:
+                        rt.error(
+                            ErrorType.TYPE_ERROR,
+                            "Incompatible type for arithmetic negation",
+                        )
+                    stack[-1] = int_value(-op1_val.v)
+
+                elif op == LOAD_FUNC:
+                    if arg.in_lambda and lambda_node is not None:
+                        value = read_captured(lambda_node, arg.name)
+                        if value is not None:
+                            stack.append(value)
+                            continue
+                    if arg.overloaded:
+                        rt.error(
+                            ErrorType.NAME_ERROR,
+                            f"Function {arg.name} has been overloaded, so it can't be assigned to a variable",
+                        )
+                    stack.append(Value(Type.FUNC, arg.func_node))
+
+                elif op == NEW_OBJECT:
+                    stack.append(Value(Type.OBJ, heap.new_fields()))
+
+                elif op == MAKE_LAMBDA:
+                    stack.append(Value(Type.LAMBDA, [arg.node, capture_vars(rt, arg.capture_names)]))
+
+                elif op == PROMPT:
+                    rt.output(get_printable(stack.pop()))
+
+                elif op == INPUTI or op == INPUTS:
+                    if suspend_input:
+                        stack.append(input_value(rt, (yield VM.NEEDS_INPUT), op == INPUTI))
+                    else:
+                        stack.append(read_input(rt, op == INPUTI))
+
+                elif op == INPUT_ARGS_ERROR:
+                    rt.error(
+                        ErrorType.NAME_ERROR,
+                        f"{arg}() function found that takes > 1 parameter",
+                    )
+
+                else:
+                    rt.error(
+                        ErrorType.NAME_ERROR,
+                        "Expression is invalid",
+                    )
+
+
+# counts the operand types a generic instruction saw, and rewrites it to its specialized
+# instruction once it has seen the same ones for its warmup (types that have no
+# specialized instruction leave it generic for good)
+def quicken(body, pc, site, t1, t2):
+    types = (t1, t2)
+    if types != site.types:
+        site.types = types
+        site.seen = 1
+        return
+    site.seen += 1
+    if site.seen < site.warmup:
+        return
+    op = body[pc]
+    if op in GENERIC:
+        # another run of the same body quickened it in the meantime
+        site.seen = 0
+        return
+    specialized = SPECIALIZED.get((op, t1, t2))
+    if specialized is None:
+        site.warmup = 0
+        return
+    body[pc] = specialized
+    site.seen = 0
+    site.quickenings += 1
+
+
+# rewrites a specialized instruction whose guard failed back to its generic instruction,
+# which waits twice as long to be quickened again (or, after MAX_DEOPTS, stays generic).
+# another run of the same body may have rewritten it already
+def deoptimize(body, pc, site):
+    body[pc] = GENERIC.get(body[pc], body[pc])
+    site.deopts += 1
+    site.types = None
+    site.seen = 0
+    site.warmup = 0 if site.deopts >= MAX_DEOPTS else site.warmup * 2